@@ -0,0 +1,25 @@
+"""
+Entry point of the shared runtime image.
+
+Every function runs the same image and BACKUP_HANDLER names the
+functions/<Name> directory whose lambda_handler it serves. That handler is
+imported while this module loads, so its import cost falls in Lambda's init
+phase, and no other handler is imported at all.
+"""
+import importlib
+import os
+
+HANDLER_NAME = os.environ.get("BACKUP_HANDLER")
+
+
+def load_handler(name):
+    return importlib.import_module(f"functions.{name}.app").lambda_handler
+
+
+_handler = load_handler(HANDLER_NAME) if HANDLER_NAME else None
+
+
+def lambda_handler(event, context):
+    if _handler is None:
+        raise RuntimeError("BACKUP_HANDLER is not set; it names the functions/<Name> handler to run")
+    return _handler(event, context)
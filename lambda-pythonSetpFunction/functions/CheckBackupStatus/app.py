@@ -1,9 +1,11 @@
 import json
-import requests
 import os
 from sf_utils import getOrganizationDetails
+from job_status import get_job, recommend_wait
+from exception_handler import instrumented
 # SALESFORCE_URL = os.environ.get("SALESFORCE_URL")
 # ACCESS_TOKEN = os.environ.get("SALESFORCE_ACCESS_TOKEN")
+@instrumented
 def lambda_handler(event, context):
     
     try:
@@ -11,28 +13,38 @@ def lambda_handler(event, context):
         job_id = event.get("jobId")
         if not job_id:
             raise ValueError(f"Job ID not provided for object {object_name}")
-        SALESFORCE_URL, ACCESS_TOKEN, version = getOrganizationDetails(event.get("requestDetails", {}).get("orgId"))
-        url = f"{SALESFORCE_URL}/services/data/{version}/jobs/query/{job_id}"
-        headers = {"Authorization": f"Bearer {ACCESS_TOKEN}", "Content-Type": "application/json"}
+        org_id = event.get("requestDetails", {}).get("orgId")
+        SALESFORCE_URL, _, version = getOrganizationDetails(org_id)
 
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        job_status = response.json()
+        # states come from the shared job store; Salesforce is only asked once per round for all jobs
+        job = get_job(org_id, SALESFORCE_URL, version, job_id)
+        if not job or job.get("state") is None:
+            raise ValueError(f"Could not read the state of job {job_id}")
 
         return {
             "jobId": job_id,
             "objectName": object_name,
-            "state": job_status["state"],
+            "state": job["state"],
+            "numberRecordsProcessed": job.get("numberRecordsProcessed", 0),
+            # WaitBeforePolling sleeps this long before the next check
+            "waitSeconds": recommend_wait(job, event.get("estimatedRecords")),
+            "estimatedRecords": event.get("estimatedRecords"),
+            "bytesPerRecord": event.get("bytesPerRecord"),
+            "watermark": event.get("watermark"),
+            "checkpoint": event.get("checkpoint"),
             "requestDetails": event.get("requestDetails", {})
         }
     except Exception as e:
         print(f"Error retrieving Salesforce object list: {e}")
         return {
             "state": "Failed",
+            "objectName": event.get("objectName"),
+            "jobId": event.get("jobId"),
+            "requestDetails": event.get("requestDetails", {}),
             "statusCode": 500,
             "headers": {
                 "Content-Type": "application/json",
                 "Access-Control-Allow-Origin": "*"
             },
             "body": json.dumps({"error": str(e)})
-        }
\ No newline at end of file
+        }
@@ -0,0 +1,184 @@
+import csv
+import io
+import json
+import os
+import time
+import datetime as dt
+import pyarrow as pa
+import pyarrow.parquet as pq
+import compression
+from compression import strip_suffix
+from s3_stream import MultipartUpload
+from state_store import get_store
+from exception_handler import instrumented
+from aws_clients import lazy_client
+
+s3 = lazy_client("s3")
+S3_BUCKET = 'qpms-backup'#os.environ.get("S3_BUCKET")
+# Rows per Parquet row group; also the most rows held in memory at once
+BATCH_ROWS = int(os.environ.get("PARQUET_BATCH_ROWS", "50000"))
+# Start another page only while the slowest page so far plus this much still fits in the timeout
+TIME_RESERVE_MS = int(os.environ.get("PARQUET_TIME_RESERVE_MS", "60000"))
+
+# Salesforce describe field types -> Arrow types; anything else is kept as text
+ARROW_TYPES = {
+    "boolean": pa.bool_(),
+    "int": pa.int64(),
+    "double": pa.float64(),
+    "currency": pa.float64(),
+    "percent": pa.float64(),
+    "date": pa.date32(),
+    "datetime": pa.timestamp("ms", tz="UTC"),
+}
+
+@instrumented
+def lambda_handler(event, context):
+    """
+    Converts the object's CSV pages to Parquet, one Parquet file per page,
+    for as many pages as the time left allows. Returns "Partial" with the
+    last converted page as a cursor (the state machine calls again with it
+    under "parquet") and "Converted" once every page is done.
+    """
+    try:
+        job_id = event.get("jobId")
+        object_name = event.get("objectName")
+        org_id = event.get("requestDetails", {}).get("orgId")
+        s3_prefix = event.get("s3Prefix")
+        if not s3_prefix:
+            raise ValueError(f"s3Prefix not provided for object {object_name}")
+        previous = event.get("parquet") or {}
+
+        schema_item = get_store().get(f"schema#{org_id}", job_id) or {}
+        field_types = schema_item.get("fieldTypes", {})
+        if not field_types:
+            print(f"No saved field types for job {job_id}; writing every column as text")
+
+        last_page = previous.get("lastPageKey")
+        page_keys = [key for key in list_page_keys(S3_BUCKET, s3_prefix) if last_page is None or key > last_page]
+        folder = s3_prefix.rsplit("/", 1)[0]
+        parquet_prefix = f"{folder}/parquet/{job_id}/"
+
+        rows = 0
+        converted = 0
+        slowest_page_ms = 0
+        for page_key in page_keys:
+            if converted and not has_time_for_another_page(context, slowest_page_ms):
+                break
+            started = time.monotonic()
+            rows += convert_page(page_key, field_types, parquet_key(parquet_prefix, page_key))
+            slowest_page_ms = max(slowest_page_ms, (time.monotonic() - started) * 1000)
+            converted += 1
+            last_page = page_key
+
+        done = converted == len(page_keys)
+        print(f"Converted {rows} rows from {converted} page(s) to s3://{S3_BUCKET}/{parquet_prefix}; {len(page_keys) - converted} left")
+        return {
+            "status": "Converted" if done else "Partial",
+            "parquetPrefix": parquet_prefix,
+            "lastPageKey": last_page,
+            "rows": previous.get("rows", 0) + rows,
+            "pages": previous.get("pages", 0) + converted
+        }
+    except Exception as e:
+        print(f"Error converting {event.get('objectName')} to Parquet: {e}")
+        return {
+            "status": "Error",
+            "statusCode": 500,
+            "body": json.dumps({"error": str(e)})
+        }
+
+def list_page_keys(bucket, prefix):
+    keys = []
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+        keys.extend(obj['Key'] for obj in page.get('Contents', []) if obj['Key'].endswith(('.csv', '.csv.gz', '.csv.zst')))
+    return sorted(keys)
+
+def parquet_key(parquet_prefix, page_key):
+    return f"{parquet_prefix}{strip_suffix(page_key.rsplit('/', 1)[-1])}.parquet"
+
+def has_time_for_another_page(context, slowest_page_ms):
+    get_remaining = getattr(context, "get_remaining_time_in_millis", None)
+    if get_remaining is None:
+        # no deadline (local runs): convert everything in one go
+        return True
+    return get_remaining() - slowest_page_ms > TIME_RESERVE_MS
+
+def convert_page(page_key, field_types, parquet_key):
+    """
+    Streams one CSV page into a Parquet file, BATCH_ROWS rows per row group,
+    so memory depends on the batch size rather than on the page size.
+    """
+    rows = 0
+    body = s3.get_object(Bucket=S3_BUCKET, Key=page_key)["Body"]
+    text = io.TextIOWrapper(compression.open_reader(body, page_key), encoding="utf-8", newline="")
+    reader = csv.reader(text)
+    header = next(reader, None)
+    if header is None:
+        return 0
+    schema = arrow_schema(header, field_types)
+    with MultipartUpload(s3, S3_BUCKET, parquet_key, ContentType="application/vnd.apache.parquet") as upload:
+        writer = pq.ParquetWriter(upload, schema, compression="snappy")
+        batch = []
+        for row in reader:
+            batch.append(row)
+            if len(batch) >= BATCH_ROWS:
+                writer.write_table(to_table(batch, schema))
+                rows += len(batch)
+                batch = []
+        if batch:
+            writer.write_table(to_table(batch, schema))
+            rows += len(batch)
+        writer.close()
+    return rows
+
+def arrow_schema(header, field_types):
+    return pa.schema([pa.field(name, ARROW_TYPES.get(field_types.get(name), pa.string())) for name in header])
+
+def to_table(batch, schema):
+    columns = []
+    for index, field in enumerate(schema):
+        parse = PARSERS.get(str(field.type), _parse_text)
+        columns.append(pa.array([parse(row[index]) for row in batch], type=field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+def _parse_text(value):
+    return value if value != "" else None
+
+def _parse_bool(value):
+    if value == "":
+        return None
+    return value.lower() == "true"
+
+def _parse_int(value):
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+def _parse_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+def _parse_date(value):
+    try:
+        return dt.date.fromisoformat(value)
+    except ValueError:
+        return None
+
+def _parse_datetime(value):
+    # Bulk API writes e.g. 2024-05-01T10:15:30.000Z
+    try:
+        parsed = dt.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=dt.timezone.utc)
+
+PARSERS = {
+    "bool": _parse_bool,
+    "int64": _parse_int,
+    "double": _parse_float,
+    "date32[day]": _parse_date,
+    "timestamp[ms, tz=UTC]": _parse_datetime,
+}
@@ -1,50 +1,283 @@
-import boto3
-import requests
 import os
+import queue
+import threading
+import time
+import zlib
 import datetime as dt
-s3 = boto3.client("s3")
 #S3_BUCKET = os.environ.get("S3_BUCKET")
 S3_BUCKET = 'qpms-backup'#os.environ.get("S3_BUCKET")
-from sf_utils import getOrganizationDetails
+from sf_utils import getOrganizationDetails, sf_request
+from s3_stream import MultipartUpload, READ_CHUNK_SIZE
+import compression
+from watermarks import advance_watermark
+import checkpoints
+from exception_handler import add_metric, bound, instrumented
+from aws_clients import lazy_client
+import progress
 
+s3 = lazy_client("s3")
+
+# Keep following locators until less than this is left on the clock, so the
+# page in flight and the hand-back to Step Functions still fit in the timeout.
+TIME_RESERVE_MS = int(os.environ.get("DOWNLOAD_TIME_RESERVE_MS", "30000"))
+# Read-ahead between the Salesforce reader and the S3 writer, in READ_CHUNK_SIZE chunks
+PREFETCH_CHUNKS = int(os.environ.get("DOWNLOAD_PREFETCH_CHUNKS", "64"))
+# Results pages are sized (maxRecords) to land near this many bytes
+PAGE_TARGET_BYTES = int(os.environ.get("DOWNLOAD_PAGE_TARGET_MB", "200")) * 1024 * 1024
+MIN_PAGE_RECORDS = int(os.environ.get("DOWNLOAD_MIN_PAGE_RECORDS", "10000"))
+MAX_PAGE_RECORDS = int(os.environ.get("DOWNLOAD_MAX_PAGE_RECORDS", "2000000"))
+
+@instrumented
 def lambda_handler(event, context):
     print("Init.....")
     job_id = event.get("jobId")
-    object_name = event.get("objectName")    
-    SALESFORCE_URL, ACCESS_TOKEN, version = getOrganizationDetails(event.get("requestDetails", {}).get("orgId"))
+    object_name = event.get("objectName")
+    org_id = event.get("requestDetails", {}).get("orgId")
+    SALESFORCE_URL, _, version = getOrganizationDetails(org_id)
 
     print("Downloading data for job:", job_id, "object:", object_name)
     backup_type = event.get("requestDetails", {}).get("BackUpType")
 
     print("Data exists for object:", object_name, "proceeding with download.")
     url = f"{SALESFORCE_URL}/services/data/{version}/jobs/query/{job_id}/results/"
-    
-    Sforce_Locator = event.get("Sforce_Locator", "")
-    
-    if Sforce_Locator:
-        url += f"?locator={Sforce_Locator}"
-    
-    headers = {"Authorization": f"Bearer {ACCESS_TOKEN}"}
-    response = requests.get(url, headers=headers, stream=True)
-    response.raise_for_status()
-
-    Sforce_Locator = response.headers.get("Sforce-Locator", "")
-    Sforce_NumberOfRecords = response.headers.get("Sforce-NumberOfRecords", "")
-    # Save to S3
-    datetime = dt.datetime.now().strftime("%Y%m%d_%H%M%S") 
-    date = dt.datetime.now().strftime("%Y%m%d")
     org = event.get("requestDetails", {}).get("orgId", "defaultOrg")
-    s3_key = f"salesforce_backups/{org}/{date}/{object_name}/{job_id}_{datetime}_{Sforce_Locator}_{Sforce_NumberOfRecords}.csv"
-    s3.put_object(Bucket=S3_BUCKET, Key=s3_key, Body=response.content)
+    checkpoint = event.get("checkpoint")
+    saved = checkpoints.load(org_id, checkpoint, job_id)
+    locator = event.get("Sforce_Locator", "")
+    pages_committed = int(event.get("pagesCommitted", 0))
+    drained = False
+    if saved and saved["pages"] > pages_committed:
+        # a rerun, retry or redrive: carry on after the last page that made it to S3
+        print(f"Resuming {job_id} from checkpoint after {saved['pages']} page(s), {saved['records']} records")
+        locator, pages_committed = saved["locator"], saved["pages"]
+        # every page was committed before the failure; nothing is left to fetch
+        drained = not locator
+    # fixed for the whole job so pages fetched after midnight (or resumed days later) land in the same folder
+    date = event.get("backupDate") or (saved or {}).get("backupDate") or dt.datetime.now().strftime("%Y%m%d")
+    s3_prefix = f"salesforce_backups/{org}/{date}/{object_name}/{job_id}_"
 
+    def commit(next_locator, s3_key, records, size):
+        # counted with the checkpoint, so pages a resume skips are not lost to the run totals
+        if checkpoint:
+            checkpoints.commit_page(org_id, checkpoint, job_id, next_locator, s3_key, records)
+        progress.record(event.get("requestDetails", {}), recordsExported=records, bytesExported=size)
 
+    if drained:
+        result = {"locator": "", "pages": 0, "records": 0, "bytes": 0, "s3Key": saved.get("lastS3Key"),
+                  "maxRecords": event.get("maxRecords"), "bytesPerRecord": event.get("bytesPerRecord")}
+    else:
+        result = download_pages(
+            org_id, url, locator, s3_prefix, context, event.get("bytesPerRecord") or (saved or {}).get("bytesPerRecord"),
+            on_page=commit,
+        )
+    Sforce_Locator = result["locator"]
+    add_metric("Records", result["records"])
+    add_metric("Pages", result["pages"])
+    watermark = event.get("watermark")
+    if not Sforce_Locator and watermark:
+        # every page of the window is in S3; the next run starts after it
+        advance_watermark(org_id, object_name, watermark["upTo"])
+    if not Sforce_Locator and checkpoint:
+        checkpoints.finish(org_id, checkpoint)
+
+    print(f"Downloaded {result['pages']} page(s), {result['records']} records for {object_name}; next locator: {Sforce_Locator or 'none'}")
     return {
         "Sforce_Locator": Sforce_Locator,
-        "Sforce_NumberOfRecords": Sforce_NumberOfRecords,
-        "status": ("Completed" if Sforce_Locator else "Partial"),
+        "Sforce_NumberOfRecords": result["records"],
+        "pagesDownloaded": result["pages"],
+        "pagesCommitted": pages_committed + result["pages"],
+        "maxRecords": result["maxRecords"],
+        "bytesPerRecord": result["bytesPerRecord"],
+        "status": ("Partial" if Sforce_Locator else "Completed"),
         "jobId": job_id,
         "objectName": object_name,
-        "s3Key": s3_key,
+        "s3Key": result["s3Key"],
+        "s3Prefix": s3_prefix,
+        "backupDate": date,
+        "watermark": watermark,
+        "checkpoint": checkpoint,
         "requestDetails": event.get("requestDetails", {})
     }
 
+def download_pages(org_id, url, locator, s3_prefix, context, bytes_per_record=None, on_page=None):
+    """
+    Fetches result pages on a reader thread while this thread uploads them.
+    The two sides are joined by a bounded chunk queue, so page N+1 is already
+    streaming in from Salesforce while page N is still going out to S3 and
+    memory stays capped at PREFETCH_CHUNKS chunks plus the upload's parts.
+    on_page(next_locator, s3_key, records, bytes) is called as each page is completed in S3.
+    Returns the next locator ("" when drained) with page, record, byte and sizing stats.
+    """
+    chunks = queue.Queue(maxsize=PREFETCH_CHUNKS)
+    stop = threading.Event()
+    reader = threading.Thread(
+        target=bound(fetch_pages), args=(org_id, url, locator, chunks, stop, context, bytes_per_record), daemon=True
+    )
+    reader.start()
+
+    pages = 0
+    records = 0
+    bytes_written = 0
+    s3_key = None
+    upload = None
+    try:
+        while True:
+            item = chunks.get()
+            if isinstance(item, bytes):
+                upload.write(item)
+            elif item[0] == "start":
+                _, next_locator, number_of_records = item
+                # Save to S3
+                datetime = dt.datetime.now().strftime("%Y%m%d_%H%M%S")
+                s3_key = f"{s3_prefix}{datetime}_{next_locator}_{number_of_records}.csv{compression.suffix()}"
+                upload = MultipartUpload(s3, S3_BUCKET, s3_key, ContentType=compression.content_type())
+            elif item[0] == "end":
+                upload.close()
+                print(f"Uploaded {upload.bytes_written} bytes to s3://{S3_BUCKET}/{s3_key}")
+                bytes_written += upload.bytes_written
+                page_bytes = upload.bytes_written
+                upload = None
+                pages += 1
+                records += int(number_of_records or 0)
+                if on_page is not None:
+                    on_page(next_locator, s3_key, int(number_of_records or 0), page_bytes)
+            elif item[0] == "done":
+                return {**item[1], "pages": pages, "records": records, "bytes": bytes_written, "s3Key": s3_key}
+            else:
+                raise item[1]
+    except BaseException:
+        stop.set()
+        if upload is not None:
+            upload.abort()
+        raise
+    finally:
+        reader.join(timeout=5)
+
+def fetch_pages(org_id, url, locator, chunks, stop, context, bytes_per_record=None):
+    """Reader side of download_pages: follows locators while the time budget allows."""
+    def put(item):
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        slowest_page_ms = 0
+        bytes_read = 0
+        records_read = 0
+        seconds_reading = 0.0
+        while True:
+            started = time.monotonic()
+            if records_read:
+                bytes_per_record = bytes_read / records_read
+            bytes_per_second = bytes_read / seconds_reading if seconds_reading else None
+            max_records = choose_max_records(bytes_per_record, bytes_per_second, context)
+            params = {"maxRecords": max_records} if max_records else {}
+            if locator:
+                params["locator"] = locator
+
+            response = sf_request(org_id, "GET", url, params=params, headers={"Accept-Encoding": "gzip"}, stream=True)
+            page_bytes = 0
+            measured = {"csvBytes": 0}
+            with response:
+                response.raise_for_status()
+                locator = response.headers.get("Sforce-Locator", "")
+                # Salesforce marks the last page with the literal string "null"
+                if locator == "null":
+                    locator = ""
+                number_of_records = response.headers.get("Sforce-NumberOfRecords", "")
+                if not put(("start", locator, number_of_records)):
+                    return
+                for chunk in page_chunks(response, measured):
+                    page_bytes += len(chunk)
+                    if not put(chunk):
+                        return
+            if not put(("end",)):
+                return
+            page_seconds = time.monotonic() - started
+            slowest_page_ms = max(slowest_page_ms, page_seconds * 1000)
+            # widths and rates are in CSV bytes, like the describe estimate and PAGE_TARGET_BYTES
+            bytes_read += measured["csvBytes"]
+            add_metric("SalesforceBytes", page_bytes, "Bytes")
+            records_read += int(number_of_records or 0)
+            seconds_reading += page_seconds
+
+            if not locator or not has_time_for_another_page(context, slowest_page_ms):
+                put(("done", {
+                    "locator": locator,
+                    "maxRecords": max_records,
+                    "bytesPerRecord": round(bytes_read / records_read, 1) if records_read else bytes_per_record,
+                }))
+                return
+    except Exception as e:
+        put(("error", e))
+
+def page_chunks(response, measured=None):
+    """
+    Yields the page body as it is stored. When Salesforce already gzipped the
+    page and the output is gzip too, the wire bytes go straight to S3 without
+    a decompress/recompress. measured["csvBytes"] is advanced by the
+    uncompressed size of the page, which record widths are measured on.
+    """
+    measured = measured if measured is not None else {"csvBytes": 0}
+    if compression.OUTPUT_COMPRESSION == "gzip" and response.headers.get("Content-Encoding", "").lower() == "gzip":
+        # inflated only to be counted; the compressed bytes are what gets stored
+        sizer = InflatedSize()
+        for chunk in response.raw.stream(READ_CHUNK_SIZE, decode_content=False):
+            if chunk:
+                sizer.feed(chunk)
+                measured["csvBytes"] = sizer.total
+                yield chunk
+        return
+
+    codec = compression.compressor()
+    for chunk in response.iter_content(chunk_size=READ_CHUNK_SIZE):
+        measured["csvBytes"] += len(chunk)
+        data = codec.compress(chunk)
+        if data:
+            yield data
+    tail = codec.flush()
+    if tail:
+        yield tail
+
+class InflatedSize:
+    """Counts the decompressed size of a gzip stream (of any number of members) without keeping it."""
+
+    def __init__(self):
+        self.total = 0
+        self._inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def feed(self, data):
+        while data:
+            self.total += len(self._inflater.decompress(data))
+            if not self._inflater.eof:
+                return
+            data = self._inflater.unused_data
+            self._inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+def has_time_for_another_page(context, slowest_page_ms):
+    get_remaining = getattr(context, "get_remaining_time_in_millis", None)
+    if get_remaining is None:
+        # no deadline (local runs): drain everything in one go
+        return True
+    return get_remaining() - slowest_page_ms > TIME_RESERVE_MS
+
+def choose_max_records(bytes_per_record, bytes_per_second, context):
+    """
+    Picks maxRecords for the next results page: PAGE_TARGET_BYTES worth of
+    records at the measured (or describe-estimated) record width, shrunk so
+    the page can finish in the time this invocation has left.
+    None leaves the page size to Salesforce when nothing is known yet.
+    """
+    if not bytes_per_record:
+        return None
+    target_bytes = PAGE_TARGET_BYTES
+    get_remaining = getattr(context, "get_remaining_time_in_millis", None)
+    if bytes_per_second and get_remaining is not None:
+        seconds_left = max(get_remaining() - TIME_RESERVE_MS, 0) / 1000
+        target_bytes = min(target_bytes, bytes_per_second * seconds_left * 0.8)
+    max_records = int(target_bytes / bytes_per_record)
+    return min(max(max_records, MIN_PAGE_RECORDS), MAX_PAGE_RECORDS)
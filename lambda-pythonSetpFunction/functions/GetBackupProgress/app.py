@@ -0,0 +1,43 @@
+import json
+from exception_handler import instrumented
+from progress import get_progress
+
+@instrumented
+def lambda_handler(event, context):
+    """
+    Progress of one backup run (the Step Functions execution name), read
+    with a single GetItem. Takes {"runId": ...} or an API Gateway event
+    with runId as a path or query string parameter.
+    """
+    try:
+        run_id = (
+            event.get("runId")
+            or (event.get("pathParameters") or {}).get("runId")
+            or (event.get("queryStringParameters") or {}).get("runId")
+        )
+        if not run_id:
+            raise ValueError("runId not provided")
+        progress = get_progress(run_id)
+        status_code = 200 if progress is not None else 404
+        body = progress if progress is not None else {"error": f"No progress recorded for run {run_id}"}
+
+        if "httpMethod" in event:
+            return {
+                "statusCode": status_code,
+                "headers": {
+                    "Content-Type": "application/json",
+                    "Access-Control-Allow-Origin": "*"
+                },
+                "body": json.dumps(body)
+            }
+        return {"statusCode": status_code, **body}
+    except Exception as e:
+        print(f"Error reading backup progress: {e}")
+        return {
+            "statusCode": 500,
+            "headers": {
+                "Content-Type": "application/json",
+                "Access-Control-Allow-Origin": "*"
+            },
+            "body": json.dumps({"error": str(e)})
+        }
@@ -1,16 +1,36 @@
 import json
-import requests
-from sf_utils import getOrganizationDetails
+import os
+from urllib.parse import quote
+from sf_utils import getOrganizationDetails, sf_request
+from watermarks import delta_condition
+from exception_handler import instrumented
+import progress
+
+# Object names per /limits/recordCount call, to keep the URL short
+RECORD_COUNT_BATCH = int(os.environ.get("RECORD_COUNT_BATCH", "100"))
+# Subrequests per /composite/batch call (Salesforce maximum is 25)
+COMPOSITE_BATCH_SIZE = 25
+# Full backups of objects above CHUNK_THRESHOLD_RECORDS are split into Id-range
+# sub-jobs of about CHUNK_TARGET_RECORDS each, at most MAX_CHUNKS per object
+CHUNK_THRESHOLD_RECORDS = int(os.environ.get("CHUNK_THRESHOLD_RECORDS", "10000000"))
+CHUNK_TARGET_RECORDS = int(os.environ.get("CHUNK_TARGET_RECORDS", "5000000"))
+MAX_CHUNKS = int(os.environ.get("MAX_CHUNKS", "16"))
+# Salesforce Ids sort in this digit order
+BASE62 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+@instrumented
 def lambda_handler(event, context):
     print('-----------------init---------------------')
     try:
-        SALESFORCE_URL, ACCESS_TOKEN, version = getOrganizationDetails(event.get("requestDetails", {}).get("orgId"))
+        org_id = event.get("requestDetails", {}).get("orgId")
+        SALESFORCE_URL, _, version = getOrganizationDetails(org_id)
         url = f"{SALESFORCE_URL}/services/data/{version}/sobjects/"
-        headers = {"Authorization": f"Bearer {ACCESS_TOKEN}", "Content-Type": "application/json"}
+        headers = {"Content-Type": "application/json"}
 
-        response = requests.get(url, headers=headers)
+        response = sf_request(org_id, "GET", url, headers=headers)
         response.raise_for_status()
         job_response = response.json()
+        backup_type = event.get("requestDetails", {}).get("BackUpType")
 
         object_list = [
             obj["name"]
@@ -41,6 +61,29 @@ def lambda_handler(event, context):
             ]
         #'ContentWorkspaceDoc'
         object_list.extend(object_list_additional)
+
+        # describeGlobal already tells us which objects exist and can be queried
+        queryable = {obj["name"] for obj in job_response.get("sobjects", []) if obj.get("queryable")}
+        dropped = [name for name in object_list if name not in queryable]
+        if dropped:
+            print(f"Skipping objects that are missing or not queryable: {dropped}")
+        object_list = [name for name in object_list if name in queryable]
+
+        counts = estimate_record_counts(org_id, SALESFORCE_URL, version, object_list, backup_type)
+        empty = [name for name in object_list if counts.get(name) == 0]
+        if empty:
+            print(f"Skipping objects with no rows to back up: {empty}")
+        object_list = [name for name in object_list if counts.get(name) != 0]
+        large = [
+            name for name in object_list
+            if backup_type == "Full" and not name.endswith("__b") and (counts.get(name) or 0) > CHUNK_THRESHOLD_RECORDS
+        ]
+        bounds = id_bounds(org_id, SALESFORCE_URL, version, large) if large else {}
+        object_list = [
+            item
+            for name in object_list
+            for item in backup_items(name, counts.get(name), bounds.get(name))
+        ]
         print(f"Salesforce objects to backup: {object_list}")
         print(f"Event: {event}")
         print(f"Context: {context}")
@@ -68,6 +111,11 @@ def lambda_handler(event, context):
             }
         else:
             print(f"else: {event}")
+            progress.record(
+                event.get("requestDetails", {}),
+                objectsPlanned=len(object_list),
+                recordsPlanned=sum(item["estimatedRecords"] or 0 for item in object_list),
+            )
             return  { 
                      "objects": object_list,
                      "requestDetails": event.get("requestDetails", {})
@@ -84,3 +132,125 @@ def lambda_handler(event, context):
             },
             "body": json.dumps({"error": str(e)})
         }
+
+def estimate_record_counts(org_id, instance_url, version, object_names, backup_type):
+    """
+    Row counts for every object from a handful of calls instead of one
+    COUNT query per object. Full backups use the approximate /limits/recordCount
+    figures and confirm only the zeros with an exact COUNT(), since those are
+    the ones that get dropped. Daily backups count yesterday's changes with
+    COUNT() queries (since each object's watermark) sent 25 at a time
+    through /composite/batch. Big objects (__b) are not counted with COUNT(),
+    so a reported zero is left unknown and their export finds out.
+    None means the count is unknown and the object is kept.
+    """
+    if backup_type == "Daily":
+        return count_rows(org_id, instance_url, version, [n for n in object_names if not n.endswith("__b")], backup_type)
+
+    counts = {}
+    for i in range(0, len(object_names), RECORD_COUNT_BATCH):
+        names = object_names[i:i + RECORD_COUNT_BATCH]
+        url = f"{instance_url}/services/data/{version}/limits/recordCount?sObjects={quote(','.join(names))}"
+        response = sf_request(org_id, "GET", url)
+        response.raise_for_status()
+        counts.update({o["name"]: o["count"] for o in response.json().get("sObjects", [])})
+
+    zeros = [name for name, count in counts.items() if count == 0]
+    counts.update({name: None for name in zeros if name.endswith("__b")})
+    zeros = [name for name in zeros if not name.endswith("__b")]
+    counts.update(count_rows(org_id, instance_url, version, zeros, backup_type))
+    return counts
+
+def count_query(org_id, object_name, backup_type):
+    query = f"SELECT COUNT() FROM {object_name}"
+    if backup_type == "Daily":
+        query += f" WHERE {delta_condition(org_id, object_name)}"
+    return query
+
+def count_rows(org_id, instance_url, version, object_names, backup_type):
+    """Exact COUNT() per object, batched through /composite/batch."""
+    counts = {}
+    url = f"{instance_url}/services/data/{version}/composite/batch"
+    for i in range(0, len(object_names), COMPOSITE_BATCH_SIZE):
+        names = object_names[i:i + COMPOSITE_BATCH_SIZE]
+        payload = {"batchRequests": [
+            {"method": "GET", "url": f"{version}/query?q={quote(count_query(org_id, name, backup_type))}"}
+            for name in names
+        ]}
+        response = sf_request(org_id, "POST", url, headers={"Content-Type": "application/json"}, json=payload)
+        response.raise_for_status()
+        for name, result in zip(names, response.json().get("results", [])):
+            if result.get("statusCode") == 200:
+                counts[name] = result["result"]["totalSize"]
+            else:
+                print(f"Could not count {name}: {result.get('result')}")
+                counts[name] = None
+    return counts
+
+def backup_items(object_name, estimated_records, bounds):
+    """
+    Map items for one object: a single item, or one per Id range when the
+    object is big enough to be exported by parallel sub-jobs.
+    """
+    if not bounds:
+        return [{"objectName": object_name, "estimatedRecords": estimated_records, "idRange": None}]
+    chunks = min(-(-estimated_records // CHUNK_TARGET_RECORDS), MAX_CHUNKS)
+    edges = split_id_range(bounds[0], bounds[1], chunks)
+    # open-ended first and last ranges also catch rows added since the bounds were read
+    edges = [None] + edges[1:-1] + [None]
+    print(f"Splitting {object_name} (~{estimated_records} records) into {len(edges) - 1} Id ranges")
+    return [
+        {
+            "objectName": object_name,
+            "estimatedRecords": estimated_records // (len(edges) - 1),
+            "idRange": {"from": edges[i], "to": edges[i + 1], "chunk": i, "chunks": len(edges) - 1},
+        }
+        for i in range(len(edges) - 1)
+    ]
+
+def id_bounds(org_id, instance_url, version, object_names):
+    """Lowest and highest Id of each object, two ORDER BY Id queries per object."""
+    bounds = {}
+    url = f"{instance_url}/services/data/{version}/composite/batch"
+    queries = [(name, order) for name in object_names for order in ("ASC", "DESC")]
+    found = {}
+    for i in range(0, len(queries), COMPOSITE_BATCH_SIZE):
+        batch = queries[i:i + COMPOSITE_BATCH_SIZE]
+        payload = {"batchRequests": [
+            {"method": "GET", "url": f"{version}/query?q={quote(f'SELECT Id FROM {name} ORDER BY Id {order} LIMIT 1')}"}
+            for name, order in batch
+        ]}
+        response = sf_request(org_id, "POST", url, headers={"Content-Type": "application/json"}, json=payload)
+        response.raise_for_status()
+        for (name, order), result in zip(batch, response.json().get("results", [])):
+            records = result.get("result", {}).get("records") if result.get("statusCode") == 200 else None
+            if records:
+                found[(name, order)] = records[0]["Id"][:15]
+    for name in object_names:
+        low, high = found.get((name, "ASC")), found.get((name, "DESC"))
+        if low and high and low < high:
+            bounds[name] = (low, high)
+    return bounds
+
+def split_id_range(low, high, chunks):
+    """chunks + 1 ascending, distinct Ids from low to high, evenly spaced in base 62."""
+    start, end = _id_to_int(low), _id_to_int(high)
+    edges = []
+    for i in range(chunks + 1):
+        edge = _int_to_id(start + (end - start) * i // chunks, len(low))
+        if not edges or edge != edges[-1]:
+            edges.append(edge)
+    return edges
+
+def _id_to_int(record_id):
+    value = 0
+    for char in record_id:
+        value = value * 62 + BASE62.index(char)
+    return value
+
+def _int_to_id(value, width):
+    chars = []
+    for _ in range(width):
+        value, digit = divmod(value, 62)
+        chars.append(BASE62[digit])
+    return "".join(reversed(chars))
@@ -1,15 +1,62 @@
 import json
-import requests
 import os
-from sf_utils import getOrganizationDetails
+from datetime import datetime
+from sf_utils import getOrganizationDetails, sf_request
+from state_store import get_store
+from describe_cache import get_describe
+from job_status import register_job, recommend_wait
+import checkpoints
+from watermarks import delta_condition, window_end, modstamp_field
+from urllib.parse import quote_plus
+from exception_handler import instrumented
+import progress
+
+# Rough CSV width of a value by field type, used before any page has been measured
+FIELD_TYPE_BYTES = {
+    "id": 19, "reference": 19, "boolean": 5, "date": 10, "datetime": 24, "time": 12,
+    "int": 6, "double": 12, "currency": 12, "percent": 8, "phone": 14, "email": 24,
+}
+# Long text areas rarely come close to their declared length
+MAX_ESTIMATED_FIELD_BYTES = 255
+# Field types are kept for the Parquet stage as long as Bulk results are (7 days)
+SCHEMA_TTL_SECONDS = 7 * 24 * 3600
+# Job states a rerun can pick up again; Failed and Aborted jobs are replaced
+RESUMABLE_STATES = {"UploadComplete", "InProgress", "JobComplete"}
+@instrumented
 def lambda_handler(event, context):
     try:
         object_name = event["objectName"]   
         
-        domainUrl, access_token, version = getOrganizationDetails(event.get("requestDetails", {}).get("orgId"))
+        org_id = event.get("requestDetails", {}).get("orgId")
+        domainUrl, _, version = getOrganizationDetails(org_id)
         backup_type = event.get("requestDetails", {}).get("BackUpType")
+        checkpoint = checkpoints.checkpoint_key(object_name, event.get("idRange"))
 
-        if checkIfQueryRowsAreNotEmpty(domainUrl,access_token,version,object_name,backup_type) == False:
+        resumed = resume_job(org_id, domainUrl, version, object_name, checkpoint, backup_type, event.get("estimatedRecords"))
+        if resumed:
+            job_id, state, saved = resumed
+            progress.record(event.get("requestDetails", {}), objectsSubmitted=1)
+            return {
+                "status": "Submitted",
+                "objectName": object_name,
+                "jobId": job_id,
+                "state": state,
+                "resumed": True,
+                "checkpoint": checkpoint,
+                "bytesPerRecord": saved.get("bytesPerRecord"),
+                "estimatedRecords": event.get("estimatedRecords"),
+                "idRange": event.get("idRange"),
+                "watermark": saved.get("watermark"),
+                "waitSeconds": 0 if state == "JobComplete" else recommend_wait({}, event.get("estimatedRecords")),
+                "requestDetails": event.get("requestDetails", {})
+            }
+
+        # rows changed up to this point are exported; the watermark moves here once they are in S3
+        up_to = window_end()
+        delta = delta_condition(org_id, object_name, up_to) if backup_type == 'Daily' else None
+
+        # GetSalesforceObjectList already dropped empty objects when it could count them
+        if event.get("estimatedRecords") is None and checkIfQueryRowsAreNotEmpty(domainUrl,org_id,version,object_name,backup_type,delta) == False:
             return {
                 "status": "Skipped",
                 "objectName": object_name,
@@ -22,8 +69,9 @@ def lambda_handler(event, context):
         #object_name = "Account"
         # Call Salesforce Bulk API to create job
         url = f"{domainUrl}/services/data/{version}/jobs/query"
-        headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
-        query = get_object_query(object_name, domainUrl, access_token, backup_type)
+        headers = {"Content-Type": "application/json"}
+        object_fields = describe_object(object_name, domainUrl, org_id, version)
+        query = get_object_query(object_name, object_fields, backup_type, event.get("idRange"), delta)
         #f"SELECT Id, Name FROM {object_name}
 
         payload = {
@@ -33,9 +81,17 @@ def lambda_handler(event, context):
         print(f"Creating bulk query job for object: {object_name}")
         print(f"Payload: {payload}")
 
-        response = requests.post(url, headers=headers, json=payload)
+        response = sf_request(org_id, "POST", url, headers=headers, json=payload)
         response.raise_for_status()
         job_info = response.json()
+        save_job_schema(org_id, job_info["id"], object_name, object_fields)
+        register_job(org_id, job_info["id"], object_name, job_info["state"], event.get("estimatedRecords"))
+        watermark = None if event.get("idRange") else {"field": modstamp_field(object_name), "upTo": up_to}
+        bytes_per_record = estimate_record_bytes(object_fields)
+        checkpoints.start(
+            org_id, checkpoint, job_info["id"], backup_type, datetime.now().strftime("%Y%m%d"), watermark, bytes_per_record
+        )
+        progress.record(event.get("requestDetails", {}), objectsSubmitted=1)
 
         # Example: return jobId for tracking
         return {
@@ -43,12 +99,21 @@ def lambda_handler(event, context):
             "objectName": object_name,
             "jobId": job_info["id"],
             "state": job_info["state"],
+            "checkpoint": checkpoint,
+            "bytesPerRecord": bytes_per_record,
+            "estimatedRecords": event.get("estimatedRecords"),
+            "idRange": event.get("idRange"),
+            # an Id-range chunk covers only part of the object, so it cannot move the watermark
+            "watermark": watermark,
+            "waitSeconds": recommend_wait({}, event.get("estimatedRecords")),
             "requestDetails": event.get("requestDetails", {})
         }
     except Exception as e:
         print(f"Error retrieving Salesforce object list: {e}")
         return {
             "status": "Error",
+            "objectName": event.get("objectName"),
+            "requestDetails": event.get("requestDetails", {}),
             "statusCode": 500,
             "headers": {
                 "Content-Type": "application/json",
@@ -57,19 +122,34 @@ def lambda_handler(event, context):
             "body": json.dumps({"error": str(e)})
         }
 
-def get_object_query(object_name, domainUrl, access_token, backup_type="Daily"):
+def resume_job(org_id, domainUrl, version, object_name, checkpoint, backup_type, estimated_records=None):
+    """
+    (jobId, state, checkpoint) of the job an earlier run left unfinished for
+    this object, when Salesforce still has it; None when a new job is needed.
+    """
+    saved = checkpoints.load(org_id, checkpoint)
+    if not saved or saved.get("backupType") != backup_type:
+        return None
+    job_id = saved["jobId"]
+    response = sf_request(org_id, "GET", f"{domainUrl}/services/data/{version}/jobs/query/{job_id}")
+    # results are gone once Salesforce deletes the job
+    state = response.json().get("state") if response.status_code == 200 else None
+    if state not in RESUMABLE_STATES:
+        print(f"Job {job_id} of checkpoint {checkpoint} can not be resumed (state {state}); starting a new job")
+        checkpoints.finish(org_id, checkpoint)
+        return None
+    register_job(org_id, job_id, object_name, state, estimated_records)
+    print(f"Resuming job {job_id} for {checkpoint} after {saved.get('pages', 0)} page(s), {saved.get('records', 0)} records")
+    return job_id, state, saved
 
-        headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
-        url = f"{domainUrl}/services/data/v60.0/sobjects/{object_name}/describe"
+def describe_object(object_name, domainUrl, org_id, version):
+        object_fields = get_describe(org_id, domainUrl, version, object_name)
+        print(f"Object Fields: {len(object_fields.get('fields', []))} fields on {object_name}")
+        return object_fields
 
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        job_response = response.json()
+def get_object_query(object_name, object_fields, backup_type="Daily", id_range=None, delta=None):
 
         #field_names = [field.get("name") for field in job_response.get("fields", []) if "name" in field]
-        object_fields = job_response
-
-        print(f"Object Fields: {object_fields}")
                 
         compound_parents = {
             f["compoundFieldName"]
@@ -94,13 +174,41 @@ def get_object_query(object_name, domainUrl, access_token, backup_type="Daily"):
         if object_name.endswith('__b'):
             LastModifiedDate = 'CreatedDate'
             
+        conditions = []
         if backup_type == 'Daily':
-            url += f" WHERE {LastModifiedDate} = YESTERDAY"
+            conditions.append(delta or f"{LastModifiedDate} = YESTERDAY")
+        # chunked exports: each sub-job covers [from, to) of the Id space
+        if id_range and id_range.get("from"):
+            conditions.append(f"Id >= '{id_range['from']}'")
+        if id_range and id_range.get("to"):
+            conditions.append(f"Id < '{id_range['to']}'")
+        if conditions:
+            url += " WHERE " + " AND ".join(conditions)
             
         return url
     
 
-def checkIfQueryRowsAreNotEmpty(SALESFORCE_URL,ACCESS_TOKEN,version,objectName,backup_type):
+def estimate_record_bytes(object_fields):
+    """
+    Guesses the CSV width of one record from describe metadata so the first
+    results page can be sized before DownloadDataToS3 has measured anything.
+    """
+    total = 0
+    for f in object_fields.get("fields", []):
+        width = FIELD_TYPE_BYTES.get(f.get("type"))
+        if width is None:
+            width = min(f.get("length") or f.get("precision") or 16, MAX_ESTIMATED_FIELD_BYTES)
+        total += width + 3  # delimiter and quotes
+    return max(total, 1)
+
+def save_job_schema(org_id, job_id, object_name, object_fields):
+    """Records the describe field types of a job so ConvertToParquet can type its columns."""
+    field_types = {f["name"]: f.get("type", "string") for f in object_fields.get("fields", [])}
+    get_store().put(
+        f"schema#{org_id}", job_id, {"objectName": object_name, "fieldTypes": field_types}, ttl=SCHEMA_TTL_SECONDS
+    )
+
+def checkIfQueryRowsAreNotEmpty(SALESFORCE_URL,org_id,version,objectName,backup_type,delta=None):
     url = f"{SALESFORCE_URL}/services/data/{version}/query?q=SELECT+COUNT(ID)+FROM+{objectName}"
     
     LastModifiedDate = 'SystemModstamp'
@@ -114,15 +222,14 @@ def checkIfQueryRowsAreNotEmpty(SALESFORCE_URL,ACCESS_TOKEN,version,objectName,b
         LastModifiedDate = 'CreatedDate'
     
     if backup_type == 'Daily':
-        url += f"+WHERE+{LastModifiedDate}+=+YESTERDAY"
+        url += "+WHERE+" + quote_plus(delta or f"{LastModifiedDate} = YESTERDAY")
     
     # if backup_type == 'Daily':
     #     url += "+WHERE+SystemModstamp+=+LAST_N_DAYS:1"
     print(f"Check Rows URL: {url}")
     
     
-    headers = {"Authorization": f"Bearer {ACCESS_TOKEN}"}
-    response = requests.get(url, headers=headers, stream=True)
+    response = sf_request(org_id, "GET", url)
     response.raise_for_status()
     data = response.json()
     print(f"Check Rows Response Data: {data}")
@@ -1,25 +1,25 @@
-import boto3
 import os
+from exception_handler import instrumented
+from status_writer import write_statuses
+import progress
 
-dynamodb = boto3.resource("dynamodb")
-TABLE_NAME = 'qpms-backup'#os.environ.get("BACKUP_STATUS_TABLE")
-table = dynamodb.Table(TABLE_NAME)
-
+@instrumented
 def lambda_handler(event, context):
     job_id = event.get("jobId")
-    # object_name = event["backupJob"]["objectName"]
+    object_name = event.get("objectName")
 
-    # # Check state (completed or failed)
+    # Check state (completed or failed)
     state = event.get("status")
 
-    # table.put_item(
-    #     Item={
-    #         "Id": job_id,
-    #         "jobId": job_id,
-    #         "objectName": object_name,
-    #         "status": state
-    #     }
-    # )
+    if job_id:
+        write_statuses([{
+            "Id": job_id,
+            "jobId": job_id,
+            "objectName": object_name,
+            "status": state
+        }])
+
+    progress.record(event.get("requestDetails", {}), objectsCompleted=1)
 
     return {"jobId": job_id,
             "requestDetails": event.get("requestDetails", {}),
@@ -1,26 +1,34 @@
-import boto3
 import os
 import json
-dynamodb = boto3.resource("dynamodb")
-TABLE_NAME = 'qpms-backup'#os.environ.get("BACKUP_STATUS_TABLE")
-table = dynamodb.Table(TABLE_NAME)
+from exception_handler import instrumented
+from status_writer import write_statuses
+import progress
 
+@instrumented
 def lambda_handler(event, context):
     try:
         job_id = event.get("jobId")
         object_name = event.get("objectName")
 
         # Check state (completed or failed)
-        state = event.get("status", {}).get("state", "EmptyStatus")
+        # InitBulkBackup reports "status", CheckBackupStatus "state"; a Catch puts {"Error", "Cause"}
+        # in "status" (ContentVersionMap) or "error" (DownloadData, whose input still says JobComplete)
+        status = event.get("status")
+        if isinstance(event.get("error"), dict):
+            state = event["error"].get("Error") or "EmptyStatus"
+        elif isinstance(status, dict):
+            state = status.get("state") or status.get("Error") or "EmptyStatus"
+        else:
+            state = status or event.get("state") or "EmptyStatus"
+        # counted first: a job that failed before it had an id cannot get a status row
+        progress.record(event.get("requestDetails", {}), objectsFailed=1)
 
-        table.put_item(
-            Item={
-                "Id": job_id,
-                "jobId": job_id,
-                "objectName": object_name,
-                "status": state
-            }
-        )
+        write_statuses([{
+            "Id": job_id,
+            "jobId": job_id,
+            "objectName": object_name,
+            "status": state
+        }])
 
         return {"jobId": job_id,
                 "requestDetails": event.get("requestDetails", {}),
@@ -1,55 +1,224 @@
-import requests
-import boto3
-from sf_utils import getOrganizationDetails
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import governor
+from sf_utils import getOrganizationDetails, sf_request
+from compression import strip_suffix
+from s3_stream import stream_to_s3, READ_CHUNK_SIZE
+from state_store import get_store
+from status_writer import write_statuses
+from exception_handler import add_metric, bound, instrumented
+from aws_clients import lazy_client
+import progress
+
+# One client per container, built on first use; boto3 clients are safe to share across threads
+s3 = lazy_client("s3")
+# Invocations the ContentVersionMap runs at once (its MaxConcurrency)
+FILE_MAP_CONCURRENCY = max(int(os.environ.get("FILE_MAP_CONCURRENCY", "4")), 1)
+# Files moved at the same time within one invocation. Each holds a governor slot
+# while it streams, so all the map's invocations together fit in the org's slots.
+DOWNLOAD_CONCURRENCY = max(min(
+    int(os.environ.get("DOWNLOAD_FILE_CONCURRENCY", "8")), governor.MAX_CONCURRENT // FILE_MAP_CONCURRENCY
+), 1)
+# Parts in flight per file, so DOWNLOAD_CONCURRENCY files stay within the memory size
+FILE_INFLIGHT_PARTS = int(os.environ.get("DOWNLOAD_FILE_INFLIGHT_PARTS", "2"))
+# Invocations a batch gets before its remaining failures are reported as final
+MAX_ATTEMPTS = int(os.environ.get("DOWNLOAD_FILE_MAX_ATTEMPTS", "3"))
+# "dedupe" keeps one blob per Checksum and writes pointers; "copy" writes every file in full
+CONTENT_STORE_MODE = os.environ.get("CONTENT_STORE_MODE", "dedupe").lower()
+
+@instrumented
 def lambda_handler(event, context):
+    """
+    Moves a batch of ContentVersions to S3. A Map ItemBatcher passes
+    {"Items": [...], "BatchInput": {...}}; a bare single-item event still works.
+    Failed items are handed back so only they are retried. The last attempt
+    records one status item for the whole batch.
+    """
     try:
-        SALESFORCE_URL, ACCESS_TOKEN, version = getOrganizationDetails(event.get("requestDetails", {}).get("orgId"))
-        CONTENT_VERSION_ID = event['contentVersionId']
-        S3_BUCKET = event['S3BUCKET']
-        S3_KEY = event['s3Key']
-
-        stream_salesforce_to_s3(
-            instance_url=SALESFORCE_URL,
-            content_version_id=CONTENT_VERSION_ID,
-            access_token=ACCESS_TOKEN,
-            bucket_name=S3_BUCKET,
-            s3_key=S3_KEY
-        )
+        shared = {**event, **event.get("BatchInput", {})}
+        items = event["Items"] if "Items" in event else [event]
+        attempt = int(event.get("attempt", 0)) + 1
+        org_id = shared.get("requestDetails", {}).get("orgId")
+        SALESFORCE_URL, _, version = getOrganizationDetails(org_id)
+        S3_BUCKET = shared['S3BUCKET']
+        S3_KEY = shared['s3Key']
+
+        succeeded, failed, deduplicated = download_batch(SALESFORCE_URL, org_id, items, S3_BUCKET, S3_KEY)
+        add_metric("Files", len(succeeded))
+        add_metric("FilesFailed", len(failed))
+        add_metric("FilesDeduplicated", deduplicated)
 
+        print(f"Attempt {attempt}: {len(succeeded)} of {len(items)} ContentVersion(s) backed up to s3://{S3_BUCKET}/{strip_suffix(S3_KEY)}/, {deduplicated} already held")
+        # retries carry the batch id and running total, since they only hold the failed items
+        batch_id = event.get("batchId") or (items[0]["contentVersionId"].split("/", 1)[0] if items else "empty")
+        succeeded_count = int(event.get("succeededCount", 0)) + len(succeeded)
+        retry = bool(failed) and attempt < MAX_ATTEMPTS
+        if not retry:
+            record_batch_status(S3_KEY, batch_id, succeeded_count, failed, attempt)
+        # failures count once, when they are final
+        progress.record(
+            shared.get("requestDetails", {}),
+            filesDownloaded=len(succeeded),
+            filesFailed=0 if retry else len(failed),
+        )
         return {
-            "statusCode": 200,
-            "body": f"Successfully streamed ContentVersion {CONTENT_VERSION_ID} to s3://{S3_BUCKET}/{S3_KEY}",
-            "requestDetails": event.get("requestDetails", {})
+            "statusCode": 200 if not failed else 207,
+            "status": "Completed" if not failed else "PartiallyFailed",
+            "body": f"Streamed {len(succeeded)} of {len(items)} ContentVersion(s)",
+            "succeeded": succeeded,
+            "failed": failed,
+            "deduplicated": deduplicated,
+            "attempt": attempt,
+            "retry": retry,
+            "batchId": batch_id,
+            "succeededCount": succeeded_count,
+            "BatchInput": event.get("BatchInput", {}),
+            "requestDetails": shared.get("requestDetails", {})
         }
     except Exception as e:
         print(f"Error: {e}")
+        # the whole batch is reported failed and final, so the map carries on with the other batches
+        items = event.get("Items") if "Items" in event else [event]
+        failed = [{**item, "error": str(e)} for item in items or [] if isinstance(item, dict)]
+        add_metric("FilesFailed", len(failed))
         return {
             "statusCode": 500,
-            "body": f"Error occurred: {str(e)}"
+            "status": "Error",
+            "body": f"Error occurred: {str(e)}",
+            "succeeded": [],
+            "failed": failed,
+            "retry": False,
+            "attempt": int(event.get("attempt", 0)) + 1,
+            "batchId": event.get("batchId"),
+            "BatchInput": event.get("BatchInput", {})
         }
-def stream_salesforce_to_s3(instance_url, content_version_id, access_token, bucket_name, s3_key):
+
+def record_batch_status(s3_key, batch_id, succeeded_count, failed, attempts):
+    """One status item per batch instead of a status task per file."""
+    try:
+        write_statuses([{
+            "Id": f"{strip_suffix(s3_key)}#{batch_id}",
+            "objectName": "ContentVersion",
+            "status": "Completed" if not failed else "PartiallyFailed",
+            "succeeded": succeeded_count,
+            "failed": [item["contentVersionId"] for item in failed],
+            "attempts": attempts,
+        }])
+    except Exception as e:
+        # the files are in S3 either way; a missing status item must not fail the batch
+        print(f"Failed to record status of batch {batch_id}: {e}")
+
+def download_batch(instance_url, org_id, items, bucket_name, s3_key):
+    """
+    Streams every item on a pool of DOWNLOAD_CONCURRENCY threads.
+    Returns the ids that made it, the items that did not (each carrying its
+    error so it can be sent back as-is for a retry) and how many were already held.
+    """
+    def download(item):
+        try:
+            if CONTENT_STORE_MODE == "dedupe" and item.get("Checksum"):
+                return store_content_version(instance_url, item, org_id, bucket_name, s3_key), None
+            stream_salesforce_to_s3(
+                instance_url=instance_url,
+                content_version_id=item["contentVersionId"],
+                org_id=org_id,
+                bucket_name=bucket_name,
+                s3_key=s3_key
+            )
+            return False, None
+        except Exception as e:
+            return False, str(e)
+
+    succeeded, failed, deduplicated = [], [], 0
+    with ThreadPoolExecutor(max_workers=min(DOWNLOAD_CONCURRENCY, len(items) or 1)) as pool:
+        for item, (reused, error) in zip(items, pool.map(bound(download), items)):
+            if error is None:
+                succeeded.append(item["contentVersionId"])
+                deduplicated += reused
+            else:
+                failed.append({**item, "error": error})
+    return succeeded, failed, deduplicated
+
+def blob_key(org_id, checksum):
+    return f"salesforce_backups/{org_id}/_blobs/{checksum}"
+
+def store_content_version(instance_url, item, org_id, bucket_name, s3_key):
+    """
+    Content-addressed backup: the file body lives once under _blobs/<Checksum>
+    and every backup of it is a small JSON pointer at the usual location.
+    Blobs already in the index are not downloaded again. Returns True when
+    the blob was already held.
+    """
+    contentVersionId, fileName = item["contentVersionId"].split('/', 1)
+    checksum = item["Checksum"].lower()
+    index = get_store()
+    blob = index.get(f"blob#{org_id}", checksum)
+    reused = blob is not None
+    if not reused:
+        blob = download_blob(instance_url, contentVersionId, checksum, org_id, bucket_name, blob_key(org_id, checksum))
+        index.put(f"blob#{org_id}", checksum, blob)
+
+    location = f"{strip_suffix(s3_key)}/{contentVersionId}_{fileName}.pointer.json"
+    s3.put_object(
+        Bucket=bucket_name, Key=location, ContentType="application/json",
+        Body=json.dumps({
+            "contentVersionId": contentVersionId,
+            "fileName": fileName,
+            "checksum": checksum,
+            "blobKey": blob["key"],
+            "size": blob["size"],
+        }).encode("utf-8")
+    )
+    return reused
+
+def download_blob(instance_url, content_version_id, checksum, org_id, bucket_name, key):
+    """Streams one file body to key, checking it against the Salesforce MD5 Checksum."""
+    url = f"{instance_url}/sfc/servlet.shepherd/version/download/{content_version_id}"
+    digest = hashlib.md5(usedforsecurity=False)
+
+    def hashed(chunks):
+        for chunk in chunks:
+            digest.update(chunk)
+            yield chunk
+
+    with sf_request(org_id, "GET", url, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        size = stream_to_s3(
+            s3, hashed(response.iter_content(chunk_size=READ_CHUNK_SIZE)), bucket_name, key,
+            max_in_flight=FILE_INFLIGHT_PARTS
+        )
+    if digest.hexdigest() != checksum:
+        # drop the bad copy and leave the index alone so the next attempt downloads it again
+        s3.delete_object(Bucket=bucket_name, Key=key)
+        raise ValueError(f"Checksum mismatch for ContentVersion {content_version_id}: expected {checksum}, got {digest.hexdigest()}")
+    print(f"✅ Stored blob s3://{bucket_name}/{key} ({size} bytes)")
+    return {"key": key, "size": size, "contentVersionId": content_version_id}
+
+def stream_salesforce_to_s3(instance_url, content_version_id, org_id, bucket_name, s3_key):
     """
     Streams large ContentVersion data directly from Salesforce to S3 without saving locally.
     """
 
     contentVersionId, fileName = content_version_id.split('/', 1)
-    s3 = boto3.client("s3")
     url = f"{instance_url}/sfc/servlet.shepherd/version/download/{contentVersionId}"
-    headers = {"Authorization": f"Bearer {access_token}"}
-
     print(f"📥 Streaming download from: {url}")
 
     # Final destination path in S3
-    key = s3_key.removesuffix('.csv')  # Ensure no trailing slash
+    key = strip_suffix(s3_key)  # Ensure no trailing slash
     location = f"{key}/{contentVersionId}_{fileName}"
 
     try:
         # Stream download from Salesforce
-        with requests.get(url, headers=headers, stream=True, timeout=60) as response:
+        with sf_request(org_id, "GET", url, stream=True, timeout=60) as response:
             response.raise_for_status()
 
             # Upload the streamed data directly to S3
-            s3.upload_fileobj(response.raw, bucket_name, location)
+            stream_to_s3(
+                s3, response.iter_content(chunk_size=READ_CHUNK_SIZE), bucket_name, location,
+                max_in_flight=FILE_INFLIGHT_PARTS
+            )
 
         print(f"✅ Successfully uploaded to s3://{bucket_name}/{location}")
 
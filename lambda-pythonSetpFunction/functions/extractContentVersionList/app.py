@@ -1,11 +1,20 @@
-import boto3
 import csv
 import json
 import io
+import os
+import compression
+from s3_stream import MultipartUpload
+from exception_handler import instrumented
+from aws_clients import lazy_client
+
+s3 = lazy_client("s3")
 S3BUCKET = 'qpms-backup'#os.environ.get("S3_BUCKET")
+# Items per manifest shard; each shard is one JSON Lines object under the manifest prefix
+MANIFEST_SHARD_ITEMS = int(os.environ.get("MANIFEST_SHARD_ITEMS", "10000"))
+
+@instrumented
 def lambda_handler(event, context):
     try:
-        s3 = boto3.client('s3')
         print(f"Event Received: {event}")
         # Get input parameters
         global S3BUCKET
@@ -16,14 +25,41 @@ def lambda_handler(event, context):
         # if not (S3_BUCKET and S3_KEY and COLUMN_NAME):
         #     raise ValueError("Missing required parameters: s3_bucket, s3_key, or column_name")
 
-        # --- 1️⃣ Download CSV file from S3 ---
-        response = s3.get_object(Bucket=S3_BUCKET, Key=S3_KEY)
-        csv_content = response['Body'].read().decode('utf-8')
-        print(f"Downloaded CSV content from s3://{S3_BUCKET}/{S3_KEY}")
-        # --- 2️⃣ Parse CSV and extract column ---
-        csv_reader = csv.DictReader(io.StringIO(csv_content))
-        column_values = [f"{row[COLUMN_NAME]}/{row[COLUMN_FILE]}" for row in csv_reader if COLUMN_NAME in row]
-        print(f"Extracted {len(column_values)} values from column '{COLUMN_NAME}'")
+        # A multi-page export writes one CSV per results page under s3Prefix
+        S3_PREFIX = event.get('s3Prefix')
+        S3_KEYS = list_page_keys(s3, S3_BUCKET, S3_PREFIX) if S3_PREFIX else [S3_KEY]
+        MANIFEST_PREFIX = f"{S3_PREFIX or compression.strip_suffix(S3_KEY) + '_'}manifest/"
+
+        manifest = ManifestWriter(s3, S3_BUCKET, MANIFEST_PREFIX, MANIFEST_SHARD_ITEMS)
+        try:
+            for page_key in S3_KEYS:
+                # Rows are parsed straight off the S3 stream; no page is held in memory
+                response = s3.get_object(Bucket=S3_BUCKET, Key=page_key)
+                csv_stream = io.TextIOWrapper(
+                    compression.open_reader(response['Body'], page_key), encoding='utf-8', newline=''
+                )
+                print(f"Reading CSV content from s3://{S3_BUCKET}/{page_key}")
+                for row in csv.DictReader(csv_stream):
+                    if row.get(COLUMN_NAME):
+                        manifest.add({
+                            "contentVersionId": f"{row[COLUMN_NAME]}/{row[COLUMN_FILE]}",
+                            "Id": row[COLUMN_NAME],
+                            "PathOnClient": row[COLUMN_FILE],
+                            "Checksum": row.get("Checksum", ""),
+                        })
+            manifest.close()
+        except Exception:
+            manifest.abort()
+            raise
+        print(f"Wrote {manifest.item_count} items to {len(manifest.keys)} manifest shard(s) under s3://{S3_BUCKET}/{MANIFEST_PREFIX}")
+
+        result = {
+            "manifestBucket": S3_BUCKET,
+            "manifestPrefix": MANIFEST_PREFIX,
+            "manifestKeys": manifest.keys,
+            "itemCount": manifest.item_count,
+            "shardCount": len(manifest.keys),
+        }
         # --- 3️⃣ Detect if API Gateway triggered this ---
         if "httpMethod" in event:
             return {
@@ -34,13 +70,17 @@ def lambda_handler(event, context):
                 },
                 "body": json.dumps({
                     "message": f"Extracted column '{COLUMN_NAME}' successfully",
-                    "values": column_values
+                    **result
                 })
             }
         else:
             # Direct Lambda invocation (e.g. from Step Function)
-            return {"column_values": column_values,
+            return {**result,
                     "s3_key": S3_KEY,"S3BUCKET":S3BUCKET,
+                    # carried through the map so the object is marked completed after it
+                    "jobId": event.get("jobId"),
+                    "objectName": event.get("objectName"),
+                    "status": "Completed",
                     "requestDetails": event.get("requestDetails", {})
                     }
 
@@ -54,3 +94,47 @@ def lambda_handler(event, context):
             },
             "body": json.dumps({"error": str(e)})
         }
+
+def list_page_keys(s3, bucket, prefix):
+    keys = []
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+        keys.extend(obj['Key'] for obj in page.get('Contents', []) if obj['Key'].endswith(('.csv', '.csv.gz', '.csv.zst')))
+    return sorted(keys)
+
+class ManifestWriter:
+    """
+    Writes manifest items as JSON Lines shards (part-00000.jsonl, ...) of at
+    most shard_items items each, streamed out through multipart uploads.
+    """
+    def __init__(self, s3, bucket, prefix, shard_items):
+        self.s3 = s3
+        self.bucket = bucket
+        self.prefix = prefix
+        self.shard_items = max(shard_items, 1)
+        self.keys = []
+        self.item_count = 0
+        self._upload = None
+        self._shard_count = 0
+
+    def add(self, item):
+        if self._upload is None or self._shard_count >= self.shard_items:
+            self._next_shard()
+        self._upload.write(json.dumps(item, separators=(",", ":")).encode("utf-8") + b"\n")
+        self._shard_count += 1
+        self.item_count += 1
+
+    def _next_shard(self):
+        if self._upload is not None:
+            self._upload.close()
+        key = f"{self.prefix}part-{len(self.keys):05d}.jsonl"
+        self._upload = MultipartUpload(self.s3, self.bucket, key, ContentType="application/jsonl")
+        self.keys.append(key)
+        self._shard_count = 0
+
+    def close(self):
+        if self._upload is not None:
+            self._upload.close()
+
+    def abort(self):
+        if self._upload is not None:
+            self._upload.abort()
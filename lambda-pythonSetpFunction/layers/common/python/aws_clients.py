@@ -0,0 +1,74 @@
+"""
+Lazily created AWS clients, one per service per container.
+
+boto3 is imported and a client built on first use instead of at import
+time, so a cold start only pays for the services the invocation touches
+(importing boto3 alone is a large share of a small handler's init).
+Clients are cached for the life of the container and shared by threads,
+with a connection pool big enough for the handlers' worker threads.
+"""
+import os
+import threading
+
+MAX_POOL_CONNECTIONS = int(os.environ.get("AWS_MAX_POOL_CONNECTIONS", "32"))
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def _config():
+    from botocore.config import Config
+    return Config(max_pool_connections=MAX_POOL_CONNECTIONS, retries={"mode": "standard"})
+
+
+def client(service_name):
+    key = ("client", service_name)
+    if key not in _clients:
+        with _lock:
+            if key not in _clients:
+                import boto3
+                _clients[key] = boto3.client(service_name, config=_config())
+    return _clients[key]
+
+
+def resource(service_name):
+    key = ("resource", service_name)
+    if key not in _clients:
+        with _lock:
+            if key not in _clients:
+                import boto3
+                _clients[key] = boto3.resource(service_name, config=_config())
+    return _clients[key]
+
+
+def table(table_name):
+    return resource("dynamodb").Table(table_name)
+
+
+class _Lazy:
+    """Stands in for an object that is only built on first attribute access."""
+
+    def __init__(self, factory, *args):
+        self._factory = factory
+        self._args = args
+
+    def resolve(self):
+        return self._factory(*self._args)
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
+
+
+def lazy_client(service_name):
+    """Module-level handle for client(service_name) that costs nothing until used."""
+    return _Lazy(client, service_name)
+
+
+def lazy_table(table_name):
+    return _Lazy(table, table_name)
+
+
+def clear():
+    """Forget the cached clients (tests and local tooling)."""
+    with _lock:
+        _clients.clear()
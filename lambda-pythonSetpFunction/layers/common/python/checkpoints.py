@@ -0,0 +1,65 @@
+"""
+Export checkpoints, so a failed object resumes its Bulk job instead of starting over.
+
+InitBulkBackup stores a checkpoint under "checkpoint#<org>" when it creates
+a job, one per object (or per Id-range chunk). DownloadDataToS3 commits every
+page once it is in S3: the locator of the next page, the page's S3 key and
+running page and record counts. The checkpoint is removed when the job's
+last page is in S3.
+
+While a checkpoint exists, a rerun's InitBulkBackup picks the same job up again
+and DownloadDataToS3 continues from the committed locator, as does a retried or
+redriven DownloadDataToS3 whose input lags behind the checkpoint. Checkpoints
+expire with the job's results (CHECKPOINT_TTL_HOURS, Bulk API 2.0 keeps them
+7 days).
+"""
+import os
+import time
+
+from state_store import get_store
+
+CHECKPOINT_TTL_SECONDS = int(os.environ.get("CHECKPOINT_TTL_HOURS", str(7 * 24))) * 3600
+
+
+def checkpoint_key(object_name, id_range=None):
+    if not id_range:
+        return object_name
+    return f"{object_name}#{id_range.get('from') or ''}-{id_range.get('to') or ''}"
+
+
+def start(org_id, key, job_id, backup_type, backup_date, watermark=None, bytes_per_record=None):
+    """Checkpoint a newly created job, before any page is downloaded."""
+    get_store().put(f"checkpoint#{org_id}", key, {
+        "jobId": job_id,
+        "backupType": backup_type,
+        "backupDate": backup_date,
+        "watermark": watermark,
+        "bytesPerRecord": bytes_per_record,
+        "locator": "",
+        "pages": 0,
+        "records": 0,
+        "createdAt": time.time(),
+    }, ttl=CHECKPOINT_TTL_SECONDS)
+
+
+def load(org_id, key, job_id=None):
+    """The checkpoint under key; None when there is none or it belongs to another job."""
+    if not key:
+        return None
+    item = get_store().get(f"checkpoint#{org_id}", key)
+    if item is None or (job_id is not None and item.get("jobId") != job_id):
+        return None
+    return item
+
+
+def commit_page(org_id, key, job_id, locator, s3_key, records):
+    """Record a page that is safely in S3; locator is the next page's ("" when it was the last)."""
+    get_store().increment(
+        f"checkpoint#{org_id}", key,
+        {"pages": 1, "records": records},
+        values={"jobId": job_id, "locator": locator, "lastS3Key": s3_key, "committedAt": time.time()},
+    )
+
+
+def finish(org_id, key):
+    get_store().delete(f"checkpoint#{org_id}", key)
@@ -0,0 +1,83 @@
+"""
+Output compression for backup files.
+
+OUTPUT_COMPRESSION picks the codec for CSV written to S3: "none", "gzip" or
+"zstd". zstd needs the optional zstandard package; it is only imported when
+selected. Readers use open_reader, which picks the codec from the key suffix,
+so files written under any mode stay readable.
+"""
+import gzip
+import os
+import zlib
+
+OUTPUT_COMPRESSION = os.environ.get("OUTPUT_COMPRESSION", "none").lower()
+ZSTD_LEVEL = int(os.environ.get("OUTPUT_ZSTD_LEVEL", "3"))
+GZIP_LEVEL = int(os.environ.get("OUTPUT_GZIP_LEVEL", "6"))
+
+SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+CONTENT_TYPES = {"none": "text/csv", "gzip": "application/gzip", "zstd": "application/zstd"}
+
+
+def _check_mode(mode):
+    if mode not in SUFFIXES:
+        raise ValueError(f"Unsupported OUTPUT_COMPRESSION '{mode}' (expected one of {', '.join(SUFFIXES)})")
+    return mode
+
+
+def suffix(mode=None):
+    """File suffix appended after .csv for the given mode."""
+    return SUFFIXES[_check_mode(mode or OUTPUT_COMPRESSION)]
+
+
+def content_type(mode=None):
+    return CONTENT_TYPES[_check_mode(mode or OUTPUT_COMPRESSION)]
+
+
+def strip_suffix(key):
+    """Drop the compression and .csv suffixes from an S3 key."""
+    for ext in (".gz", ".zst"):
+        if key.endswith(ext):
+            key = key[:-len(ext)]
+            break
+    return key.removesuffix(".csv")
+
+
+class _Passthrough:
+    def compress(self, data):
+        return data
+
+    def flush(self):
+        return b""
+
+
+class _Zstd:
+    def __init__(self, level):
+        import zstandard
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+
+def compressor(mode=None):
+    """A streaming compressor with compress(bytes) -> bytes and flush() -> bytes."""
+    mode = _check_mode(mode or OUTPUT_COMPRESSION)
+    if mode == "gzip":
+        # wbits=31 writes a gzip header so every page is a standalone .gz file
+        return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    if mode == "zstd":
+        return _Zstd(ZSTD_LEVEL)
+    return _Passthrough()
+
+
+def open_reader(fileobj, key):
+    """Wrap a binary stream (e.g. an S3 Body) so reads return decompressed bytes."""
+    if key.endswith(".gz"):
+        return gzip.GzipFile(fileobj=fileobj, mode="rb")
+    if key.endswith(".zst"):
+        import zstandard
+        return zstandard.ZstdDecompressor().stream_reader(fileobj)
+    return fileobj
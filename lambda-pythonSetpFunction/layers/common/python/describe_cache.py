@@ -0,0 +1,76 @@
+"""
+Cached sObject describe metadata.
+
+Describes are keyed by org, API version and object. A warm container answers
+from memory for DESCRIBE_FRESH_SECONDS; after that (or in a new container) the
+copy in the shared store is revalidated with If-Modified-Since, so an unchanged
+schema costs one empty 304 instead of a full describe. Only the field
+attributes the backup uses are kept, which keeps store items small.
+"""
+import os
+import threading
+import time
+
+from sf_utils import sf_request
+from state_store import get_store
+
+DESCRIBE_FRESH_SECONDS = int(os.environ.get("DESCRIBE_FRESH_SECONDS", "900"))
+DESCRIBE_TTL_SECONDS = int(os.environ.get("DESCRIBE_TTL_SECONDS", str(30 * 24 * 3600)))
+FIELD_ATTRIBUTES = ("name", "type", "length", "precision", "scale", "compoundFieldName")
+
+_memory = {}
+_memory_lock = threading.Lock()
+
+
+def trim_describe(describe):
+    """Keep the object name and the field attributes query building needs."""
+    return {
+        "name": describe.get("name"),
+        "fields": [
+            {k: f[k] for k in FIELD_ATTRIBUTES if f.get(k) is not None}
+            for f in describe.get("fields", [])
+        ],
+    }
+
+
+def get_describe(org_id, instance_url, version, object_name):
+    """Return the (trimmed) describe of object_name, from cache when still current."""
+    cache_key = (org_id, version, object_name)
+    with _memory_lock:
+        entry = _memory.get(cache_key)
+    if entry and time.time() - entry["checkedAt"] < DESCRIBE_FRESH_SECONDS:
+        return entry["describe"]
+
+    store = get_store()
+    pk, sk = f"describe#{org_id}", f"{version}#{object_name}"
+    if entry is None:
+        entry = store.get(pk, sk)
+
+    headers = {"Content-Type": "application/json"}
+    if entry and entry.get("lastModified"):
+        headers["If-Modified-Since"] = entry["lastModified"]
+    url = f"{instance_url}/services/data/{version}/sobjects/{object_name}/describe"
+    response = sf_request(org_id, "GET", url, headers=headers)
+
+    if response.status_code == 304 and entry:
+        print(f"Describe of {object_name} unchanged since {entry['lastModified']}")
+        entry = {**entry, "checkedAt": time.time()}
+    else:
+        response.raise_for_status()
+        entry = {
+            "describe": trim_describe(response.json()),
+            "lastModified": response.headers.get("Last-Modified"),
+            "checkedAt": time.time(),
+        }
+        store.put(pk, sk, entry, ttl=DESCRIBE_TTL_SECONDS)
+        print(f"Describe of {object_name} refreshed: {len(entry['describe']['fields'])} fields")
+
+    with _memory_lock:
+        _memory[cache_key] = entry
+    return entry["describe"]
+
+
+def clear():
+    """Forget the warm copies (tests and local tooling)."""
+    with _memory_lock:
+        _memory.clear()
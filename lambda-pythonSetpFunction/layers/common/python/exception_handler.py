@@ -1,12 +1,187 @@
 import json
 import logging
+import os
+import threading
+import time
 import traceback
+from contextlib import contextmanager
 from functools import wraps
 
+import governor
+
 # Set up a shared logger (writes to CloudWatch automatically)
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Metrics are printed as CloudWatch embedded metric format (EMF) lines, which
+# CloudWatch Logs turns into metrics without any API calls from the handler.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "SalesforceBackup")
+
+_cold_start = True
+# The invocation being measured. Lambda runs one invocation per process at a
+# time, so threads record into the latest one unless bound() to their own;
+# the thread-local keeps concurrent handlers apart in local runs.
+_active = threading.local()
+_latest = None
+# callables handed every emitted record (e.g. the local benchmark)
+_listeners = []
+
+
+class InvocationMetrics:
+    """Phase timings, byte and record counters for one handler invocation."""
+
+    def __init__(self, function_name, object_name=None, cold_start=False):
+        self.function_name = function_name
+        self.object_name = object_name
+        self.cold_start = cold_start
+        self.values = {}
+        self.units = {}
+        self.properties = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, value, unit="Count"):
+        with self._lock:
+            self.values[name] = self.values.get(name, 0) + value
+            self.units[name] = unit
+
+    def record_phase(self, phase, seconds):
+        # summed over threads, so a phase can add up to more than the invocation
+        self.add(f"{phase}Ms", round(seconds * 1000, 3), "Milliseconds")
+        self.add(f"{phase}Calls", 1)
+
+    def to_emf(self, timestamp_ms=None):
+        record = {"FunctionName": self.function_name}
+        if self.object_name:
+            # a property, not a dimension: one metric series per sObject would grow with the org's schema
+            record["ObjectName"] = self.object_name
+        record.update(self.properties)
+        record.update(self.values)
+        record["_aws"] = {
+            "Timestamp": int(timestamp_ms if timestamp_ms is not None else time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": METRICS_NAMESPACE,
+                "Dimensions": [["FunctionName"]],
+                "Metrics": [{"Name": name, "Unit": self.units[name]} for name in sorted(self.values)],
+            }],
+        }
+        return record
+
+
+def current_metrics():
+    """The invocation being measured, or None outside an instrumented handler."""
+    return getattr(_active, "metrics", None) or _latest
+
+
+def bound(func):
+    """Wrap func so that it records into the calling thread's invocation when run on another thread."""
+    metrics = current_metrics()
+
+    @wraps(func)
+    def run(*args, **kwargs):
+        previous = getattr(_active, "metrics", None)
+        _active.metrics = metrics
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _active.metrics = previous
+
+    return run
+
+
+def add_metric(name, value, unit="Count"):
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.add(name, value, unit)
+
+
+@contextmanager
+def timed(phase):
+    """Add the time spent in the block to <phase>Ms and count it in <phase>Calls."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics = current_metrics()
+        if metrics is not None:
+            metrics.record_phase(phase, time.perf_counter() - started)
+
+
+def add_listener(listener):
+    _listeners.append(listener)
+
+
+def remove_listener(listener):
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def emit(metrics):
+    record = metrics.to_emf()
+    for listener in list(_listeners):
+        listener(record)
+    if METRICS_ENABLED:
+        print(json.dumps(record, default=str), flush=True)
+
+
+def _function_name(func, context):
+    return (getattr(context, "function_name", None)
+            or os.environ.get("AWS_LAMBDA_FUNCTION_NAME")
+            or func.__module__)
+
+
+def instrumented(func):
+    """
+    Decorator measuring a Step Functions task handler. The handler's result and
+    exceptions pass through unchanged; one EMF line is printed per invocation
+    with its duration, cold start, errors and everything recorded through
+    timed()/add_metric() while it ran.
+        @instrumented
+        def lambda_handler(event, context):
+            ...
+    """
+    @wraps(func)
+    def wrapper(event, context):
+        global _cold_start, _latest
+        event_dict = event if isinstance(event, dict) else {}
+        metrics = InvocationMetrics(_function_name(func, context), event_dict.get("objectName"), _cold_start)
+        _cold_start = False
+        org_id = (event_dict.get("requestDetails") or {}).get("orgId")
+        if org_id:
+            metrics.properties["orgId"] = org_id
+        if getattr(context, "aws_request_id", None):
+            metrics.properties["requestId"] = context.aws_request_id
+        metrics.add("ColdStart", 1 if metrics.cold_start else 0)
+
+        previous = getattr(_active, "metrics", None)
+        _active.metrics = metrics
+        _latest = metrics
+        started = time.perf_counter()
+        try:
+            result = func(event, context)
+            # the handlers report most failures as a 500-style result instead of raising
+            status = result.get("statusCode") if isinstance(result, dict) else None
+            failed = isinstance(status, int) and status >= 500
+            metrics.add("Errors", 1 if failed else 0)
+            return result
+        except Exception:
+            metrics.add("Errors", 1)
+            raise
+        finally:
+            metrics.add("DurationMs", round((time.perf_counter() - started) * 1000, 3), "Milliseconds")
+            _active.metrics = previous
+            if _latest is metrics:
+                _latest = previous
+            # no Salesforce slot may stay held while the container is frozen
+            governor.release_idle()
+            try:
+                emit(metrics)
+            except Exception as e:
+                logger.warning(f"Failed to emit metrics for {func.__name__}: {e}")
+
+    return wrapper
+
+
 def lambda_exception_handler(func):
     """
     Decorator for handling exceptions and logging in AWS Lambda.
@@ -15,6 +190,8 @@ def lambda_exception_handler(func):
         def lambda_handler(event, context):
             ...
     """
+    measured = instrumented(func)
+
     @wraps(func)
     def wrapper(event, context):
         logger.info(f"Lambda {func.__name__} started")
@@ -22,7 +199,7 @@ def lambda_exception_handler(func):
 
         try:
             # Execute the main Lambda function
-            result = func(event, context)
+            result = measured(event, context)
             logger.info(f"Lambda {func.__name__} completed successfully")
 
             return {
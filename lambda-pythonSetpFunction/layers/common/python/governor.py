@@ -0,0 +1,230 @@
+"""
+Org-wide throttle for Salesforce calls.
+
+Every call takes a token from a per-org token bucket and holds one of
+GOVERNOR_MAX_CONCURRENT slots until its response is closed. Bucket and slots
+live in the shared state store under "governor#<org>", so every Lambda of
+every running backup draws from one budget. Tokens are leased from the
+shared bucket GOVERNOR_LEASE_TOKENS at a time, so the bucket costs well under
+one write per call. A slot is one item, leased with a conditional put on a
+slot picked at random (a Query only when that one is taken) and deleted,
+conditionally on its holder, as soon as its call is done. A slot freed while
+another thread of the same container waits is handed over without touching
+the store. Slots carry a TTL, so a crashed holder frees them too.
+
+The refill rate follows the org's Sforce-Limit-Info header (api-usage=used/limit).
+It stays at GOVERNOR_MAX_RATE while plenty of the daily allowance is left.
+Over the last GOVERNOR_SLOWDOWN_SHARE of the limit before the reserve kept
+for the org's other integrations it tapers to GOVERNOR_MIN_RATE. It is halved
+whenever Salesforce throttles (429, 503, REQUEST_LIMIT_EXCEEDED) and climbs
+back by a tenth of the maximum per healthy response.
+"""
+import os
+import random
+import re
+import threading
+import time
+import uuid
+
+from state_store import get_store
+
+ENABLED = os.environ.get("GOVERNOR_ENABLED", "true").lower() == "true"
+MAX_RATE = float(os.environ.get("GOVERNOR_MAX_RATE", "20"))
+MIN_RATE = float(os.environ.get("GOVERNOR_MIN_RATE", "0.5"))
+BURST = float(os.environ.get("GOVERNOR_BURST", "40"))
+LEASE_TOKENS = max(int(os.environ.get("GOVERNOR_LEASE_TOKENS", "5")), 1)
+# Salesforce allows 25 concurrent long-running requests per production org
+MAX_CONCURRENT = int(os.environ.get("GOVERNOR_MAX_CONCURRENT", "25"))
+SLOT_TTL_SECONDS = int(os.environ.get("GOVERNOR_SLOT_TTL_SECONDS", "900"))
+MAX_WAIT_SECONDS = float(os.environ.get("GOVERNOR_MAX_WAIT_SECONDS", "120"))
+API_RESERVE = float(os.environ.get("GOVERNOR_API_RESERVE", "0.2"))
+SLOWDOWN_SHARE = float(os.environ.get("GOVERNOR_SLOWDOWN_SHARE", "0.2"))
+POLL_SECONDS = 0.2
+
+THROTTLE_STATUS_CODES = {429, 503}
+_API_USAGE = re.compile(r"api-usage=(\d+)/(\d+)")
+
+_governors = {}
+_governors_lock = threading.Lock()
+
+
+class GovernorTimeout(RuntimeError):
+    pass
+
+
+def target_rate(used, limit):
+    """Calls per second that keep the org's daily API usage out of the reserve."""
+    headroom = limit * (1 - API_RESERVE) - used
+    taper = max(limit * SLOWDOWN_SHARE, 1)
+    return max(MIN_RATE, MAX_RATE * min(max(headroom / taper, 0.0), 1.0))
+
+
+def is_throttled(response):
+    status = getattr(response, "status_code", None)
+    if status in THROTTLE_STATUS_CODES:
+        return True
+    # the daily limit is reported as 403 REQUEST_LIMIT_EXCEEDED; error bodies are small
+    return status == 403 and "REQUEST_LIMIT_EXCEEDED" in (getattr(response, "text", "") or "")
+
+
+class Governor:
+    def __init__(self, org_id):
+        self.pk = f"governor#{org_id}"
+        self.rate = MAX_RATE
+        self._tokens = 0  # leased from the shared bucket, spent locally
+        self.holder = uuid.uuid4().hex  # recorded on the slots this container holds
+        self._idle = []  # (slot, leasedAt) freed while a thread of this container was waiting
+        self._waiting = 0
+        self._rate_changed = False
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Wait for a token and a free slot; returns the slot to release."""
+        deadline = time.monotonic() + MAX_WAIT_SECONDS
+        self._take_token(deadline)
+        return self._take_slot(deadline)
+
+    def release(self, slot):
+        """Hand the slot to a waiting thread of this container, or back to the store."""
+        with self._lock:
+            if self._waiting > len(self._idle):
+                self._idle.append(slot)
+                return
+        self._delete(slot[0])
+
+    def release_idle(self):
+        """Give back slots freed for waiters that gave up (called when a handler finishes)."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for sk, _ in idle:
+            self._delete(sk)
+
+    def _delete(self, sk):
+        try:
+            # only our own lease: after a TTL lapse the slot may belong to another container
+            get_store().delete_if(self.pk, sk, "holder", self.holder)
+        except Exception as e:
+            # the slot's TTL frees it eventually
+            print(f"Failed to release {self.pk} {sk}: {e}")
+
+    def observe(self, response):
+        """Adjust the rate from a Salesforce response."""
+        headers = getattr(response, "headers", None) or {}
+        usage = _API_USAGE.search(headers.get("Sforce-Limit-Info", ""))
+        with self._lock:
+            if is_throttled(response):
+                rate = max(MIN_RATE, self.rate / 2)
+                self._tokens = 0
+            elif usage:
+                rate = min(target_rate(int(usage.group(1)), int(usage.group(2))), self.rate + MAX_RATE / 10)
+            else:
+                return
+            if rate != self.rate:
+                self.rate = rate
+                self._rate_changed = True
+
+    def _take_token(self, deadline):
+        while True:
+            with self._lock:
+                if self._tokens < 1:
+                    wait = self._lease_tokens()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+            self._sleep(wait, deadline, "an API call token")
+
+    def _lease_tokens(self):
+        """Move up to LEASE_TOKENS from the shared bucket; returns seconds to wait when it is empty."""
+        store = get_store()
+        for _ in range(5):
+            item = store.get(self.pk, "bucket")
+            now = time.time()
+            if item is None:
+                tokens, version = BURST, None
+            else:
+                tokens = min(BURST, item["tokens"] + max(now - item["updatedAt"], 0) * item["rate"])
+                version = item.get("version")
+                if not self._rate_changed:
+                    # another container may have learnt a new rate
+                    self.rate = item["rate"]
+            take = min(LEASE_TOKENS, int(tokens))
+            if take < 1:
+                return (1 - tokens) / self.rate
+            updated = {"tokens": tokens - take, "updatedAt": now, "rate": self.rate}
+            if store.put_if_unchanged(self.pk, "bucket", updated, version):
+                self._rate_changed = False
+                self._tokens += take
+                return 0
+        # lost every race to other containers; they are busy, so back off a little
+        return POLL_SECONDS
+
+    def _take_slot(self, deadline):
+        while True:
+            with self._lock:
+                if self._idle:
+                    return self._renew(self._idle.pop())
+            slot = self._lease_slot()
+            if slot is not None:
+                return slot
+            with self._lock:
+                self._waiting += 1
+            try:
+                self._sleep(POLL_SECONDS, deadline, "a concurrency slot")
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+
+    def _lease_slot(self):
+        """Lease one slot from the store; None when every slot is taken."""
+        # most of the time a random slot is free, which saves the Query
+        guess = f"slot#{random.randrange(MAX_CONCURRENT):04d}"
+        if self._put_slot(guess):
+            return guess, time.time()
+        held = {sk for sk, _ in get_store().query(self.pk) if sk.startswith("slot#")}
+        free = [f"slot#{n:04d}" for n in range(MAX_CONCURRENT) if f"slot#{n:04d}" not in held]
+        random.shuffle(free)
+        for sk in free[:3]:
+            if self._put_slot(sk):
+                return sk, time.time()
+        return None
+
+    def _put_slot(self, sk):
+        return get_store().put_if_absent(self.pk, sk, {"holder": self.holder}, ttl=SLOT_TTL_SECONDS)
+
+    def _renew(self, slot):
+        """Extend a handed-over slot held for over half its TTL, so it cannot lapse under a call."""
+        sk, leased_at = slot
+        now = time.time()
+        if now - leased_at < SLOT_TTL_SECONDS / 2:
+            return slot
+        try:
+            get_store().put(self.pk, sk, {"holder": self.holder}, ttl=SLOT_TTL_SECONDS)
+            return sk, now
+        except Exception as e:
+            print(f"Failed to renew {self.pk} {sk}: {e}")
+            return slot
+
+    def _sleep(self, seconds, deadline, waiting_for):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise GovernorTimeout(f"Waited {MAX_WAIT_SECONDS}s for {waiting_for} ({self.pk})")
+        time.sleep(min(max(seconds, 0.01), remaining) * random.uniform(1, 1.2))
+
+
+def release_idle():
+    """Give back every slot this container still holds idle (called when a handler finishes)."""
+    for governor in list(_governors.values()):
+        governor.release_idle()
+
+
+def get_governor(org_id):
+    governor = _governors.get(org_id)
+    if governor is None:
+        with _governors_lock:
+            governor = _governors.setdefault(org_id, Governor(org_id))
+    return governor
+
+
+def clear():
+    """Forget the per-org governors of this process (tests and local tooling)."""
+    _governors.clear()
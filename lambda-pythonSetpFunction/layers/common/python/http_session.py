@@ -0,0 +1,104 @@
+"""
+Pooled, retrying HTTP sessions for Salesforce calls.
+
+One requests.Session is kept per instance URL for the life of the container,
+so warm invocations reuse open keep-alive connections instead of paying a new
+TCP+TLS handshake per call. Throttling (429), unavailability (502/503/504) and
+dropped connections are retried with exponential backoff and full jitter,
+honouring Retry-After when Salesforce sends it.
+"""
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+POOL_SIZE = int(os.environ.get("SF_HTTP_POOL_SIZE", "10"))
+MAX_RETRIES = int(os.environ.get("SF_HTTP_MAX_RETRIES", "4"))
+BACKOFF_BASE_SECONDS = float(os.environ.get("SF_HTTP_BACKOFF_BASE_SECONDS", "0.5"))
+BACKOFF_MAX_SECONDS = float(os.environ.get("SF_HTTP_BACKOFF_MAX_SECONDS", "20"))
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+# A read timeout or reset on a POST may mean Salesforce already acted on it
+# (e.g. created a Bulk job), so only connect failures are retried for these.
+NON_IDEMPOTENT_METHODS = {"POST", "PATCH"}
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _base_url(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def get_session(url):
+    """Return the pooled session for the instance serving url."""
+    key = _base_url(url)
+    session = _sessions.get(key)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _sessions[key] = session
+    return session
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Seconds to sleep before retry number attempt (0-based)."""
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX_SECONDS)
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+
+def _connection_never_opened(error):
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def _is_retryable_error(method, error):
+    if method.upper() in NON_IDEMPOTENT_METHODS:
+        return _connection_never_opened(error)
+    return True
+
+
+def request(method, url, retries=None, observe=None, **kwargs):
+    """
+    Send a request on the pooled session, retrying transient failures.
+    The final response is returned as-is (callers still raise_for_status);
+    the final connection error is raised. observe, when given, sees every
+    response including the ones that are retried.
+    """
+    retries = MAX_RETRIES if retries is None else retries
+    for attempt in range(retries + 1):
+        try:
+            response = get_session(url).request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == retries or not _is_retryable_error(method, e):
+                raise
+            delay = backoff_delay(attempt)
+            print(f"{method} {url} failed ({e}); retrying in {delay:.2f}s")
+            time.sleep(delay)
+            continue
+
+        if observe is not None:
+            observe(response)
+        if response.status_code in RETRY_STATUS_CODES and attempt < retries:
+            delay = backoff_delay(attempt, response.headers.get("Retry-After"))
+            print(f"{method} {url} returned {response.status_code}; retrying in {delay:.2f}s")
+            response.close()
+            time.sleep(delay)
+            continue
+        return response
@@ -0,0 +1,130 @@
+"""
+Shared Bulk query job states.
+
+InitBulkBackup registers every job it creates under "jobs#<org>". When a
+branch asks for its job's state and the stored state is older than
+POLL_FRESH_SECONDS, the first branch to take the org's poll lease refreshes
+every in-flight job of the org through /composite/batch (25 jobs per call).
+Branches that lose the lease use the last stored state and look again on
+their next round, so Salesforce sees about one status sweep per round
+however many objects are in flight.
+
+recommend_wait turns a job's progress into the next poll interval, bounded
+by POLL_MIN_WAIT_SECONDS and POLL_MAX_WAIT_SECONDS. Each stored job carries
+"freshUntil" (the last check plus that interval, as an ISO timestamp). The
+state machine reads the job item itself with the DynamoDB GetItem integration
+and waits until then, so it only invokes CheckBackupStatus (and this module)
+once a job's stored state is stale or final: about one Lambda per org per
+polling round instead of one per object.
+"""
+import os
+import time
+from datetime import datetime, timezone
+
+from sf_utils import sf_request
+from state_store import get_store
+
+POLL_MIN_WAIT_SECONDS = int(os.environ.get("POLL_MIN_WAIT_SECONDS", "10"))
+POLL_MAX_WAIT_SECONDS = int(os.environ.get("POLL_MAX_WAIT_SECONDS", "900"))
+# A stored state younger than this is served without asking Salesforce
+POLL_FRESH_SECONDS = int(os.environ.get("JOB_POLL_FRESH_SECONDS", str(POLL_MIN_WAIT_SECONDS)))
+# Processing rate assumed for a job before Salesforce has reported any progress
+ASSUMED_RECORDS_PER_SECOND = int(os.environ.get("POLL_ASSUMED_RECORDS_PER_SECOND", "20000"))
+JOB_TTL_SECONDS = 7 * 24 * 3600
+COMPOSITE_BATCH_SIZE = 25
+TERMINAL_STATES = {"JobComplete", "Failed", "Aborted"}
+
+
+def register_job(org_id, job_id, object_name, state, estimated_records=None):
+    now = time.time()
+    get_store().put(f"jobs#{org_id}", job_id, {
+        "objectName": object_name, "state": state, "createdAt": now, "checkedAt": now,
+        "estimatedRecords": estimated_records,
+        # not checked yet: the first read after the initial wait refreshes it
+        "freshUntil": _timestamp(now),
+    }, ttl=JOB_TTL_SECONDS)
+
+
+def get_job(org_id, instance_url, version, job_id):
+    """
+    Stored record of job_id (state, numberRecordsProcessed, createdAt, ...),
+    polling Salesforce only when the shared copy is stale.
+    """
+    store = get_store()
+    job = store.get(f"jobs#{org_id}", job_id)
+    if job and (job["state"] in TERMINAL_STATES or time.time() - job["checkedAt"] < POLL_FRESH_SECONDS):
+        return job
+
+    # a job missing from the store (e.g. created before it existed) is polled directly
+    if job is not None and not store.put_if_absent(f"lease#{org_id}", "job-poller", {"holder": job_id}, ttl=POLL_FRESH_SECONDS):
+        print(f"Another branch is refreshing job states for {org_id}; using state from {job['checkedAt']}")
+        return job
+
+    in_flight = {sk: item for sk, item in store.query(f"jobs#{org_id}") if item.get("state") not in TERMINAL_STATES}
+    in_flight.setdefault(job_id, job or {})
+    estimates = {sk: item.get("estimatedRecords") for sk, item in in_flight.items()}
+    return refresh_jobs(org_id, instance_url, version, list(in_flight), estimates).get(job_id) or job
+
+
+def recommend_wait(job, estimated_records=None, now=None):
+    """
+    Seconds to wait before the next poll. With progress reported, the wait
+    is the time left at the measured rate; with only an estimate, the time
+    left at ASSUMED_RECORDS_PER_SECOND; with neither, half the time the job
+    has run so far, so long jobs back off. Short jobs stay at the minimum.
+    """
+    now = now or time.time()
+    elapsed = max(now - job.get("createdAt", now), 0)
+    processed = job.get("numberRecordsProcessed") or 0
+    if estimated_records and processed and elapsed and estimated_records > processed:
+        wait = (estimated_records - processed) / (processed / elapsed)
+    elif estimated_records and estimated_records / ASSUMED_RECORDS_PER_SECOND > elapsed:
+        wait = estimated_records / ASSUMED_RECORDS_PER_SECOND - elapsed
+    else:
+        wait = elapsed / 2
+    return int(min(max(wait, POLL_MIN_WAIT_SECONDS), POLL_MAX_WAIT_SECONDS))
+
+
+def refresh_jobs(org_id, instance_url, version, job_ids, estimates=None):
+    """Fetch the state of every job in job_ids and store them; returns {jobId: job record}."""
+    estimates = estimates or {}
+    store = get_store()
+    url = f"{instance_url}/services/data/{version}/composite/batch"
+    jobs = {}
+    for i in range(0, len(job_ids), COMPOSITE_BATCH_SIZE):
+        batch = job_ids[i:i + COMPOSITE_BATCH_SIZE]
+        payload = {"batchRequests": [{"method": "GET", "url": f"{version}/jobs/query/{job_id}"} for job_id in batch]}
+        response = sf_request(org_id, "POST", url, headers={"Content-Type": "application/json"}, json=payload)
+        response.raise_for_status()
+        for job_id, result in zip(batch, response.json().get("results", [])):
+            if result.get("statusCode") != 200:
+                print(f"Could not read job {job_id}: {result.get('result')}")
+                continue
+            info = result["result"]
+            now = time.time()
+            job = {
+                "objectName": info.get("object"),
+                "state": info["state"],
+                "numberRecordsProcessed": info.get("numberRecordsProcessed", 0),
+                "createdAt": _epoch(info.get("createdDate")) or now,
+                "checkedAt": now,
+                "estimatedRecords": estimates.get(job_id),
+            }
+            job["freshUntil"] = _timestamp(now + recommend_wait(job, job["estimatedRecords"], now=now))
+            jobs[job_id] = job
+            store.put(f"jobs#{org_id}", job_id, jobs[job_id], ttl=JOB_TTL_SECONDS)
+    print(f"Refreshed {len(jobs)} of {len(job_ids)} in-flight job(s) for {org_id}")
+    return jobs
+
+
+def _timestamp(epoch):
+    # the RFC 3339 form Step Functions compares with $$.State.EnteredTime
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _epoch(timestamp):
+    # Bulk API dates look like 2025-01-01T10:15:30.000+0000
+    try:
+        return datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S.%f%z").timestamp()
+    except (TypeError, ValueError):
+        return None
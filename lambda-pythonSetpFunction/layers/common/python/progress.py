@@ -0,0 +1,150 @@
+"""
+Run-level progress of a backup execution.
+
+The state machine's InitRun state puts {"id": <execution name>, "startedAt":
+<execution start>} into requestDetails["run"], which reaches every handler.
+Handlers add to the run's counters with record(); each call is a single
+atomic update of one item ("run#<id>", "progress") in the shared state store,
+so concurrent Map branches never overwrite each other and reading a run is
+one GetItem. Events without a run (direct invocations, old executions) are
+not tracked.
+
+Counters (an Id-range chunk of a split object counts as one object):
+objectsPlanned, objectsSubmitted, objectsCompleted, objectsFailed,
+recordsPlanned (estimated), recordsExported, bytesExported,
+filesDownloaded, filesFailed.
+
+    STATE_TABLE=<table> python progress.py <run id> [--watch SECONDS]
+"""
+import os
+import time
+from datetime import datetime
+
+from state_store import get_store
+
+PROGRESS_TTL_SECONDS = int(os.environ.get("PROGRESS_TTL_DAYS", "30")) * 24 * 3600
+
+COUNTERS = (
+    "objectsPlanned", "objectsSubmitted", "objectsCompleted", "objectsFailed",
+    "recordsPlanned", "recordsExported", "bytesExported", "filesDownloaded", "filesFailed",
+)
+
+
+def _key(run_id):
+    return f"run#{run_id}", "progress"
+
+
+def _epoch(timestamp):
+    if timestamp is None:
+        return None
+    try:
+        return datetime.fromisoformat(str(timestamp).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def run_id(request_details):
+    return ((request_details or {}).get("run") or {}).get("id")
+
+
+def record(request_details, **counts):
+    """Add counts to the run of request_details; never raises."""
+    run = (request_details or {}).get("run") or {}
+    counts = {name: value for name, value in counts.items() if value}
+    if not run.get("id") or not counts:
+        return
+    now = time.time()
+    pk, sk = _key(run["id"])
+    try:
+        get_store().increment(
+            pk, sk, counts,
+            values={"updatedAt": now},
+            defaults={
+                "runId": run["id"],
+                "orgId": request_details.get("orgId"),
+                "backupType": request_details.get("BackUpType"),
+                "startedAt": _epoch(run.get("startedAt")) or now,
+                "expiresAt": int(now + PROGRESS_TTL_SECONDS),
+            },
+        )
+    except Exception as e:
+        # progress is informational; the backup itself must not fail over it
+        print(f"Failed to record progress of run {run['id']}: {e}")
+
+
+def summarize(item, now=None):
+    """Counters of a progress item plus state, percentage, throughput and ETA."""
+    now = now or time.time()
+    progress = {name: item.get(name, 0) for name in COUNTERS}
+    progress.update({key: item.get(key) for key in ("runId", "orgId", "backupType", "startedAt", "updatedAt")})
+    planned = progress["objectsPlanned"]
+    finished = progress["objectsCompleted"] + progress["objectsFailed"]
+    done = bool(planned) and finished >= planned
+    progress["state"] = "Finished" if done else "Running"
+
+    started = item.get("startedAt") or now
+    elapsed = max((item.get("updatedAt") if done else now) - started, 0)
+    progress["elapsedSeconds"] = round(elapsed, 1)
+    progress["recordsPerSecond"] = round(progress["recordsExported"] / elapsed, 1) if elapsed else None
+    progress["bytesPerSecond"] = round(progress["bytesExported"] / elapsed, 1) if elapsed else None
+
+    # record estimates give a finer measure than whole objects when there are any
+    if progress["recordsPlanned"] and progress["recordsExported"]:
+        fraction = min(progress["recordsExported"] / progress["recordsPlanned"], 1.0)
+    elif planned:
+        fraction = finished / planned
+    else:
+        fraction = 0.0
+    if done:
+        fraction = 1.0
+    progress["percentComplete"] = round(fraction * 100, 1)
+    progress["etaSeconds"] = round(elapsed * (1 - fraction) / fraction, 1) if 0 < fraction < 1 else (0 if done else None)
+    return progress
+
+
+def get_progress(run_id):
+    """Live progress of a run, or None when nothing was recorded for it."""
+    item = get_store().get(*_key(run_id))
+    return summarize(item) if item is not None else None
+
+
+def format_progress(progress):
+    eta = progress["etaSeconds"]
+    lines = [
+        f"Run {progress['runId']} ({progress['orgId']}, {progress['backupType']}): {progress['state']}, "
+        f"{progress['percentComplete']}% after {progress['elapsedSeconds']}s"
+        + (f", about {eta}s left" if eta else ""),
+        f"  objects  planned {progress['objectsPlanned']}, submitted {progress['objectsSubmitted']}, "
+        f"completed {progress['objectsCompleted']}, failed {progress['objectsFailed']}",
+        f"  records  {progress['recordsExported']} of ~{progress['recordsPlanned']}"
+        + (f" ({progress['recordsPerSecond']}/s)" if progress["recordsPerSecond"] is not None else ""),
+        f"  bytes    {progress['bytesExported']}"
+        + (f" ({progress['bytesPerSecond']}/s)" if progress["bytesPerSecond"] is not None else ""),
+        f"  files    {progress['filesDownloaded']} downloaded, {progress['filesFailed']} failed",
+    ]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Show the progress of a backup run.")
+    parser.add_argument("run_id", help="Step Functions execution name of the run")
+    parser.add_argument("--watch", type=float, metavar="SECONDS", help="refresh every SECONDS until the run finishes")
+    parser.add_argument("--json", action="store_true", help="print the raw progress document")
+    args = parser.parse_args(argv)
+
+    while True:
+        progress = get_progress(args.run_id)
+        if progress is None:
+            print(f"No progress recorded for run {args.run_id}")
+            return 1
+        print(json.dumps(progress, indent=2) if args.json else format_progress(progress))
+        if not args.watch or progress["state"] == "Finished":
+            return 0
+        time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
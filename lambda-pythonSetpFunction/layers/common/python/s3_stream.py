@@ -0,0 +1,142 @@
+"""
+Bounded-memory streaming uploads to S3.
+
+MultipartUpload is a write-only file object: bytes written to it are cut into
+parts and uploaded in the background while the caller keeps producing. At most
+S3_MAX_INFLIGHT_PARTS parts are uploading at once and writers block until a
+slot frees up, so memory stays around part_size * (max_in_flight + 2) no
+matter how large the object is. Objects smaller than one part are written
+with a single put_object.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from exception_handler import add_metric, bound, timed
+
+MB = 1024 * 1024
+MIN_PART_SIZE = 5 * MB  # S3 minimum for every part but the last
+PART_SIZE = max(int(os.environ.get("S3_PART_SIZE_MB", "8")) * MB, MIN_PART_SIZE)
+MAX_INFLIGHT_PARTS = max(int(os.environ.get("S3_MAX_INFLIGHT_PARTS", "4")), 1)
+READ_CHUNK_SIZE = 256 * 1024
+
+
+class MultipartUpload:
+    def __init__(self, s3, bucket, key, part_size=None, max_in_flight=None, **put_kwargs):
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(part_size or PART_SIZE, MIN_PART_SIZE)
+        self.max_in_flight = max_in_flight or MAX_INFLIGHT_PARTS
+        self.put_kwargs = put_kwargs
+        self.bytes_written = 0
+        self.closed = False
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._parts = []
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self.bytes_written
+
+    def flush(self):
+        pass
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError(f"write to closed upload s3://{self.bucket}/{self.key}")
+        self._buffer += data
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self.part_size:
+            part = bytes(self._buffer[:self.part_size])
+            del self._buffer[:self.part_size]
+            self._submit(part)
+        return len(data)
+
+    def _submit(self, part):
+        self._raise_failed_part()
+        if self._upload_id is None:
+            response = self.s3.create_multipart_upload(Bucket=self.bucket, Key=self.key, **self.put_kwargs)
+            self._upload_id = response["UploadId"]
+            self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight)
+        # blocks while max_in_flight parts are still uploading
+        self._slots.acquire()
+        number = len(self._parts) + 1
+        self._parts.append((number, self._executor.submit(bound(self._upload_part), number, part)))
+
+    def _upload_part(self, number, data):
+        try:
+            with timed("S3Upload"):
+                response = self.s3.upload_part(
+                    Bucket=self.bucket, Key=self.key, UploadId=self._upload_id, PartNumber=number, Body=data
+                )
+            add_metric("S3Bytes", len(data), "Bytes")
+            return response["ETag"]
+        finally:
+            self._slots.release()
+
+    def _raise_failed_part(self):
+        for _, future in self._parts:
+            if future.done() and future.exception():
+                raise future.exception()
+
+    def close(self):
+        """Finish the object; a no-op if already closed."""
+        if self.closed:
+            return
+        try:
+            if self._upload_id is None:
+                with timed("S3Upload"):
+                    self.s3.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer), **self.put_kwargs)
+                add_metric("S3Bytes", len(self._buffer), "Bytes")
+            else:
+                if self._buffer:
+                    self._submit(bytes(self._buffer))
+                parts = [{"PartNumber": number, "ETag": future.result()} for number, future in self._parts]
+                with timed("S3Upload"):
+                    self.s3.complete_multipart_upload(
+                        Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                        MultipartUpload={"Parts": parts},
+                    )
+        except Exception:
+            self.abort()
+            raise
+        self._buffer = bytearray()
+        self.closed = True
+        if self._executor:
+            self._executor.shutdown(wait=False)
+
+    def abort(self):
+        """Drop everything uploaded so far so no orphaned parts are billed."""
+        self.closed = True
+        self._buffer = bytearray()
+        if self._executor:
+            self._executor.shutdown(wait=True)
+        if self._upload_id is not None:
+            try:
+                self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+            except Exception as e:
+                print(f"Failed to abort multipart upload for s3://{self.bucket}/{self.key}: {e}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def stream_to_s3(s3, chunks, bucket, key, **kwargs):
+    """Upload an iterable of byte chunks to S3; returns the number of bytes written."""
+    with MultipartUpload(s3, bucket, key, **kwargs) as upload:
+        for chunk in chunks:
+            if chunk:
+                upload.write(chunk)
+    return upload.bytes_written
@@ -1,8 +1,28 @@
 import os
+import base64
 import json
-import requests
-import boto3
-global_var = None
+import threading
+import time
+import governor
+import http_session
+from aws_clients import lazy_client
+from exception_handler import timed
+from state_store import get_store
+
+# Salesforce does not return expires_in for session tokens, so the lifetime is
+# configured to match the org's session timeout. Tokens are refreshed a margin
+# before they expire so an in-flight Bulk download never starts on a dying token.
+TOKEN_TTL_SECONDS = int(os.environ.get("SF_TOKEN_TTL_SECONDS", "3600"))
+TOKEN_REFRESH_MARGIN_SECONDS = int(os.environ.get("SF_TOKEN_REFRESH_MARGIN_SECONDS", "300"))
+SHARED_TOKEN_CACHE = os.environ.get("SF_SHARED_TOKEN_CACHE", "true").lower() == "true"
+# Tokens in the shared store are encrypted under this KMS key; unset (local runs) stores them as-is
+TOKEN_KMS_KEY_ID = os.environ.get("SF_TOKEN_KMS_KEY_ID")
+HTTP_TIMEOUT = (10, 120)
+
+# instance url -> {"access_token": ..., "expires_at": ...}; survives warm invocations
+_token_cache = {}
+_token_lock = threading.Lock()
+kms = lazy_client("kms")
 
 def _extract_access_token_from_response(resp):
     # resp may be dict, string (json), or nested with 'body'
@@ -26,20 +46,21 @@ def _extract_access_token_from_response(resp):
                 return resp[key]['access_token']
     return None
 
-def get(url, method="GET", headers=None, payload=None):
+def get(url, method="GET", headers=None, payload=None, OrgId=None):
+    # through sf_request, so these calls are paced and counted like every other Salesforce call
     try:
         if method == "GET":
-            response = requests.get(url, headers=headers, timeout=10)
+            response = sf_request(OrgId, "GET", url, headers=headers, timeout=10)
         else:
-            response = requests.post(url, headers=headers, json=payload, timeout=10)
+            response = sf_request(OrgId, "POST", url, headers=headers, json=payload, timeout=10)
         response.raise_for_status()
         return response.json()
     except Exception as e:
         print(f"HTTP request error: {e}")
         return None
 
-def post(url, headers=None, payload=None):
-    return get(url, method="POST", headers=headers, payload=payload)
+def post(url, headers=None, payload=None, OrgId=None):
+    return get(url, method="POST", headers=headers, payload=payload, OrgId=OrgId)
 
 def getOrganizationDetails(orgId):
     url = get_url(orgId)
@@ -47,32 +68,168 @@ def getOrganizationDetails(orgId):
     return url, token, 'v65.0'
 
 def get_url(OrgId=None):
+    # SF_INSTANCE_URL points every org at one instance (e.g. the local fake Salesforce)
+    if os.environ.get('SF_INSTANCE_URL'):
+        return os.environ['SF_INSTANCE_URL']
     if OrgId == 'qualityzeqms.my.salesforce.com':
         return 'https://qualityzeqms.my.salesforce.com'
     return 'https://qpmsint2-dev-ed.my.salesforce.com'
 
+def _token_is_fresh(entry, now=None):
+    if not entry or not entry.get("access_token"):
+        return False
+    return entry.get("expires_at", 0) - TOKEN_REFRESH_MARGIN_SECONDS > (now or time.time())
+
+def _token_expiry(token_data, now=None):
+    now = now or time.time()
+    if isinstance(token_data, dict):
+        if token_data.get("expires_in"):
+            return now + int(token_data["expires_in"])
+        if token_data.get("issued_at"):
+            # issued_at is epoch milliseconds
+            return int(token_data["issued_at"]) / 1000 + TOKEN_TTL_SECONDS
+    return now + TOKEN_TTL_SECONDS
+
+def _seal(cache_key, entry):
+    """The store's copy of a token entry: the token encrypted under TOKEN_KMS_KEY_ID."""
+    if not TOKEN_KMS_KEY_ID:
+        return entry
+    ciphertext = kms.encrypt(
+        KeyId=TOKEN_KMS_KEY_ID,
+        Plaintext=entry["access_token"].encode("utf-8"),
+        EncryptionContext={"instanceUrl": cache_key},
+    )["CiphertextBlob"]
+    return {"encryptedToken": base64.b64encode(ciphertext).decode("ascii"), "expires_at": entry["expires_at"]}
+
+def _unseal(cache_key, item):
+    if not item or "encryptedToken" not in item:
+        return item
+    plaintext = kms.decrypt(
+        CiphertextBlob=base64.b64decode(item["encryptedToken"]),
+        EncryptionContext={"instanceUrl": cache_key},
+    )["Plaintext"]
+    return {"access_token": plaintext.decode("utf-8"), "expires_at": item["expires_at"]}
+
+def _load_shared_token(cache_key):
+    if not SHARED_TOKEN_CACHE:
+        return None
+    try:
+        return _unseal(cache_key, get_store().get("token", cache_key))
+    except Exception as e:
+        print(f"Shared token cache read failed: {e}")
+        return None
+
+def _save_shared_token(cache_key, entry):
+    if not SHARED_TOKEN_CACHE:
+        return
+    try:
+        get_store().put("token", cache_key, _seal(cache_key, entry), ttl=max(int(entry["expires_at"] - time.time()), 1))
+    except Exception as e:
+        print(f"Shared token cache write failed: {e}")
+
 def get_access_token(OrgId=None):
-    # global global_var
-    
-    
-    
-    # # If cached and valid, return
-    # if isinstance(global_var, dict):
-    #     token = _extract_access_token_from_response(global_var)
-    #     if token:
-    #         return token
-
-    # # generate and cache
-    token_data = generate_access_token(OrgId)
-    print(f"Generated token data: {token_data}")
-    # token = _extract_access_token_from_response(token_data)
-    # if token:
-    #     # store a normalized dict
-    #     global_var = {'access_token': token}
-    #     return token
-    token = _extract_access_token_from_response(token_data)
-
-    return token
+    """
+    Return a valid access token for the org.
+    Looks in the warm-container cache, then the shared store, and only then
+    asks Salesforce for a new token, which is written back to both caches.
+    """
+    cache_key = get_url(OrgId)
+    entry = _token_cache.get(cache_key)
+    if _token_is_fresh(entry):
+        return entry["access_token"]
+
+    with _token_lock:
+        # another thread may have refreshed while we waited
+        entry = _token_cache.get(cache_key)
+        if _token_is_fresh(entry):
+            return entry["access_token"]
+
+        entry = _load_shared_token(cache_key)
+        if _token_is_fresh(entry):
+            _token_cache[cache_key] = entry
+            return entry["access_token"]
+
+        with timed("TokenFetch"):
+            token_data = generate_access_token(OrgId)
+        token = _extract_access_token_from_response(token_data)
+        if not token:
+            return None
+        entry = {"access_token": token, "expires_at": _token_expiry(token_data)}
+        _token_cache[cache_key] = entry
+        _save_shared_token(cache_key, entry)
+        return token
+
+def invalidate_access_token(OrgId=None, token=None):
+    """
+    Drop a token Salesforce rejected. When token is given only that token is
+    dropped, so a thread holding a stale token cannot evict a fresh one.
+    """
+    cache_key = get_url(OrgId)
+    with _token_lock:
+        entry = _token_cache.get(cache_key)
+        if entry and (token is None or entry.get("access_token") == token):
+            _token_cache.pop(cache_key, None)
+        if not SHARED_TOKEN_CACHE:
+            return
+        try:
+            shared = _load_shared_token(cache_key)
+            if shared and (token is None or shared.get("access_token") == token):
+                get_store().delete("token", cache_key)
+        except Exception as e:
+            print(f"Shared token cache delete failed: {e}")
+
+def sf_request(OrgId, method, url, **kwargs):
+    """
+    Call Salesforce with the org's cached token over the pooled session.
+    A 401 means the session was revoked or timed out early, so the token is
+    invalidated and the request is retried once with a fresh one.
+    The call is paced by the org's governor and holds one of its concurrency
+    slots until the response is read (or closed, for stream=True).
+    """
+    if not governor.ENABLED:
+        return _send(OrgId, method, url, **kwargs)
+    org_governor = governor.get_governor(OrgId)
+    with timed("GovernorWait"):
+        slot = org_governor.acquire()
+    try:
+        response = _send(OrgId, method, url, observe=org_governor.observe, **kwargs)
+    except Exception:
+        org_governor.release(slot)
+        raise
+    if not kwargs.get("stream"):
+        org_governor.release(slot)
+        return response
+
+    close = response.close
+    released = []
+
+    def close_and_release():
+        try:
+            close()
+        finally:
+            if not released:
+                released.append(True)
+                org_governor.release(slot)
+
+    response.close = close_and_release
+    return response
+
+def _send(OrgId, method, url, **kwargs):
+    headers = dict(kwargs.pop("headers", None) or {})
+    kwargs.setdefault("timeout", HTTP_TIMEOUT)
+    token = get_access_token(OrgId)
+    headers["Authorization"] = f"Bearer {token}"
+    # time to the response headers; streamed bodies are read by the caller
+    with timed("SalesforceRequest"):
+        response = http_session.request(method, url, headers=headers, **kwargs)
+    if response.status_code == 401:
+        response.close()
+        invalidate_access_token(OrgId, token)
+        token = get_access_token(OrgId)
+        headers["Authorization"] = f"Bearer {token}"
+        with timed("SalesforceRequest"):
+            response = http_session.request(method, url, headers=headers, **kwargs)
+    return response
 
 def generate_access_token(OrgId=None):
     """
@@ -88,8 +245,8 @@ def generate_access_token(OrgId=None):
     # client_id = credentials.get('client_id')
     # client_secret = credentials.get('client_secret')
     
-    client_id = ''
-    client_secret = ''
+    client_id = os.environ.get('SF_CLIENT_ID', '')
+    client_secret = os.environ.get('SF_CLIENT_SECRET', '')
 
     if OrgId == 'qualityzeqms.my.salesforce.com':
         client_id = ''
@@ -123,10 +280,9 @@ def generate_access_token(OrgId=None):
         }
 
     try:
-        resp = requests.post(token_url, data=payload, timeout=10)
+        resp = http_session.request("POST", token_url, data=payload, timeout=10)
         resp.raise_for_status()
         try:
-            print("Token response JSON:", resp.json())
             return resp.json()
         except ValueError:
             # sometimes libraries return text; try parse
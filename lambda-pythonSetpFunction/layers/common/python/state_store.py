@@ -0,0 +1,263 @@
+"""
+Small key/value store shared by every backup Lambda.
+
+Items are addressed by a partition key (pk) and a sort key (sk). In AWS the
+store is the DynamoDB table named by STATE_TABLE; when that variable is not set
+(unit tests, sam local, the local tools) an in-process LocalStore stands in so
+the handlers behave the same way.
+
+Items may carry an "expiresAt" epoch-seconds attribute. DynamoDB TTL deletes
+lazily, so both stores treat an expired item as missing on read.
+"""
+import os
+import threading
+import time
+from decimal import Decimal
+
+STATE_TABLE = os.environ.get("STATE_TABLE")
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def _is_expired(item, now=None):
+    expires_at = item.get("expiresAt")
+    return expires_at is not None and expires_at <= (now or time.time())
+
+
+class LocalStore:
+    """In-memory stand-in for the shared DynamoDB table."""
+
+    def __init__(self):
+        self._items = {}
+        self._lock = threading.RLock()
+
+    def get(self, pk, sk):
+        with self._lock:
+            item = self._items.get((pk, sk))
+            if item is None:
+                return None
+            if _is_expired(item):
+                del self._items[(pk, sk)]
+                return None
+            return dict(item)
+
+    def put(self, pk, sk, item, ttl=None):
+        item = dict(item)
+        if ttl is not None:
+            item["expiresAt"] = int(time.time() + ttl)
+        with self._lock:
+            self._items[(pk, sk)] = item
+
+    def put_if_absent(self, pk, sk, item, ttl=None):
+        """Store item only if (pk, sk) is missing or expired; True when stored."""
+        with self._lock:
+            if self.get(pk, sk) is not None:
+                return False
+            self.put(pk, sk, item, ttl=ttl)
+            return True
+
+    def put_if_unchanged(self, pk, sk, item, version):
+        """
+        Store item only if the stored "version" still equals version (None:
+        the item must be missing); the item is written with version + 1.
+        True when stored.
+        """
+        with self._lock:
+            current = self.get(pk, sk)
+            if (None if current is None else current.get("version", 0)) != version:
+                return False
+            self.put(pk, sk, {**item, "version": (version or 0) + 1})
+            return True
+
+    def increment(self, pk, sk, counts, values=None, defaults=None):
+        """
+        Atomically add counts to numeric attributes (missing ones start at 0),
+        overwrite values and set defaults only where the attribute is missing.
+        """
+        with self._lock:
+            item = self.get(pk, sk) or {}
+            for name, value in (defaults or {}).items():
+                item.setdefault(name, value)
+            item.update(values or {})
+            for name, value in counts.items():
+                item[name] = item.get(name, 0) + value
+            self._items[(pk, sk)] = item
+
+    def query(self, pk):
+        """All live items under pk as (sk, item) pairs, in sk order."""
+        with self._lock:
+            keys = sorted(sk for (p, sk) in self._items if p == pk)
+            return [(sk, item) for sk in keys if (item := self.get(pk, sk)) is not None]
+
+    def delete(self, pk, sk):
+        with self._lock:
+            self._items.pop((pk, sk), None)
+
+    def delete_if(self, pk, sk, name, value):
+        """Delete (pk, sk) only while its name attribute equals value; True when deleted."""
+        with self._lock:
+            current = self.get(pk, sk)
+            if current is None or current.get(name) != value:
+                return False
+            self._items.pop((pk, sk), None)
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+def _to_dynamo(value):
+    if isinstance(value, float):
+        return Decimal(str(value))
+    if isinstance(value, dict):
+        return {k: _to_dynamo(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_to_dynamo(v) for v in value]
+    return value
+
+
+def _from_dynamo(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, dict):
+        return {k: _from_dynamo(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_from_dynamo(v) for v in value]
+    return value
+
+
+class DynamoDBStore:
+    """Shared store backed by a DynamoDB table keyed on (pk, sk)."""
+
+    def __init__(self, table_name):
+        import aws_clients
+        self.table = aws_clients.table(table_name)
+
+    def get(self, pk, sk):
+        response = self.table.get_item(Key={"pk": pk, "sk": sk}, ConsistentRead=True)
+        item = response.get("Item")
+        if item is None:
+            return None
+        item = _from_dynamo(item)
+        if _is_expired(item):
+            return None
+        item.pop("pk", None)
+        item.pop("sk", None)
+        return item
+
+    def put(self, pk, sk, item, ttl=None):
+        item = dict(item)
+        if ttl is not None:
+            item["expiresAt"] = int(time.time() + ttl)
+        self.table.put_item(Item=_to_dynamo({**item, "pk": pk, "sk": sk}))
+
+    def put_if_absent(self, pk, sk, item, ttl=None):
+        from botocore.exceptions import ClientError
+        item = dict(item)
+        if ttl is not None:
+            item["expiresAt"] = int(time.time() + ttl)
+        try:
+            self.table.put_item(
+                Item=_to_dynamo({**item, "pk": pk, "sk": sk}),
+                # an item TTL has not deleted yet counts as absent
+                ConditionExpression="attribute_not_exists(pk) OR expiresAt <= :now",
+                ExpressionAttributeValues={":now": int(time.time())},
+            )
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+
+    def put_if_unchanged(self, pk, sk, item, version):
+        from botocore.exceptions import ClientError
+        if version is None:
+            condition = {"ConditionExpression": "attribute_not_exists(pk)"}
+        else:
+            condition = {
+                "ConditionExpression": "version = :version",
+                "ExpressionAttributeValues": {":version": version},
+            }
+        try:
+            self.table.put_item(Item=_to_dynamo({**item, "version": (version or 0) + 1, "pk": pk, "sk": sk}), **condition)
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+
+    def increment(self, pk, sk, counts, values=None, defaults=None):
+        """One UpdateItem: ADD for counts, SET for values, if_not_exists for defaults."""
+        names, params, sets, adds = {}, {}, [], []
+        for i, (name, value) in enumerate((values or {}).items()):
+            names[f"#v{i}"], params[f":v{i}"] = name, value
+            sets.append(f"#v{i} = :v{i}")
+        for i, (name, value) in enumerate((defaults or {}).items()):
+            names[f"#d{i}"], params[f":d{i}"] = name, value
+            sets.append(f"#d{i} = if_not_exists(#d{i}, :d{i})")
+        for i, (name, value) in enumerate(counts.items()):
+            names[f"#c{i}"], params[f":c{i}"] = name, value
+            adds.append(f"#c{i} :c{i}")
+        expression = " ".join(
+            f"{keyword} {', '.join(parts)}" for keyword, parts in (("SET", sets), ("ADD", adds)) if parts
+        )
+        if not expression:
+            return
+        self.table.update_item(
+            Key={"pk": pk, "sk": sk},
+            UpdateExpression=expression,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=_to_dynamo(params),
+        )
+
+    def query(self, pk):
+        from boto3.dynamodb.conditions import Key
+        results = []
+        kwargs = {"KeyConditionExpression": Key("pk").eq(pk), "ConsistentRead": True}
+        while True:
+            response = self.table.query(**kwargs)
+            for item in response.get("Items", []):
+                item = _from_dynamo(item)
+                if not _is_expired(item):
+                    sk = item.pop("sk")
+                    item.pop("pk", None)
+                    results.append((sk, item))
+            if "LastEvaluatedKey" not in response:
+                return results
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def delete(self, pk, sk):
+        self.table.delete_item(Key={"pk": pk, "sk": sk})
+
+    def delete_if(self, pk, sk, name, value):
+        from botocore.exceptions import ClientError
+        try:
+            self.table.delete_item(
+                Key={"pk": pk, "sk": sk},
+                ConditionExpression="#n = :v",
+                ExpressionAttributeNames={"#n": name},
+                ExpressionAttributeValues={":v": _to_dynamo(value)},
+            )
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+
+
+def get_store():
+    """Return the process-wide store, created on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = DynamoDBStore(STATE_TABLE) if STATE_TABLE else LocalStore()
+    return _store
+
+
+def set_store(store):
+    """Replace the process-wide store (tests and local tooling)."""
+    global _store
+    _store = store
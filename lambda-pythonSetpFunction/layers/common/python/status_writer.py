@@ -0,0 +1,87 @@
+"""
+Buffered writes of backup status records.
+
+StatusWriter collects status items (keyed by "Id", like the transaction
+table) and writes them 25 at a time with BatchWriteItem. UnprocessedItems
+are resubmitted with exponential backoff until DynamoDB accepts them or
+STATUS_WRITE_MAX_ATTEMPTS runs out. Several records for the same Id in one
+buffer collapse to the last, since BatchWriteItem rejects duplicate keys.
+
+The table is STATUS_TABLE. When it is not set (unit tests, local runs) the
+records go to the shared state store under pk "status" instead.
+"""
+import os
+import random
+import time
+
+from state_store import _to_dynamo, get_store
+
+STATUS_TABLE = os.environ.get("STATUS_TABLE")
+BATCH_SIZE = 25  # BatchWriteItem maximum
+MAX_ATTEMPTS = int(os.environ.get("STATUS_WRITE_MAX_ATTEMPTS", "8"))
+BACKOFF_BASE_SECONDS = 0.05
+BACKOFF_MAX_SECONDS = 5
+
+
+class StatusWriteError(RuntimeError):
+    def __init__(self, unprocessed):
+        super().__init__(f"{len(unprocessed)} status record(s) not written after {MAX_ATTEMPTS} attempts")
+        self.unprocessed = unprocessed
+
+
+class StatusWriter:
+    def __init__(self, table_name=None, dynamodb=None):
+        self.table_name = table_name or STATUS_TABLE
+        self._dynamodb = dynamodb
+        self._buffer = {}
+        self.written = 0
+
+    def add(self, item):
+        self._buffer[item["Id"]] = item
+        if len(self._buffer) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        items = list(self._buffer.values())
+        self._buffer = {}
+        if not items:
+            return
+        if not self.table_name:
+            store = get_store()
+            for item in items:
+                store.put("status", item["Id"], item)
+        else:
+            for start in range(0, len(items), BATCH_SIZE):
+                self._write_batch(items[start:start + BATCH_SIZE])
+        self.written += len(items)
+
+    def _write_batch(self, items):
+        dynamodb = self._dynamodb
+        if dynamodb is None:
+            import aws_clients
+            dynamodb = aws_clients.resource("dynamodb")
+        requests = [{"PutRequest": {"Item": _to_dynamo(item)}} for item in items]
+        for attempt in range(MAX_ATTEMPTS):
+            response = dynamodb.batch_write_item(RequestItems={self.table_name: requests})
+            requests = response.get("UnprocessedItems", {}).get(self.table_name, [])
+            if not requests:
+                return
+            delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+            print(f"{len(requests)} status record(s) unprocessed; retrying in {delay:.2f}s")
+            time.sleep(delay)
+        raise StatusWriteError([r["PutRequest"]["Item"] for r in requests])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+        return False
+
+
+def write_statuses(items, table_name=None):
+    """Write a list of status items in as few batches as possible; returns how many were written."""
+    with StatusWriter(table_name) as writer:
+        for item in items:
+            writer.add(item)
+    return writer.written
@@ -0,0 +1,236 @@
+"""
+End-to-end throughput benchmark against the fake Salesforce and fake S3.
+
+Runs the real state machine definition through local.step_functions with
+every handler in-process, then reports records/s, MB/s (S3 bytes written),
+peak RSS, API calls by endpoint and the handler that makes them, and the
+phase timings the handlers emit as metrics, and the run's progress record.
+Save a run with --json and pass it back as --baseline to fail when
+throughput drops by more than --tolerance.
+
+    python -m local.benchmark --objects 5 --rows 200000 --files 500 --file-bytes 65536
+"""
+import argparse
+import contextlib
+import json
+import os
+import resource
+import sys
+import time
+
+from local import fake_s3
+from local.fake_salesforce import FakeSalesforce, SyntheticObject
+from local.step_functions import DEFAULT_DEFINITION, LAYER_PATH, LocalStateMachine, load_handlers
+
+# Which handler issues each kind of Salesforce call
+CALL_OWNERS = {
+    "token": "sf_utils",
+    "describeGlobal": "GetSalesforceObjectList",
+    "recordCount": "GetSalesforceObjectList",
+    "count": "GetSalesforceObjectList",
+    "query": "GetSalesforceObjectList",
+    "describe": "InitBulkBackup",
+    "jobCreate": "InitBulkBackup",
+    "jobStatus": "CheckBackupStatus",
+    "results": "DownloadDataToS3",
+    "fileDownload": "downloadFile",
+    "compositeBatch": "(HTTP requests carrying subrequests)",
+    "injectedError": "(injected 503s)",
+}
+
+
+def build_objects(objects=3, rows=100000, fields=10, field_bytes=16, files=0, file_bytes=65536):
+    synthetic = [SyntheticObject(f"Bench{i}__c", rows, fields, field_bytes) for i in range(objects)]
+    if files:
+        synthetic.append(SyntheticObject("ContentVersion", files, file_bytes=file_bytes))
+    return synthetic
+
+
+def run_benchmark(objects, backup_type="Full", output_format=None, latency_ms=0, error_rate=0.0,
+                  polls_to_complete=2, gzip_results=True, definition=DEFAULT_DEFINITION, api_limit=1000000):
+    """Run one backup of objects (SyntheticObject list) and return the measurements."""
+    if LAYER_PATH not in sys.path:
+        sys.path.insert(0, LAYER_PATH)
+    import describe_cache
+    import exception_handler
+    import governor
+    import progress
+    import sf_utils
+    import state_store
+
+    salesforce = FakeSalesforce(objects, latency_ms, error_rate, polls_to_complete, gzip_results, api_limit=api_limit)
+    s3 = fake_s3.install()
+    saved_env = {k: os.environ.get(k) for k in ("SF_INSTANCE_URL", "SF_CLIENT_ID", "SF_CLIENT_SECRET")}
+    finished = {"completed": [], "failed": []}
+    emitted = []
+
+    def mark(outcome):
+        def handler(event, context):
+            finished[outcome].append(event.get("objectName"))
+            progress.record(event.get("requestDetails"), **{f"objects{outcome.title()}": 1})
+            return event
+        return handler
+
+    try:
+        os.environ.update({
+            "SF_INSTANCE_URL": salesforce.start(),
+            "SF_CLIENT_ID": "local",
+            "SF_CLIENT_SECRET": "local",
+        })
+        os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+        state_store.set_store(state_store.LocalStore())
+        sf_utils._token_cache.clear()
+        describe_cache.clear()
+        governor.clear()
+        exception_handler.add_listener(emitted.append)
+
+        handlers = load_handlers()
+        handlers["${UpdateDBStatusCompletedArn}"] = mark("completed")
+        handlers["${UpdateDBStatusFailedArn}"] = mark("failed")
+        machine = LocalStateMachine(definition, handlers=handlers, s3=s3)
+        request = {"orgId": "bench", "BackUpType": backup_type}
+        if output_format:
+            request["OutputFormat"] = output_format
+
+        started = time.monotonic()
+        result = machine.execute({"requestDetails": request})
+        wall = time.monotonic() - started
+        run_progress = progress.get_progress(result["name"])
+    finally:
+        salesforce.stop()
+        fake_s3.uninstall()
+        exception_handler.remove_listener(emitted.append)
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+    return {
+        "status": result["status"],
+        "error": result["error"],
+        "wallSeconds": round(wall, 3),
+        "virtualSeconds": round(result["virtualSeconds"], 1),
+        "records": salesforce.records_served,
+        "recordsPerSecond": round(salesforce.records_served / wall, 1) if wall else None,
+        "sourceMB": round(salesforce.bytes_served / 2 ** 20, 2),
+        "s3MB": round(s3.bytes_written / 2 ** 20, 2),
+        "s3MBPerSecond": round(s3.bytes_written / 2 ** 20 / wall, 2) if wall else None,
+        # ru_maxrss is KiB on Linux; includes the fake server running in this process
+        "peakRssMB": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "apiCalls": dict(salesforce.calls),
+        "apiUsage": f"{salesforce.api_used}/{salesforce.api_limit}",
+        "peakConcurrentRequests": salesforce.peak_concurrent,
+        "apiCallsByHandler": _by_handler(salesforce.calls),
+        "s3Calls": dict(s3.calls),
+        "phasesByHandler": _phases(emitted),
+        "objectsCompleted": len(finished["completed"]),
+        "objectsFailed": len(finished["failed"]),
+        "progress": run_progress,
+        "states": result["states"],
+    }
+
+
+def _by_handler(calls):
+    totals = {}
+    for category, count in calls.items():
+        owner = CALL_OWNERS.get(category, category)
+        totals[owner] = totals.get(owner, 0) + count
+    return totals
+
+
+def _phases(records):
+    """Sum the handlers' EMF timings and byte counts per function."""
+    totals = {}
+    for record in records:
+        function = totals.setdefault(record["FunctionName"], {})
+        for metric in record["_aws"]["CloudWatchMetrics"][0]["Metrics"]:
+            if metric["Unit"] in ("Milliseconds", "Bytes"):
+                name = metric["Name"]
+                function[name] = round(function.get(name, 0) + record[name], 1)
+    return totals
+
+
+def report(results):
+    lines = [
+        f"status            {results['status']}",
+        f"wall / virtual    {results['wallSeconds']} s / {results['virtualSeconds']} s",
+        f"records           {results['records']} ({results['recordsPerSecond']} records/s)",
+        f"S3 written        {results['s3MB']} MB ({results['s3MBPerSecond']} MB/s, source {results['sourceMB']} MB)",
+        f"peak RSS          {results['peakRssMB']} MB",
+        f"objects           {results['objectsCompleted']} completed, {results['objectsFailed']} failed",
+        f"API usage         {results['apiUsage']} (peak {results['peakConcurrentRequests']} concurrent)",
+        "API calls by handler:",
+    ]
+    lines += [f"  {owner:<40}{count:>8}" for owner, count in sorted(results["apiCallsByHandler"].items())]
+    lines.append("Time (ms, summed over threads) and bytes by handler:")
+    for function, values in sorted(results["phasesByHandler"].items()):
+        lines.append(f"  {function}")
+        lines += [f"    {name:<38}{value:>12}" for name, value in sorted(values.items())]
+    lines.append("S3 calls:")
+    lines += [f"  {op:<40}{count:>8}" for op, count in sorted(results["s3Calls"].items())]
+    return "\n".join(lines)
+
+
+def regressions(results, baseline, tolerance):
+    """Metrics that got worse than baseline by more than tolerance (a fraction)."""
+    found = []
+    for metric in ("recordsPerSecond", "s3MBPerSecond"):
+        if baseline.get(metric) and results.get(metric) is not None:
+            if results[metric] < baseline[metric] * (1 - tolerance):
+                found.append(f"{metric} {results[metric]} < baseline {baseline[metric]}")
+    for metric in ("peakRssMB",):
+        if baseline.get(metric) and results[metric] > baseline[metric] * (1 + tolerance):
+            found.append(f"{metric} {results[metric]} > baseline {baseline[metric]}")
+    base_calls = sum(baseline.get("apiCalls", {}).values())
+    calls = sum(results["apiCalls"].values())
+    if base_calls and calls > base_calls * (1 + tolerance):
+        found.append(f"API calls {calls} > baseline {base_calls}")
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the backup pipeline against a synthetic org.")
+    parser.add_argument("--objects", type=int, default=3, help="custom objects to back up")
+    parser.add_argument("--rows", type=int, default=100000, help="rows per object")
+    parser.add_argument("--fields", type=int, default=10)
+    parser.add_argument("--field-bytes", type=int, default=16)
+    parser.add_argument("--files", type=int, default=0, help="ContentVersion files (0 leaves it out)")
+    parser.add_argument("--file-bytes", type=int, default=65536)
+    parser.add_argument("--latency-ms", type=int, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--polls-to-complete", type=int, default=2)
+    parser.add_argument("--api-limit", type=int, default=1000000, help="daily API allowance the fake org reports")
+    parser.add_argument("--no-gzip", action="store_true", help="serve results pages uncompressed")
+    parser.add_argument("--backup-type", default="Full", choices=["Full", "Daily"])
+    parser.add_argument("--output-format", choices=["Parquet"])
+    parser.add_argument("--json", help="write the measurements here")
+    parser.add_argument("--baseline", help="earlier --json output to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--verbose", action="store_true", help="show the handlers' own log lines")
+    args = parser.parse_args(argv)
+
+    objects = build_objects(args.objects, args.rows, args.fields, args.field_bytes, args.files, args.file_bytes)
+    with open(os.devnull, "w") as devnull:
+        with contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+            results = run_benchmark(
+                objects, args.backup_type, args.output_format, args.latency_ms, args.error_rate,
+                args.polls_to_complete, not args.no_gzip, api_limit=args.api_limit,
+            )
+    print(report(results))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2, default=str)
+
+    failed = results["status"] != "SUCCEEDED" or results["objectsFailed"]
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print(f"REGRESSION: {line}")
+        failed = failed or found
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""
+In-memory stand-in for the S3 client calls the handlers make.
+
+install() makes boto3.client("s3") return one shared FakeS3 (other services
+are left alone) and drops the clients aws_clients has cached, so the
+handlers' lazily created clients write here. Every call is counted per operation.
+"""
+import io
+import sys
+import threading
+import uuid
+from collections import Counter
+
+import boto3
+
+_real_client = boto3.client
+
+
+class FakeBody(io.BytesIO):
+    """A StreamingBody look-alike."""
+
+    def iter_chunks(self, chunk_size=1024 * 1024):
+        while True:
+            chunk = self.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+        self.calls = Counter()
+        self.bytes_written = 0
+        self._uploads = {}
+        self._lock = threading.Lock()
+
+    def _count(self, operation, size=0):
+        with self._lock:
+            self.calls[operation] += 1
+            self.bytes_written += size
+
+    def put_object(self, Bucket, Key, Body=b"", **kwargs):
+        body = Body if isinstance(Body, (bytes, bytearray)) else Body.read()
+        self._count("PutObject", len(body))
+        with self._lock:
+            self.objects[(Bucket, Key)] = bytes(body)
+        return {"ETag": uuid.uuid4().hex}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self._count("GetObject")
+        with self._lock:
+            body = self.objects.get((Bucket, Key))
+        if body is None:
+            raise KeyError(f"NoSuchKey: s3://{Bucket}/{Key}")
+        return {"Body": FakeBody(body), "ContentLength": len(body)}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self._count("DeleteObject")
+        with self._lock:
+            self.objects.pop((Bucket, Key), None)
+        return {}
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self._count("CreateMultipartUpload")
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self._uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        self._count("UploadPart", len(Body))
+        with self._lock:
+            self._uploads[UploadId][PartNumber] = bytes(Body)
+        return {"ETag": f"{UploadId}-{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        self._count("CompleteMultipartUpload")
+        with self._lock:
+            parts = self._uploads.pop(UploadId)
+            self.objects[(Bucket, Key)] = b"".join(parts[p["PartNumber"]] for p in MultipartUpload["Parts"])
+        return {}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        self._count("AbortMultipartUpload")
+        with self._lock:
+            self._uploads.pop(UploadId, None)
+        return {}
+
+    def get_paginator(self, name):
+        if name != "list_objects_v2":
+            raise NotImplementedError(name)
+        s3 = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix="", **kwargs):
+                s3._count("ListObjectsV2")
+                with s3._lock:
+                    keys = sorted(k for b, k in s3.objects if b == Bucket and k.startswith(Prefix))
+                    sizes = {k: len(s3.objects[(Bucket, k)]) for k in keys}
+                for i in range(0, len(keys), 1000):
+                    yield {"Contents": [{"Key": k, "Size": sizes[k]} for k in keys[i:i + 1000]]}
+
+        return Paginator()
+
+    def keys(self, prefix=""):
+        with self._lock:
+            return sorted(k for _, k in self.objects if k.startswith(prefix))
+
+
+def install(fake=None):
+    """Route boto3.client("s3") to fake (a new FakeS3 by default) and return it."""
+    fake = fake or FakeS3()
+
+    def client(service_name, *args, **kwargs):
+        if service_name == "s3":
+            return fake
+        return _real_client(service_name, *args, **kwargs)
+
+    boto3.client = client
+    _forget_cached_clients()
+    return fake
+
+
+def uninstall():
+    boto3.client = _real_client
+    _forget_cached_clients()
+
+
+def _forget_cached_clients():
+    aws_clients = sys.modules.get("aws_clients")
+    if aws_clients is not None:
+        aws_clients.clear()
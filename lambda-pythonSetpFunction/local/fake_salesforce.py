@@ -0,0 +1,391 @@
+"""
+Synthetic Salesforce org for local runs and benchmarks.
+
+FakeSalesforce serves the REST endpoints the handlers call on a local port:
+OAuth token, describeGlobal and describe, query (COUNT and Id bounds),
+limits/recordCount, composite/batch, Bulk API 2.0 query jobs with locator
+paging, and the shepherd file download. Rows and file bodies are generated
+on the fly from the scenario, so nothing large is held in memory.
+
+Scenario knobs per object: rows, fields, field_bytes. ContentVersion also
+has file_bytes. Server-wide: latency_ms per request, error_rate (share of
+data requests answered 503), polls_to_complete for Bulk jobs, gzip for
+results pages and api_limit, the daily allowance reported in Sforce-Limit-Info.
+peak_concurrent records the most requests served at once.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter
+from datetime import datetime, timezone
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+BASE62 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+DEFAULT_PAGE_RECORDS = 50000
+DESCRIBE_LAST_MODIFIED = formatdate(0, usegmt=True)
+
+
+def record_id(prefix, index):
+    digits = []
+    for _ in range(12):
+        index, digit = divmod(index, 62)
+        digits.append(BASE62[digit])
+    return prefix + "".join(reversed(digits))
+
+
+def record_index(record_id_):
+    value = 0
+    for char in record_id_[3:15]:
+        value = value * 62 + BASE62.index(char)
+    return value
+
+
+class SyntheticObject:
+    def __init__(self, name, rows, fields=10, field_bytes=16, file_bytes=0, key_prefix=None):
+        self.name = name
+        self.rows = rows
+        self.field_bytes = field_bytes
+        self.file_bytes = file_bytes
+        self.key_prefix = key_prefix or hashlib.md5(name.encode()).hexdigest()[:3]
+        if name == "ContentVersion":
+            self.fields = ["Id", "Title", "PathOnClient", "Checksum"]
+        else:
+            self.fields = ["Id"] + [f"Field{i}__c" for i in range(1, max(fields, 1))]
+
+    def describe(self):
+        types = {"Id": "id"}
+        return {
+            "name": self.name,
+            "fields": [
+                {"name": f, "type": types.get(f, "string"), "length": 18 if f == "Id" else self.field_bytes}
+                for f in self.fields
+            ] + ([{"name": "VersionData", "type": "base64"}] if self.name == "ContentVersion" else []),
+        }
+
+    def file_body(self, index):
+        seed = hashlib.sha256(f"{self.name}:{index}".encode()).digest()
+        return (seed * (self.file_bytes // len(seed) + 1))[:self.file_bytes]
+
+    def row(self, index):
+        rid = record_id(self.key_prefix, index)
+        if self.name == "ContentVersion":
+            values = [rid, f"File {index}", f"file_{index}.bin", hashlib.md5(self.file_body(index)).hexdigest()]
+        else:
+            filler = (rid * (self.field_bytes // 15 + 1))[:self.field_bytes]
+            values = [rid] + [filler] * (len(self.fields) - 1)
+        return ",".join(f'"{v}"' for v in values) + "\n"
+
+
+class BulkJob:
+    def __init__(self, obj, start, stop):
+        self.id = "750" + uuid.uuid4().hex[:15]
+        self.obj = obj
+        self.start = start
+        self.stop = stop
+        self.polls = 0
+        self.created = datetime.now(timezone.utc)
+
+    @property
+    def records(self):
+        return max(self.stop - self.start, 0)
+
+
+class FakeSalesforce:
+    def __init__(self, objects, latency_ms=0, error_rate=0.0, polls_to_complete=1, gzip_results=True, seed=1,
+                 api_limit=1000000):
+        self.objects = {o.name: o for o in objects}
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.polls_to_complete = polls_to_complete
+        self.gzip_results = gzip_results
+        self.jobs = {}
+        self.calls = Counter()
+        self.records_served = 0
+        self.bytes_served = 0
+        self.api_limit = api_limit
+        self.api_used = 0
+        self.in_flight = 0
+        self.peak_concurrent = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+
+    # --- lifecycle ----------------------------------------------------------
+
+    def start(self, port=0):
+        fake = self
+
+        class Handler(_Handler):
+            salesforce = fake
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.url
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    # --- bookkeeping --------------------------------------------------------
+
+    def count(self, category, records=0, size=0):
+        with self._lock:
+            self.calls[category] += 1
+            self.records_served += records
+            self.bytes_served += size
+
+    def enter(self, counts_against_limit):
+        with self._lock:
+            self.in_flight += 1
+            self.peak_concurrent = max(self.peak_concurrent, self.in_flight)
+            if counts_against_limit:
+                self.api_used += 1
+            return f"api-usage={self.api_used}/{self.api_limit}"
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def should_fail(self):
+        if not self.error_rate:
+            return False
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    # --- endpoints ----------------------------------------------------------
+
+    def route(self, method, path, query, body, if_modified_since=None):
+        """Returns (status, headers, payload); payload is a dict, bytes or a row iterator."""
+        if path.endswith("/services/oauth2/token"):
+            self.count("token")
+            return 200, {}, {"access_token": uuid.uuid4().hex, "instance_url": self.url,
+                             "issued_at": str(int(time.time() * 1000)), "token_type": "Bearer"}
+
+        match = re.match(r"/services/data/(v[\d.]+)/(.*)", path)
+        if not match:
+            return 404, {}, {"error": f"unknown path {path}"}
+        version, rest = match.groups()
+
+        if rest == "composite/batch" and method == "POST":
+            self.count("compositeBatch")
+            results = []
+            for request in body["batchRequests"]:
+                sub = urlparse("/services/data/" + request["url"].lstrip("/"))
+                status, _, payload = self.route(request["method"], sub.path, parse_qs(sub.query), None)
+                results.append({"statusCode": status, "result": payload})
+            return 200, {}, {"hasErrors": any(r["statusCode"] >= 400 for r in results), "results": results}
+
+        if rest in ("sobjects/", "sobjects"):
+            self.count("describeGlobal")
+            return 200, {}, {"sobjects": [{"name": n, "queryable": True} for n in self.objects]}
+
+        match = re.match(r"sobjects/(\w+)/describe", rest)
+        if match:
+            self.count("describe")
+            obj = self.objects.get(match.group(1))
+            if obj is None:
+                return 404, {}, [{"errorCode": "NOT_FOUND"}]
+            headers = {"Last-Modified": DESCRIBE_LAST_MODIFIED}
+            if if_modified_since == DESCRIBE_LAST_MODIFIED:
+                return 304, headers, b""
+            return 200, headers, obj.describe()
+
+        if rest.startswith("limits/recordCount"):
+            self.count("recordCount")
+            names = query.get("sObjects", [""])[0].split(",")
+            return 200, {}, {"sObjects": [
+                {"name": n, "count": self.objects[n].rows} for n in names if n in self.objects
+            ]}
+
+        if rest == "query":
+            return self.soql(query.get("q", [""])[0])
+
+        if rest == "jobs/query" and method == "POST":
+            self.count("jobCreate")
+            obj = self.objects[re.search(r"FROM (\w+)", body["query"]).group(1)]
+            start, stop = self._id_range(obj, body["query"])
+            job = BulkJob(obj, start, stop)
+            with self._lock:
+                self.jobs[job.id] = job
+            return 200, {}, self._job_info(job, "UploadComplete")
+
+        match = re.match(r"jobs/query/(\w+)(/results/?)?$", rest)
+        if match:
+            job = self.jobs.get(match.group(1))
+            if job is None:
+                return 404, {}, [{"errorCode": "NOT_FOUND"}]
+            if not match.group(2):
+                self.count("jobStatus")
+                with self._lock:
+                    job.polls += 1
+                    done = job.polls >= self.polls_to_complete
+                return 200, {}, self._job_info(job, "JobComplete" if done else "InProgress")
+            return self.results_page(job, query)
+
+        return 404, {}, [{"errorCode": "NOT_FOUND", "message": rest}]
+
+    def soql(self, soql):
+        obj = self.objects.get(re.search(r"FROM (\w+)", soql).group(1))
+        if obj is None:
+            return 400, {}, [{"errorCode": "INVALID_TYPE"}]
+        if "COUNT(" in soql.upper():
+            self.count("count")
+            return 200, {}, {"totalSize": obj.rows, "done": True, "records": [{"expr0": obj.rows}]}
+        self.count("query")
+        if "ORDER BY Id" in soql and obj.rows:
+            index = obj.rows - 1 if "DESC" in soql else 0
+            return 200, {}, {"totalSize": 1, "done": True, "records": [{"Id": record_id(obj.key_prefix, index)}]}
+        return 200, {}, {"totalSize": 0, "done": True, "records": []}
+
+    def _id_range(self, obj, soql):
+        start, stop = 0, obj.rows
+        lower = re.search(r"Id >= '(\w+)'", soql)
+        upper = re.search(r"Id < '(\w+)'", soql)
+        if lower:
+            start = max(start, record_index(lower.group(1)))
+        if upper:
+            stop = min(stop, record_index(upper.group(1)))
+        return start, stop
+
+    def _job_info(self, job, state):
+        return {
+            "id": job.id,
+            "object": job.obj.name,
+            "operation": "query",
+            "state": state,
+            "numberRecordsProcessed": job.records if state == "JobComplete" else job.records // 2,
+            "createdDate": job.created.strftime("%Y-%m-%dT%H:%M:%S.000+0000"),
+        }
+
+    def results_page(self, job, query):
+        offset = int(query.get("locator", ["0"])[0] or 0)
+        page_records = int(query.get("maxRecords", [DEFAULT_PAGE_RECORDS])[0])
+        first = job.start + offset
+        last = min(first + page_records, job.stop)
+        next_offset = last - job.start
+        locator = str(next_offset) if last < job.stop else "null"
+        self.count("results", records=last - first)
+
+        def rows():
+            yield (",".join(f'"{f}"' for f in job.obj.fields) + "\n").encode()
+            batch = []
+            for index in range(first, last):
+                batch.append(job.obj.row(index))
+                if len(batch) >= 1000:
+                    yield "".join(batch).encode()
+                    batch = []
+            if batch:
+                yield "".join(batch).encode()
+
+        headers = {"Sforce-Locator": locator, "Sforce-NumberOfRecords": str(last - first), "Content-Type": "text/csv"}
+        return 200, headers, rows()
+
+    def file_download(self, content_version_id):
+        obj = self.objects["ContentVersion"]
+        body = obj.file_body(record_index(content_version_id))
+        self.count("fileDownload", size=len(body))
+        return 200, {"Content-Type": "application/octet-stream"}, body
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    salesforce = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self, method):
+        # REST calls count against the daily allowance; token and file downloads do not
+        self.limit_info = self.salesforce.enter(self.path.startswith("/services/data/"))
+        try:
+            self._serve(method)
+        finally:
+            self.salesforce.leave()
+
+    def _serve(self, method):
+        sf = self.salesforce
+        if sf.latency_ms:
+            time.sleep(sf.latency_ms / 1000)
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if self.headers.get("Content-Type", "").startswith("application/json") and raw:
+            body = json.loads(raw)
+        else:
+            body = parse_qs(raw.decode()) if raw else None
+
+        if not url.path.endswith("/oauth2/token") and sf.should_fail():
+            sf.count("injectedError")
+            return self._send(503, {}, {"error": "injected"})
+
+        match = re.match(r"/sfc/servlet.shepherd/version/download/(\w+)", url.path)
+        if match:
+            return self._send(*sf.file_download(unquote(match.group(1))))
+        return self._send(*sf.route(
+            method, url.path, parse_qs(url.query), body, self.headers.get("If-Modified-Since")
+        ))
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _send(self, status, headers, payload):
+        gzip_ok = "gzip" in self.headers.get("Accept-Encoding", "") and self.salesforce.gzip_results
+        self.send_response(status)
+        if self.path.startswith("/services/data/"):
+            self.send_header("Sforce-Limit-Info", self.limit_info)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if isinstance(payload, (dict, list)):
+            payload = json.dumps(payload).encode()
+            self.send_header("Content-Type", "application/json")
+        if isinstance(payload, (bytes, bytearray)):
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        # streamed body: chunked transfer, gzip-compressed on the fly when asked for
+        codec = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip_ok else None
+        if codec:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        sent = 0
+        for chunk in payload:
+            data = codec.compress(chunk) if codec else chunk
+            sent += len(chunk)
+            self._write_chunk(data)
+        if codec:
+            self._write_chunk(codec.flush())
+        self.wfile.write(b"0\r\n\r\n")
+        with self.salesforce._lock:
+            self.salesforce.bytes_served += sent
+
+    def _write_chunk(self, data):
+        if data:
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
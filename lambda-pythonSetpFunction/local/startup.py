@@ -0,0 +1,98 @@
+"""
+Cold-start benchmark for the shared runtime image.
+
+Each handler is imported through dispatch.py in a fresh interpreter, the way
+a new Lambda container does during init, and the script reports:
+- import time;
+- the time to build the AWS clients that the handler creates lazily;
+- how many modules are loaded, and whether boto3 was imported before any
+  client was needed;
+- the RSS after init.
+Medians over --repeat runs.
+
+    python -m local.startup --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from local.step_functions import LAYER_PATH, ROOT
+
+_PROBE = """
+import json, resource, sys, time
+sys.path[:0] = [{layer!r}, {root!r}]
+started = time.perf_counter()
+import dispatch
+imported = time.perf_counter()
+boto3_at_import = "boto3" in sys.modules
+modules = len(sys.modules)
+import aws_clients
+module = sys.modules["functions.{name}.app"]
+lazy = [value for value in vars(module).values() if isinstance(value, aws_clients._Lazy)]
+for value in lazy:
+    value.resolve()
+print(json.dumps({{
+    "importMs": (imported - started) * 1000,
+    "clientInitMs": (time.perf_counter() - imported) * 1000,
+    "lazyClients": len(lazy),
+    "modules": modules,
+    "boto3AtImport": boto3_at_import,
+    "rssMB": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}}))
+"""
+
+
+def handler_names(root=ROOT):
+    functions = os.path.join(root, "functions")
+    return sorted(n for n in os.listdir(functions) if os.path.isfile(os.path.join(functions, n, "app.py")))
+
+
+def measure(name, repeat=3):
+    """Median init figures for one handler, each run in a new interpreter."""
+    env = {**os.environ, "BACKUP_HANDLER": name}
+    env.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    runs = []
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(layer=LAYER_PATH, root=ROOT, name=name)],
+            env=env, capture_output=True, text=True, check=True,
+        )
+        runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    result = {"handler": name}
+    for key in ("importMs", "clientInitMs", "rssMB"):
+        result[key] = round(statistics.median(r[key] for r in runs), 1)
+    for key in ("lazyClients", "modules", "boto3AtImport"):
+        result[key] = runs[-1][key]
+    return result
+
+
+def report(results):
+    lines = [f"{'handler':<28}{'import ms':>10}{'clients ms':>12}{'modules':>9}{'boto3 at import':>17}{'RSS MB':>8}"]
+    for r in results:
+        lines.append(
+            f"{r['handler']:<28}{r['importMs']:>10}{r['clientInitMs']:>12}{r['modules']:>9}"
+            f"{'yes' if r['boto3AtImport'] else 'no':>17}{r['rssMB']:>8}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import and init time of each handler.")
+    parser.add_argument("--handlers", nargs="*", help="functions/<Name> directories (default: all)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="write the measurements here")
+    args = parser.parse_args(argv)
+
+    results = [measure(name, args.repeat) for name in (args.handlers or handler_names())]
+    print(report(results))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
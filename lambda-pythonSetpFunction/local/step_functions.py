@@ -0,0 +1,509 @@
+"""
+In-process interpreter for the ASL subset used by statemachine/*.asl.json.
+
+Supported: Task, Choice, Wait, Pass, Map (inline and distributed, with
+MaxConcurrency, ItemReader over s3:listObjectsV2 JSONL and ItemBatcher),
+Succeed and Fail, plus Parameters/ItemSelector, ResultPath, OutputPath and
+the States.Format intrinsic. Task resources are the functions/<Name>/app.py
+handlers, matched to the ${<Name>Arn} placeholders in the definition, and the
+${DDBGetItem} integration, served from the shared state store. Catch routes
+failures as in AWS; Retry is not interpreted, so a Task fails on its first error.
+
+Time is virtual. Every branch keeps its own clock: a Task advances it by the
+handler's measured run time and a Wait by its seconds, without sleeping. A
+Map places its branches on MaxConcurrency slots, so the reported duration is
+the critical path a real execution would see. While a branch runs, time.time()
+in its thread returns the branch clock, so handlers that compare timestamps
+(poll freshness, leases) behave as they would after a real Wait. The modules
+in WALL_CLOCK_MODULES still see the real time.
+"""
+import importlib.util
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+LAYER_PATH = os.path.join(ROOT, "layers", "common", "python")
+DEFAULT_DEFINITION = os.path.join(ROOT, "statemachine", "salesforcebackup.asl.json")
+# Branches run on real threads too; Map MaxConcurrency 0 (unbounded) is capped here
+LOCAL_MAX_THREADS = int(os.environ.get("LOCAL_MAX_THREADS", "32"))
+DEFAULT_TIMEOUT_MS = 300000
+
+_real_time = time.time
+# Modules that keep the wall clock under the virtual one: the governor's token
+# bucket is shared by every branch, whose virtual clocks drift apart
+WALL_CLOCK_MODULES = {"governor"}
+
+
+class ExecutionFailed(Exception):
+    def __init__(self, error, cause=""):
+        super().__init__(f"{error}: {cause}")
+        self.error = error
+        self.cause = cause
+
+
+class VirtualClock:
+    """Per-thread virtual time, offset from the real time at which the run started."""
+
+    def __init__(self):
+        self.epoch = _real_time()
+        self._local = threading.local()
+
+    @property
+    def now(self):
+        return getattr(self._local, "now", 0.0)
+
+    @now.setter
+    def now(self, value):
+        self._local.now = value
+
+    def time(self):
+        if hasattr(self._local, "now") and sys._getframe(1).f_globals.get("__name__") not in WALL_CLOCK_MODULES:
+            return self.epoch + self._local.now
+        return _real_time()
+
+    def install(self):
+        time.time = self.time
+
+    def uninstall(self):
+        time.time = _real_time
+
+
+class LocalContext:
+    """The parts of the Lambda context object the handlers use."""
+
+    def __init__(self, function_name, timeout_ms=DEFAULT_TIMEOUT_MS):
+        self.function_name = function_name
+        self.function_version = "$LATEST"
+        self.memory_limit_in_mb = 128
+        self.aws_request_id = str(uuid.uuid4())
+        self.log_group_name = f"/aws/lambda/{function_name}"
+        self.log_stream_name = "local"
+        self._deadline = time.monotonic() + timeout_ms / 1000
+
+    def get_remaining_time_in_millis(self):
+        return max(int((self._deadline - time.monotonic()) * 1000), 0)
+
+
+def load_handlers(root=ROOT):
+    """Map every ${<Name>Arn} placeholder to functions/<Name>/app.py:lambda_handler."""
+    if LAYER_PATH not in sys.path:
+        sys.path.insert(0, LAYER_PATH)
+    handlers = {}
+    functions = os.path.join(root, "functions")
+    for name in sorted(os.listdir(functions)):
+        path = os.path.join(functions, name, "app.py")
+        if not os.path.isfile(path):
+            continue
+
+        def handler(event, context, _path=path, _name=name, _cache={}):
+            # imported on first use so unused functions (and their dependencies) stay unloaded
+            if "module" not in _cache:
+                spec = importlib.util.spec_from_file_location(f"{_name}_app", _path)
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                _cache["module"] = module
+            return _cache["module"].lambda_handler(event, context)
+
+        handlers[f"${{{name}Arn}}"] = handler
+    handlers["${DDBGetItem}"] = dynamodb_get_item
+    return handlers
+
+
+def _typed(value):
+    if isinstance(value, bool):
+        return {"BOOL": value}
+    if isinstance(value, (int, float)):
+        return {"N": str(value)}
+    if isinstance(value, dict):
+        return {"M": {k: _typed(v) for k, v in value.items()}}
+    if isinstance(value, list):
+        return {"L": [_typed(v) for v in value]}
+    if value is None:
+        return {"NULL": True}
+    return {"S": str(value)}
+
+
+def dynamodb_get_item(params, context):
+    """arn:aws:states:::dynamodb:getItem against the state store (any TableName); typed like DynamoDB's response."""
+    import state_store
+
+    pk, sk = params["Key"]["pk"]["S"], params["Key"]["sk"]["S"]
+    item = state_store.get_store().get(pk, sk)
+    if item is None:
+        return {}
+    return {"Item": {k: _typed(v) for k, v in {**item, "pk": pk, "sk": sk}.items()}}
+
+
+# --- JSONPath ---------------------------------------------------------------
+
+def _split_path(path):
+    parts = []
+    for segment in path.split(".")[1:]:
+        while "[" in segment:
+            name, rest = segment.split("[", 1)
+            if name:
+                parts.append(name)
+            index, segment = rest.split("]", 1)
+            parts.append(int(index))
+        if segment:
+            parts.append(segment)
+    return parts
+
+
+def get_path(data, path, context=None):
+    if path.startswith("$$"):
+        data, path = context, path[1:]
+    value = data
+    for part in _split_path(path):
+        try:
+            value = value[part]
+        except (KeyError, IndexError, TypeError):
+            raise ExecutionFailed("States.Runtime", f"Invalid path '{path}'")
+    return value
+
+
+def set_path(data, path, value):
+    if path == "$":
+        return value
+    data = dict(data) if isinstance(data, dict) else {}
+    parts = _split_path(path)
+    target = data
+    for part in parts[:-1]:
+        target[part] = dict(target.get(part) or {})
+        target = target[part]
+    target[parts[-1]] = value
+    return data
+
+
+_FORMAT = re.compile(r"States\.Format\('((?:[^'\\]|\\.)*)'((?:\s*,\s*\$[^,)]*)*)\)$")
+
+
+def intrinsic(expression, data, context):
+    """The one intrinsic function the definitions use: States.Format('...{}...', $.path, ...)."""
+    match = _FORMAT.match(expression.strip())
+    if match is None:
+        raise ExecutionFailed("States.Runtime", f"Unsupported intrinsic {expression}")
+    template = match.group(1).replace("\\'", "'")
+    args = [get_path(data, arg.strip(), context) for arg in match.group(2).split(",")[1:]]
+    parts = template.split("{}")
+    if len(parts) != len(args) + 1:
+        raise ExecutionFailed("States.Runtime", f"Argument count mismatch in {expression}")
+    return "".join(part + (str(arg) if i < len(args) else "") for i, (part, arg) in enumerate(zip(parts, args + [""])))
+
+
+def resolve(template, data, context):
+    """Evaluate a Parameters/ItemSelector block: keys ending in .$ are paths (or States.Format)."""
+    if isinstance(template, dict):
+        result = {}
+        for key, value in template.items():
+            if key.endswith(".$") and value.startswith("States."):
+                result[key[:-2]] = intrinsic(value, data, context)
+            elif key.endswith(".$"):
+                result[key[:-2]] = get_path(data, value, context)
+            else:
+                result[key] = resolve(value, data, context)
+        return result
+    if isinstance(template, list):
+        return [resolve(v, data, context) for v in template]
+    return template
+
+
+# --- Choice rules -----------------------------------------------------------
+
+_COMPARISONS = {
+    "Equals": lambda a, b: a == b,
+    "LessThan": lambda a, b: a < b,
+    "GreaterThan": lambda a, b: a > b,
+    "LessThanEquals": lambda a, b: a <= b,
+    "GreaterThanEquals": lambda a, b: a >= b,
+}
+def _catches(catcher, error):
+    return any(name in ("States.ALL", error) for name in catcher["ErrorEquals"])
+
+
+_TYPES = {"String": str, "Numeric": (int, float), "Boolean": bool, "Timestamp": str}
+
+
+def parse_timestamp(value):
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def timestamp(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def matches(rule, data, context):
+    if "And" in rule:
+        return all(matches(r, data, context) for r in rule["And"])
+    if "Or" in rule:
+        return any(matches(r, data, context) for r in rule["Or"])
+    if "Not" in rule:
+        return not matches(rule["Not"], data, context)
+    try:
+        value = get_path(data, rule["Variable"], context)
+        present = True
+    except ExecutionFailed:
+        value, present = None, False
+    if "IsPresent" in rule:
+        return present == rule["IsPresent"]
+    if "IsNull" in rule:
+        return present and (value is None) == rule["IsNull"]
+    if not present:
+        raise ExecutionFailed("States.Runtime", f"Invalid path '{rule['Variable']}'")
+    for key, expected in rule.items():
+        for type_name, kind in _TYPES.items():
+            if not key.startswith(type_name):
+                continue
+            operator = key[len(type_name):]
+            if operator.endswith("Path"):
+                operator, expected = operator[:-4], get_path(data, expected, context)
+            if operator in _COMPARISONS:
+                if type_name == "Numeric" and isinstance(value, bool):
+                    return False
+                if type_name == "Timestamp":
+                    try:
+                        return _COMPARISONS[operator](parse_timestamp(value), parse_timestamp(expected))
+                    except (AttributeError, TypeError, ValueError):
+                        return False
+                return isinstance(value, kind) and _COMPARISONS[operator](value, expected)
+    raise ExecutionFailed("States.Runtime", f"Unsupported Choice rule {rule}")
+
+
+# --- Interpreter ------------------------------------------------------------
+
+class StateStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.entries = defaultdict(lambda: {"count": 0, "virtualSeconds": 0.0, "wallSeconds": 0.0})
+
+    def record(self, name, virtual_seconds, wall_seconds):
+        with self._lock:
+            entry = self.entries[name]
+            entry["count"] += 1
+            entry["virtualSeconds"] += virtual_seconds
+            entry["wallSeconds"] += wall_seconds
+
+    def report(self):
+        rows = sorted(self.entries.items(), key=lambda kv: -kv[1]["virtualSeconds"])
+        lines = [f"{'State':<32}{'Count':>8}{'Virtual s':>14}{'Wall s':>12}"]
+        for name, entry in rows:
+            lines.append(f"{name:<32}{entry['count']:>8}{entry['virtualSeconds']:>14.1f}{entry['wallSeconds']:>12.3f}")
+        return "\n".join(lines)
+
+
+class LocalStateMachine:
+    def __init__(self, definition, handlers=None, s3=None, timeout_ms=DEFAULT_TIMEOUT_MS):
+        if isinstance(definition, str):
+            with open(definition) as f:
+                definition = json.load(f)
+        self.definition = definition
+        self.handlers = handlers if handlers is not None else load_handlers()
+        self.s3 = s3
+        self.timeout_ms = timeout_ms
+        self.clock = VirtualClock()
+        self.stats = StateStats()
+
+    def execute(self, payload, name=None):
+        """Run to completion; returns a dict with status, output and timings."""
+        name = name or str(uuid.uuid4())
+        context = {
+            "Execution": {
+                "Id": f"local:{name}",
+                "Name": name,
+                "Input": payload,
+                "StartTime": datetime.now(timezone.utc).isoformat(),
+            },
+        }
+        started = _real_time()
+        self.clock.install()
+        try:
+            self.clock.now = 0.0
+            try:
+                output = self._run(self.definition, payload, context)
+                status, error = "SUCCEEDED", None
+            except ExecutionFailed as e:
+                output, status, error = None, "FAILED", {"error": e.error, "cause": e.cause}
+            virtual_seconds = self.clock.now
+        finally:
+            self.clock.uninstall()
+        return {
+            "name": name,
+            "status": status,
+            "output": output,
+            "error": error,
+            "virtualSeconds": virtual_seconds,
+            "wallSeconds": _real_time() - started,
+            "states": {k: dict(v) for k, v in self.stats.entries.items()},
+        }
+
+    def _run(self, machine, data, context):
+        states = machine["States"]
+        name = machine["StartAt"]
+        while True:
+            state = states[name]
+            virtual_start, wall_start = self.clock.now, _real_time()
+            context = {**context, "State": {"Name": name, "EnteredTime": timestamp(self.clock.time())}}
+            try:
+                data, next_name = self._step(name, state, data, context)
+            except ExecutionFailed as e:
+                catcher = next((c for c in state.get("Catch", []) if _catches(c, e.error)), None)
+                if catcher is None:
+                    raise
+                error = {"Error": e.error, "Cause": e.cause}
+                result_path = catcher.get("ResultPath", "$")
+                data = data if result_path is None else set_path(data, result_path, error)
+                next_name = catcher["Next"]
+            self.stats.record(name, self.clock.now - virtual_start, _real_time() - wall_start)
+            if next_name is None:
+                return data
+            name = next_name
+
+    def _step(self, name, state, data, context):
+        kind = state["Type"]
+        if kind == "Choice":
+            for rule in state.get("Choices", []):
+                if matches(rule, data, context):
+                    return data, rule["Next"]
+            if "Default" not in state:
+                raise ExecutionFailed("States.NoChoiceMatched", name)
+            return data, state["Default"]
+        if kind == "Succeed":
+            return data, None
+        if kind == "Fail":
+            raise ExecutionFailed(state.get("Error", "States.Fail"), state.get("Cause", ""))
+
+        effective = data
+        if state.get("InputPath"):
+            effective = get_path(data, state["InputPath"], context)
+        # a Map's Parameters select each item instead of shaping the input
+        if "Parameters" in state and kind != "Map":
+            effective = resolve(state["Parameters"], effective, context)
+
+        if kind == "Task":
+            result = self._invoke(name, state, effective)
+        elif kind == "Wait":
+            if "Seconds" in state or "SecondsPath" in state:
+                seconds = state["Seconds"] if "Seconds" in state else get_path(data, state["SecondsPath"], context)
+            else:
+                until = state["Timestamp"] if "Timestamp" in state else get_path(data, state["TimestampPath"], context)
+                seconds = max(parse_timestamp(until).timestamp() - self.clock.time(), 0)
+            self.clock.now += seconds
+            result = effective
+        elif kind == "Pass":
+            result = state.get("Result", effective)
+        elif kind == "Map":
+            result = self._map(state, effective, context)
+        else:
+            raise ExecutionFailed("States.Runtime", f"Unsupported state type {kind} in {name}")
+
+        if kind != "Wait":
+            result_path = state.get("ResultPath", "$")
+            data = data if result_path is None else set_path(data, result_path, result)
+        else:
+            data = result
+        if state.get("OutputPath"):
+            data = get_path(data, state["OutputPath"], context)
+        return data, (None if state.get("End") else state["Next"])
+
+    def _invoke(self, name, state, payload):
+        resource = state["Resource"]
+        handler = self.handlers.get(resource)
+        if handler is None:
+            raise ExecutionFailed("States.TaskFailed", f"No local handler for {resource}")
+        started = _real_time()
+        try:
+            result = handler(json.loads(json.dumps(payload)), LocalContext(name, self.timeout_ms))
+        except Exception as e:
+            raise ExecutionFailed("States.TaskFailed", f"{name}: {e!r}")
+        finally:
+            self.clock.now += _real_time() - started
+        # Step Functions passes results as JSON
+        return json.loads(json.dumps(result))
+
+    def _map_items(self, state, effective, context):
+        reader = state.get("ItemReader")
+        if reader is None:
+            return get_path(effective, state.get("ItemsPath", "$"), context)
+        if self.s3 is None:
+            import boto3
+            self.s3 = boto3.client("s3")
+        params = resolve(reader.get("Parameters", {}), effective, context)
+        items = []
+        paginator = self.s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=params["Bucket"], Prefix=params.get("Prefix", "")):
+            for obj in page.get("Contents", []):
+                body = self.s3.get_object(Bucket=params["Bucket"], Key=obj["Key"])["Body"].read()
+                items.extend(json.loads(line) for line in body.decode("utf-8").splitlines() if line.strip())
+        return items
+
+    def _map(self, state, effective, context):
+        items = self._map_items(state, effective, context)
+        selector = state.get("ItemSelector", state.get("Parameters"))
+        inputs = []
+        for index, item in enumerate(items):
+            item_context = {**context, "Map": {"Item": {"Index": index, "Value": item}}}
+            inputs.append(resolve(selector, effective, item_context) if selector else item)
+
+        batcher = state.get("ItemBatcher")
+        if batcher:
+            batch_input = resolve(batcher.get("BatchInput", {}), effective, context)
+            size = batcher.get("MaxItemsPerBatch", len(inputs) or 1)
+            inputs = [
+                {"Items": inputs[i:i + size], "BatchInput": batch_input}
+                for i in range(0, len(inputs), size)
+            ]
+
+        processor = state.get("ItemProcessor") or state["Iterator"]
+        concurrency = state.get("MaxConcurrency", 0) or LOCAL_MAX_THREADS
+        start = self.clock.now
+
+        def branch(payload):
+            self.clock.now = start
+            output = self._run(processor, payload, context)
+            return output, self.clock.now - start
+
+        with ThreadPoolExecutor(max_workers=min(concurrency, LOCAL_MAX_THREADS, len(inputs) or 1)) as pool:
+            finished = list(pool.map(branch, inputs))
+
+        # list-schedule the branches on the Map's slots to get its virtual duration
+        slots = [0.0] * min(state.get("MaxConcurrency", 0) or len(finished) or 1, len(finished) or 1)
+        for _, duration in finished:
+            slot = slots.index(min(slots))
+            slots[slot] += duration
+        self.clock.now = start + (max(slots) if finished else 0.0)
+        return [output for output, _ in finished]
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a state machine definition locally and report state timings.")
+    parser.add_argument("--definition", default=DEFAULT_DEFINITION)
+    parser.add_argument("--input", help="JSON file with the execution input", required=True)
+    parser.add_argument("--output", help="write the execution result here as JSON")
+    args = parser.parse_args(argv)
+
+    with open(args.input) as f:
+        payload = json.load(f)
+    machine = LocalStateMachine(args.definition)
+    result = machine.execute(payload)
+    print(machine.stats.report())
+    print(f"\n{result['status']} in {result['virtualSeconds']:.1f} virtual s ({result['wallSeconds']:.2f} wall s)")
+    if result["error"]:
+        print(f"{result['error']['error']}: {result['error']['cause']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2, default=str)
+    return 0 if result["status"] == "SUCCEEDED" else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+LAYER_PATH = os.path.join(ROOT, "layers", "common", "python")
+
+# In Lambda the common layer is mounted on /opt/python; mirror that here.
+if LAYER_PATH not in sys.path:
+    sys.path.insert(0, LAYER_PATH)
+# local/ (the offline tools) is imported as a top-level package
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+
+def _load_app(function_name):
+    """Import functions/<function_name>/app.py under a unique module name."""
+    path = os.path.join(ROOT, "functions", function_name, "app.py")
+    spec = importlib.util.spec_from_file_location(f"{function_name}_app", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def load_app():
+    return _load_app
+
+
+@pytest.fixture(autouse=True)
+def local_store():
+    """Give every test a fresh in-process state store (and governors that only know it)."""
+    import governor
+    import state_store
+
+    governor.clear()
+    store = state_store.LocalStore()
+    state_store.set_store(store)
+    yield store
+    state_store.set_store(None)
@@ -0,0 +1,41 @@
+import boto3
+import pytest
+
+import aws_clients
+
+
+@pytest.fixture(autouse=True)
+def no_cached_clients():
+    aws_clients.clear()
+    yield
+    aws_clients.clear()
+
+
+def test_lazy_client_is_built_on_first_use_and_cached(mocker):
+    created = mocker.patch.object(boto3, "client", return_value=mocker.Mock())
+
+    s3 = aws_clients.lazy_client("s3")
+    assert created.call_count == 0
+
+    s3.put_object(Bucket="b", Key="k", Body=b"")
+    s3.get_object(Bucket="b", Key="k")
+    assert aws_clients.client("s3") is created.return_value
+    assert created.call_count == 1
+    assert created.call_args.kwargs["config"].max_pool_connections == aws_clients.MAX_POOL_CONNECTIONS
+
+
+def test_dispatch_serves_the_configured_handler(monkeypatch):
+    import dispatch
+
+    handler = dispatch.load_handler("UpdateDBStatusCompleted")
+    monkeypatch.setattr(dispatch, "_handler", handler)
+
+    assert dispatch.lambda_handler({"jobId": "750x", "status": "JobComplete"}, None)["status"] == "JobComplete"
+
+
+def test_dispatch_without_handler_name_fails(monkeypatch):
+    import dispatch
+
+    monkeypatch.setattr(dispatch, "_handler", None)
+    with pytest.raises(RuntimeError):
+        dispatch.lambda_handler({}, None)
@@ -0,0 +1,40 @@
+import gzip
+import io
+
+import pytest
+
+import compression
+
+
+def compress_all(mode, chunks):
+    codec = compression.compressor(mode)
+    return b"".join(codec.compress(c) for c in chunks) + codec.flush()
+
+
+def test_gzip_output_is_a_standalone_gzip_file():
+    data = compress_all("gzip", [b"Id,Name\n", b"1,a\n" * 1000])
+
+    assert gzip.decompress(data) == b"Id,Name\n" + b"1,a\n" * 1000
+    assert len(data) < 200
+
+
+def test_none_passes_bytes_through():
+    assert compress_all("none", [b"a", b"b"]) == b"ab"
+
+
+def test_reader_picks_codec_from_key():
+    data = compress_all("gzip", [b"Id\n1\n"])
+
+    assert compression.open_reader(io.BytesIO(data), "page.csv.gz").read() == b"Id\n1\n"
+    assert compression.open_reader(io.BytesIO(b"Id\n1\n"), "page.csv").read() == b"Id\n1\n"
+
+
+def test_suffixes():
+    assert compression.suffix("gzip") == ".gz"
+    assert compression.strip_suffix("backups/750x_1.csv.gz") == "backups/750x_1"
+    assert compression.strip_suffix("backups/750x_1.csv") == "backups/750x_1"
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        compression.compressor("brotli")
@@ -0,0 +1,115 @@
+import gzip
+import io
+
+import pyarrow.parquet as pq
+import pytest
+
+
+class FakeS3:
+    def __init__(self, objects):
+        self.objects = dict(objects)
+
+    def get_paginator(self, name):
+        s3 = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                yield {"Contents": [{"Key": k} for k in sorted(s3.objects) if k.startswith(Prefix)]}
+
+        return Paginator()
+
+    def get_object(self, Bucket, Key):
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = bytes(Body)
+
+
+@pytest.fixture
+def app(load_app, mocker):
+    module = load_app("ConvertToParquet")
+    module.s3 = FakeS3({
+        "salesforce_backups/org/20250101/Account/750x_a_LOC1_2.csv.gz": gzip.compress(
+            b"Id,Name,IsDeleted,NumberOfEmployees,AnnualRevenue,CreatedDate,LastActivityDate\n"
+            b"001A,Acme,false,10,1.5,2025-01-01T10:00:00.000Z,2025-01-02\n"
+            b"001B,,true,,,,\n"
+        ),
+        "salesforce_backups/org/20250101/Account/750x_b__1.csv": (
+            b"Id,Name,IsDeleted,NumberOfEmployees,AnnualRevenue,CreatedDate,LastActivityDate\n"
+            b"001C,\"Widgets, Inc\",false,3,2,2025-01-03T00:00:00.000Z,\n"
+        ),
+        "salesforce_backups/org/20250101/Account/other_job_x.csv": b"Id\n999\n",
+    })
+    mocker.patch.object(module, "BATCH_ROWS", 2)
+    return module
+
+
+EVENT = {
+    "jobId": "750x", "objectName": "Account", "requestDetails": {"orgId": "org"},
+    "s3Prefix": "salesforce_backups/org/20250101/Account/750x_",
+}
+
+
+def test_each_page_becomes_a_typed_parquet_file(app, local_store):
+    local_store.put("schema#org", "750x", {"objectName": "Account", "fieldTypes": {
+        "Id": "id", "Name": "string", "IsDeleted": "boolean", "NumberOfEmployees": "int",
+        "AnnualRevenue": "currency", "CreatedDate": "datetime", "LastActivityDate": "date",
+    }})
+
+    result = app.lambda_handler(EVENT, None)
+
+    prefix = "salesforce_backups/org/20250101/Account/parquet/750x/"
+    assert result == {
+        "status": "Converted", "rows": 3, "pages": 2, "parquetPrefix": prefix,
+        "lastPageKey": "salesforce_backups/org/20250101/Account/750x_b__1.csv",
+    }
+    parquet = pq.ParquetFile(io.BytesIO(app.s3.objects[prefix + "750x_a_LOC1_2.parquet"]))
+    table = parquet.read()
+    assert parquet.metadata.num_row_groups == 1
+    assert str(table.schema.field("IsDeleted").type) == "bool"
+    assert str(table.schema.field("CreatedDate").type) == "timestamp[ms, tz=UTC]"
+    assert table.column("Id").to_pylist() == ["001A", "001B"]
+    assert table.column("Name").to_pylist() == ["Acme", None]
+    assert table.column("NumberOfEmployees").to_pylist() == [10, None]
+    assert table.column("IsDeleted").to_pylist() == [False, True]
+    second = pq.read_table(io.BytesIO(app.s3.objects[prefix + "750x_b__1.parquet"]))
+    assert second.column("Name").to_pylist() == ["Widgets, Inc"]
+
+
+def test_missing_schema_falls_back_to_text(app):
+    result = app.lambda_handler(EVENT, None)
+
+    table = pq.read_table(io.BytesIO(app.s3.objects[result["parquetPrefix"] + "750x_b__1.parquet"]))
+    assert set(str(f.type) for f in table.schema) == {"string"}
+
+
+class FakeContext:
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+def test_conversion_continues_from_the_cursor(app):
+    first = app.lambda_handler(EVENT, FakeContext(remaining_ms=app.TIME_RESERVE_MS))
+
+    assert (first["status"], first["pages"], first["rows"]) == ("Partial", 1, 2)
+
+    second = app.lambda_handler({**EVENT, "parquet": first}, FakeContext(remaining_ms=app.TIME_RESERVE_MS))
+
+    assert (second["status"], second["pages"], second["rows"]) == ("Converted", 2, 3)
+
+
+def test_failed_conversion_marks_the_object_failed():
+    import json
+
+    from local.step_functions import DEFAULT_DEFINITION, matches
+
+    with open(DEFAULT_DEFINITION) as f:
+        states = json.load(f)["States"]["BackupMap"]["Iterator"]["States"]
+    data = {"objectName": "Account", "parquet": {"status": "Error"}}
+    rule = next(r for r in states["AfterParquetConversion"]["Choices"] if matches(r, data, {}))
+
+    assert rule["Next"] == "ParquetConversionFailed"
+    assert states["ParquetConversionFailed"]["Next"] == "MarkFailed"
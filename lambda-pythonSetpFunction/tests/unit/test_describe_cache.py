@@ -0,0 +1,72 @@
+import pytest
+
+import describe_cache
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None, last_modified=None):
+        self.status_code = status_code
+        self._payload = payload or {}
+        self.headers = {"Last-Modified": last_modified} if last_modified else {}
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        pass
+
+
+DESCRIBE = {
+    "name": "Account",
+    "label": "Account",
+    "fields": [
+        {"name": "Id", "type": "id", "length": 18, "label": "Account ID", "picklistValues": []},
+        {"name": "BillingStreet", "type": "textarea", "length": 255, "compoundFieldName": "BillingAddress"},
+    ],
+}
+
+
+@pytest.fixture(autouse=True)
+def cold_memory():
+    describe_cache.clear()
+    yield
+    describe_cache.clear()
+
+
+@pytest.fixture
+def salesforce(mocker):
+    return mocker.patch.object(
+        describe_cache, "sf_request",
+        return_value=FakeResponse(200, DESCRIBE, "Wed, 01 Jan 2025 00:00:00 GMT"),
+    )
+
+
+def test_describe_is_trimmed_and_served_from_memory(salesforce):
+    first = describe_cache.get_describe("org", "https://org", "v65.0", "Account")
+    second = describe_cache.get_describe("org", "https://org", "v65.0", "Account")
+
+    assert salesforce.call_count == 1
+    assert salesforce.call_args.args[2] == "https://org/services/data/v65.0/sobjects/Account/describe"
+    assert first == second == {"name": "Account", "fields": [
+        {"name": "Id", "type": "id", "length": 18},
+        {"name": "BillingStreet", "type": "textarea", "length": 255, "compoundFieldName": "BillingAddress"},
+    ]}
+
+
+def test_new_container_revalidates_stored_copy(salesforce, local_store):
+    describe_cache.get_describe("org", "https://org", "v65.0", "Account")
+    describe_cache.clear()
+    salesforce.return_value = FakeResponse(304)
+
+    describe = describe_cache.get_describe("org", "https://org", "v65.0", "Account")
+
+    assert salesforce.call_args.kwargs["headers"]["If-Modified-Since"] == "Wed, 01 Jan 2025 00:00:00 GMT"
+    assert [f["name"] for f in describe["fields"]] == ["Id", "BillingStreet"]
+
+
+def test_cache_is_per_api_version(salesforce):
+    describe_cache.get_describe("org", "https://org", "v64.0", "Account")
+    describe_cache.get_describe("org", "https://org", "v65.0", "Account")
+
+    assert salesforce.call_count == 2
+    assert "If-Modified-Since" not in salesforce.call_args.kwargs["headers"]
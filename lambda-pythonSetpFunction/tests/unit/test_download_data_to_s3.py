@@ -0,0 +1,265 @@
+import pytest
+
+
+class FakePage:
+    def __init__(self, body, locator, records):
+        self.body = body
+        self.headers = {"Sforce-Locator": locator, "Sforce-NumberOfRecords": str(records)}
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), chunk_size):
+            yield self.body[i:i + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeContext:
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+@pytest.fixture
+def app(load_app, mocker):
+    module = load_app("DownloadDataToS3")
+    module.s3 = mocker.Mock()
+    mocker.patch.object(module, "getOrganizationDetails", return_value=("https://org", "token", "v65.0"))
+    return module
+
+
+@pytest.fixture
+def requested_sizes():
+    """maxRecords of every page request, in order."""
+    return []
+
+
+@pytest.fixture
+def pages(app, mocker, requested_sizes):
+    served = []
+    pages = {
+        "": FakePage(b"Id\n1\n2\n", "LOC1", 2),
+        "LOC1": FakePage(b"Id\n3\n", "LOC2", 1),
+        "LOC2": FakePage(b"Id\n4\n", "null", 1),
+    }
+
+    def fake_request(org_id, method, url, params=None, **kwargs):
+        locator = (params or {}).get("locator", "")
+        served.append(locator)
+        requested_sizes.append((params or {}).get("maxRecords"))
+        return pages[locator]
+
+    mocker.patch.object(app, "sf_request", side_effect=fake_request)
+    return served
+
+
+def event(**extra):
+    return {"jobId": "750x", "objectName": "Account", "requestDetails": {"orgId": "org"}, **extra}
+
+
+def test_drains_every_page_while_time_remains(app, pages):
+    result = app.lambda_handler(event(), FakeContext(remaining_ms=900000))
+
+    assert pages == ["", "LOC1", "LOC2"]
+    assert result["status"] == "Completed"
+    assert result["Sforce_Locator"] == ""
+    assert result["Sforce_NumberOfRecords"] == 4
+    assert result["pagesDownloaded"] == 3
+    assert app.s3.put_object.call_count == 3
+
+
+def test_hands_back_locator_when_time_runs_out(app, pages):
+    result = app.lambda_handler(event(), FakeContext(remaining_ms=app.TIME_RESERVE_MS - 1))
+
+    assert pages == [""]
+    assert result["status"] == "Partial"
+    assert result["Sforce_Locator"] == "LOC1"
+
+
+def test_resumes_from_locator_in_same_folder(app, pages):
+    first = app.lambda_handler(event(), FakeContext(remaining_ms=0))
+    second = app.lambda_handler(
+        event(Sforce_Locator=first["Sforce_Locator"], backupDate="20250101"), FakeContext(remaining_ms=900000)
+    )
+
+    assert pages == ["", "LOC1", "LOC2"]
+    assert second["status"] == "Completed"
+    assert second["s3Prefix"] == "salesforce_backups/org/20250101/Account/750x_"
+    assert second["s3Key"].startswith(second["s3Prefix"])
+
+
+def test_next_page_is_fetched_while_previous_uploads(app, pages):
+    import threading
+
+    third_page_requested = threading.Event()
+    original = app.sf_request.side_effect
+
+    def tracking_request(org_id, method, url, params=None, **kwargs):
+        response = original(org_id, method, url, params=params, **kwargs)
+        if params.get("locator") == "LOC2":
+            third_page_requested.set()
+        return response
+
+    app.sf_request.side_effect = tracking_request
+    uploads = []
+
+    def slow_first_upload(**kwargs):
+        # the first upload only finishes once the reader has moved on to later pages
+        if not uploads:
+            third_page_requested.wait(5)
+        uploads.append(kwargs["Key"])
+
+    app.s3.put_object.side_effect = slow_first_upload
+
+    result = app.lambda_handler(event(), FakeContext(remaining_ms=900000))
+
+    assert third_page_requested.is_set()
+    assert len(uploads) == result["pagesDownloaded"] == 3
+
+
+def test_upload_failure_stops_reader(app, pages):
+    app.s3.put_object.side_effect = RuntimeError("s3 down")
+
+    with pytest.raises(RuntimeError):
+        app.lambda_handler(event(), FakeContext(remaining_ms=900000))
+
+
+def test_page_size_follows_measured_record_width(app, pages, requested_sizes):
+    result = app.lambda_handler(event(bytesPerRecord=1000), FakeContext(remaining_ms=900000))
+
+    # first page sized from the describe estimate, later ones from measured bytes
+    assert requested_sizes[0] == app.PAGE_TARGET_BYTES // 1000
+    assert result["bytesPerRecord"] == pytest.approx(len(b"Id\n1\n2\nId\n3\nId\n4\n") / 4, abs=0.1)
+    assert result["maxRecords"] == app.MAX_PAGE_RECORDS
+
+
+def test_page_size_left_to_salesforce_without_estimate(app, pages, requested_sizes):
+    app.lambda_handler(event(), FakeContext(remaining_ms=900000))
+    assert requested_sizes[0] is None
+
+
+def test_page_size_shrinks_with_remaining_time(app):
+    context = FakeContext(remaining_ms=app.TIME_RESERVE_MS + 10000)
+    # 1 MB/s for 10 s at 1 KB per record leaves room for ~8000 records
+    assert app.choose_max_records(1024, 1024 * 1024, context) == app.MIN_PAGE_RECORDS
+    roomy = FakeContext(remaining_ms=app.TIME_RESERVE_MS + 100000)
+    assert app.choose_max_records(1024, 1024 * 1024, roomy) == int(1024 * 1024 * 100 * 0.8 / 1024)
+
+
+class FakeRaw:
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, amt, decode_content=True):
+        assert decode_content is False
+        yield self.body
+
+
+def test_gzip_pages_pass_through_untouched(app, mocker):
+    import gzip
+
+    import compression
+
+    mocker.patch.object(compression, "OUTPUT_COMPRESSION", "gzip")
+    wire = gzip.compress(b"Id\n1\n")
+    page = FakePage(b"", "null", 1)
+    page.headers["Content-Encoding"] = "gzip"
+    page.raw = FakeRaw(wire)
+    page.iter_content = mocker.Mock(side_effect=AssertionError("body must not be decoded"))
+    mocker.patch.object(app, "sf_request", return_value=page)
+
+    result = app.lambda_handler(event(), FakeContext(remaining_ms=900000))
+
+    stored = app.s3.put_object.call_args.kwargs
+    assert stored["Body"] == wire
+    assert stored["ContentType"] == "application/gzip"
+    assert result["s3Key"].endswith(".csv.gz")
+
+
+def test_plain_pages_are_compressed(app, pages, mocker):
+    import gzip
+
+    import compression
+
+    mocker.patch.object(compression, "OUTPUT_COMPRESSION", "gzip")
+    app.lambda_handler(event(), FakeContext(remaining_ms=900000))
+
+    bodies = [gzip.decompress(c.kwargs["Body"]) for c in app.s3.put_object.call_args_list]
+    assert bodies == [b"Id\n1\n2\n", b"Id\n3\n", b"Id\n4\n"]
+
+
+def test_watermark_advances_only_after_last_page(app, pages, local_store):
+    window = {"field": "SystemModstamp", "upTo": "2025-01-02T00:00:00Z"}
+
+    partial = app.lambda_handler(event(watermark=window), FakeContext(remaining_ms=0))
+    assert local_store.get("watermark#org", "Account") is None
+
+    app.lambda_handler(
+        event(watermark=window, Sforce_Locator=partial["Sforce_Locator"]), FakeContext(remaining_ms=900000)
+    )
+    assert local_store.get("watermark#org", "Account") == {"upTo": "2025-01-02T00:00:00Z"}
+
+
+def test_redriven_call_resumes_from_checkpoint(app, pages, local_store):
+    first = app.lambda_handler(event(checkpoint="Account"), FakeContext(remaining_ms=0))
+    assert local_store.get("checkpoint#org", "Account")["locator"] == "LOC1"
+
+    # a redrive replays the original input, which still points at the first page
+    pages.clear()
+    result = app.lambda_handler(event(checkpoint="Account"), FakeContext(remaining_ms=900000))
+
+    assert first["pagesCommitted"] == 1
+    assert pages == ["LOC1", "LOC2"]
+    assert (result["status"], result["pagesCommitted"]) == ("Completed", 3)
+    assert local_store.get("checkpoint#org", "Account") is None
+
+
+def test_page_size_uses_uncompressed_width_with_gzip_output(app, mocker):
+    import gzip
+
+    import compression
+
+    mocker.patch.object(compression, "OUTPUT_COMPRESSION", "gzip")
+    # 100 records of 200 CSV bytes each, which gzip squeezes to a fraction of that
+    body = b"Id\n" + b"".join(b"%0199d\n" % i for i in range(100))
+    sizes = []
+
+    def fake_request(org_id, method, url, params=None, **kwargs):
+        sizes.append((params or {}).get("maxRecords"))
+        page = FakePage(b"", "LOC1" if len(sizes) == 1 else "null", 100)
+        page.headers["Content-Encoding"] = "gzip"
+        page.raw = FakeRaw(gzip.compress(body))
+        return page
+
+    mocker.patch.object(app, "sf_request", side_effect=fake_request)
+
+    result = app.lambda_handler(event(), FakeContext(remaining_ms=900000))
+
+    width = len(body) / 100
+    assert result["bytesPerRecord"] == round(width, 1)
+    assert sizes[1] == int(app.PAGE_TARGET_BYTES / width)
+
+
+def test_progress_counts_pages_committed_before_a_failure(app, pages, local_store):
+    details = {"orgId": "org", "run": {"id": "exec-1", "startedAt": "2026-01-01T00:00:00Z"}}
+    app.s3.put_object.side_effect = [None, RuntimeError("s3 down")]
+    with pytest.raises(RuntimeError):
+        app.lambda_handler(event(checkpoint="Account", requestDetails=details), FakeContext(remaining_ms=900000))
+
+    # the retry resumes after the committed page and never sees it again
+    app.s3.put_object.side_effect = None
+    pages.clear()
+    result = app.lambda_handler(event(checkpoint="Account", requestDetails=details), FakeContext(remaining_ms=900000))
+
+    assert pages == ["LOC1", "LOC2"] and result["status"] == "Completed"
+    totals = local_store.get("run#exec-1", "progress")
+    assert totals["recordsExported"] == 4
+    assert totals["bytesExported"] == len(b"Id\n1\n2\nId\n3\nId\n4\n")
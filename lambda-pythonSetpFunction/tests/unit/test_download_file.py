@@ -0,0 +1,168 @@
+import hashlib
+import json
+import threading
+
+import pytest
+
+
+class FakeFile:
+    def __init__(self, body):
+        self.body = body
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        yield self.body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def app(load_app, mocker):
+    module = load_app("downloadFile")
+    module.s3 = mocker.Mock()
+    mocker.patch.object(module, "getOrganizationDetails", return_value=("https://org", "token", "v65.0"))
+    return module
+
+
+def batch_event(*ids, attempt=None):
+    event = {
+        "Items": [{"contentVersionId": f"{i}/{i}.pdf"} for i in ids],
+        "BatchInput": {"s3Key": "backups/ContentVersion/750x.csv.gz", "S3BUCKET": "bucket",
+                       "requestDetails": {"orgId": "org"}},
+    }
+    if attempt is not None:
+        event["attempt"] = attempt
+    return event
+
+
+def test_batch_runs_concurrently_and_reports_each_item(app, mocker):
+    mocker.patch.object(app, "DOWNLOAD_CONCURRENCY", 3)
+    in_flight = []
+    lock = threading.Lock()
+    all_started = threading.Barrier(3, timeout=5)
+
+    def fake_request(org_id, method, url, **kwargs):
+        with lock:
+            in_flight.append(url)
+        all_started.wait()
+        if url.endswith("/068B"):
+            raise RuntimeError("boom")
+        return FakeFile(b"data")
+
+    mocker.patch.object(app, "sf_request", side_effect=fake_request)
+
+    result = app.lambda_handler(batch_event("068A", "068B", "068C"), None)
+
+    assert len(in_flight) == 3
+    assert result["succeeded"] == ["068A/068A.pdf", "068C/068C.pdf"]
+    assert result["failed"] == [{"contentVersionId": "068B/068B.pdf", "error": "boom"}]
+    assert (result["status"], result["attempt"], result["retry"]) == ("PartiallyFailed", 1, True)
+    keys = sorted(call.kwargs["Key"] for call in app.s3.put_object.call_args_list)
+    assert keys == ["backups/ContentVersion/750x/068A_068A.pdf", "backups/ContentVersion/750x/068C_068C.pdf"]
+
+
+def test_last_attempt_stops_retrying(app, mocker):
+    mocker.patch.object(app, "sf_request", side_effect=RuntimeError("down"))
+
+    result = app.lambda_handler(batch_event("068A", attempt=app.MAX_ATTEMPTS - 1), None)
+
+    assert result["attempt"] == app.MAX_ATTEMPTS
+    assert result["retry"] is False
+    assert result["BatchInput"]["S3BUCKET"] == "bucket"
+
+
+def test_single_item_event_still_supported(app, mocker):
+    mocker.patch.object(app, "sf_request", return_value=FakeFile(b"data"))
+
+    result = app.lambda_handler({
+        "contentVersionId": "068A/a.pdf", "s3Key": "backups/cv.csv", "S3BUCKET": "bucket",
+        "requestDetails": {"orgId": "org"},
+    }, None)
+
+    assert (result["statusCode"], result["succeeded"], result["failed"]) == (200, ["068A/a.pdf"], [])
+
+
+def test_known_checksum_writes_pointer_without_downloading(app, mocker, local_store):
+    body = b"same bytes"
+    checksum = hashlib.md5(body).hexdigest()
+    fetch = mocker.patch.object(app, "sf_request", return_value=FakeFile(body))
+    event = batch_event("068A", "068B")
+    for item in event["Items"]:
+        item["Checksum"] = checksum
+
+    app.lambda_handler({**event, "Items": event["Items"][:1]}, None)
+    result = app.lambda_handler({**event, "Items": event["Items"][1:]}, None)
+
+    assert fetch.call_count == 1
+    assert result["deduplicated"] == 1
+    blob = f"salesforce_backups/org/_blobs/{checksum}"
+    assert local_store.get("blob#org", checksum)["key"] == blob
+    pointer = json.loads(app.s3.put_object.call_args_list[-1].kwargs["Body"])
+    assert app.s3.put_object.call_args_list[-1].kwargs["Key"] == "backups/ContentVersion/750x/068B_068B.pdf.pointer.json"
+    assert (pointer["blobKey"], pointer["size"]) == (blob, len(body))
+
+
+def test_checksum_mismatch_is_not_indexed(app, mocker, local_store):
+    mocker.patch.object(app, "sf_request", return_value=FakeFile(b"corrupted"))
+    event = batch_event("068A")
+    event["Items"][0]["Checksum"] = "0" * 32
+
+    result = app.lambda_handler(event, None)
+
+    assert "Checksum mismatch" in result["failed"][0]["error"]
+    assert local_store.get("blob#org", "0" * 32) is None
+    app.s3.delete_object.assert_called_once()
+
+
+def test_batch_status_recorded_once_after_its_last_attempt(app, mocker, local_store):
+    outcomes = iter([RuntimeError("boom"), FakeFile(b"data"), FakeFile(b"data")])
+
+    def fake_request(org_id, method, url, **kwargs):
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    mocker.patch.object(app, "DOWNLOAD_CONCURRENCY", 1)
+    mocker.patch.object(app, "sf_request", side_effect=fake_request)
+
+    first = app.lambda_handler(batch_event("068A", "068B"), None)
+    assert first["retry"] and local_store.query("status") == []
+
+    retry = app.lambda_handler({
+        "Items": first["failed"], "BatchInput": first["BatchInput"], "attempt": first["attempt"],
+        "batchId": first["batchId"], "succeededCount": first["succeededCount"],
+    }, None)
+
+    assert retry["retry"] is False
+    status = local_store.get("status", "backups/ContentVersion/750x#068A")
+    assert (status["status"], status["succeeded"], status["failed"], status["attempts"]) == ("Completed", 2, [], 2)
+
+
+def test_unexpected_error_fails_the_whole_batch_without_retry(app, mocker):
+    mocker.patch.object(app, "getOrganizationDetails", side_effect=RuntimeError("no org"))
+
+    result = app.lambda_handler(batch_event("a", "b"), None)
+
+    assert (result["statusCode"], result["retry"]) == (500, False)
+    assert [item["contentVersionId"] for item in result["failed"]] == ["a/a.pdf", "b/b.pdf"]
+    assert result["BatchInput"]["S3BUCKET"] == "bucket"
+
+
+def test_file_threads_of_the_whole_map_fit_in_the_governor_slots(load_app):
+    import governor
+    from local.step_functions import DEFAULT_DEFINITION
+
+    app = load_app("downloadFile")
+    with open(DEFAULT_DEFINITION) as f:
+        definition = json.load(f)
+    file_map = definition["States"]["BackupMap"]["Iterator"]["States"]["ContentVersionMap"]
+
+    assert app.FILE_MAP_CONCURRENCY == file_map["MaxConcurrency"]
+    assert app.DOWNLOAD_CONCURRENCY * file_map["MaxConcurrency"] <= governor.MAX_CONCURRENT
@@ -0,0 +1,104 @@
+import json
+
+import pytest
+
+import exception_handler
+from exception_handler import add_metric, bound, instrumented, lambda_exception_handler, timed
+
+
+class FakeContext:
+    function_name = "DownloadDataToS3"
+    aws_request_id = "req-1"
+
+
+@pytest.fixture
+def emitted():
+    records = []
+    exception_handler.add_listener(records.append)
+    yield records
+    exception_handler.remove_listener(records.append)
+
+
+def test_instrumented_emits_one_emf_line_with_phases(emitted, capsys):
+    @instrumented
+    def handler(event, context):
+        with timed("SalesforceRequest"):
+            pass
+        with timed("SalesforceRequest"):
+            pass
+        add_metric("S3Bytes", 100, "Bytes")
+        add_metric("S3Bytes", 50, "Bytes")
+        return {"status": "Completed"}
+
+    assert handler({"objectName": "Account", "requestDetails": {"orgId": "org1"}}, FakeContext()) == {"status": "Completed"}
+
+    record = json.loads(capsys.readouterr().out.strip().splitlines()[-1])
+    assert record == emitted[-1]
+    assert record["FunctionName"] == "DownloadDataToS3"
+    assert record["ObjectName"] == "Account"
+    assert record["orgId"] == "org1" and record["requestId"] == "req-1"
+    assert record["SalesforceRequestCalls"] == 2
+    assert record["S3Bytes"] == 150
+    assert record["Errors"] == 0
+    definition = record["_aws"]["CloudWatchMetrics"][0]
+    assert definition["Dimensions"] == [["FunctionName"]]  # ObjectName stays a property
+    units = {m["Name"]: m["Unit"] for m in definition["Metrics"]}
+    assert units["SalesforceRequestMs"] == "Milliseconds"
+    assert units["S3Bytes"] == "Bytes"
+    # every metric named in the definition is present on the record
+    assert all(name in record for name in units)
+
+
+def test_cold_start_only_on_first_invocation(monkeypatch, emitted):
+    monkeypatch.setattr(exception_handler, "_cold_start", True)
+    handler = instrumented(lambda event, context: {})
+
+    handler({}, None)
+    handler({}, None)
+
+    assert [r["ColdStart"] for r in emitted] == [1, 0]
+
+
+def test_errors_counted_for_raised_and_reported_failures(emitted):
+    @instrumented
+    def broken(event, context):
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        broken({}, None)
+    instrumented(lambda event, context: {"statusCode": 500, "body": "Error occurred"})({}, None)
+
+    assert [r["Errors"] for r in emitted] == [1, 1]
+
+
+def test_worker_threads_record_into_the_running_invocation(emitted):
+    from concurrent.futures import ThreadPoolExecutor
+
+    @instrumented
+    def handler(event, context):
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(bound(lambda _: add_metric("Files", 1)), range(8)))
+        return {}
+
+    handler({}, None)
+
+    assert emitted[-1]["Files"] == 8
+
+
+def test_metrics_are_dropped_outside_a_handler(emitted):
+    with timed("S3Upload"):
+        add_metric("S3Bytes", 10, "Bytes")
+
+    assert exception_handler.current_metrics() is None
+    assert emitted == []
+
+
+def test_lambda_exception_handler_keeps_its_response_shape(emitted):
+    @lambda_exception_handler
+    def handler(event, context):
+        raise ValueError("bad input")
+
+    response = handler({}, None)
+
+    assert response["statusCode"] == 400
+    assert emitted[-1]["Errors"] == 1
@@ -0,0 +1,74 @@
+import gzip
+import io
+import json
+
+import pytest
+
+
+class FakeS3:
+    def __init__(self, objects):
+        self.objects = dict(objects)
+
+    def get_paginator(self, name):
+        s3 = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                yield {"Contents": [{"Key": k} for k in sorted(s3.objects) if k.startswith(Prefix)]}
+
+        return Paginator()
+
+    def get_object(self, Bucket, Key):
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = bytes(Body)
+
+
+PREFIX = "salesforce_backups/org/20250101/ContentVersion/750x_"
+
+
+@pytest.fixture
+def s3():
+    return FakeS3({
+        f"{PREFIX}a_LOC1_2.csv.gz": gzip.compress(
+            b"Id,PathOnClient,Checksum\n068A,a.pdf,c1\n068B,\"b, final.docx\",c2\n"
+        ),
+        f"{PREFIX}b__2.csv": b"Id,PathOnClient,Checksum\n068C,c.png,c3\n,,\n",
+    })
+
+
+@pytest.fixture
+def app(load_app, mocker, s3):
+    module = load_app("extractContentVersionList")
+    mocker.patch.object(module, "s3", s3)
+    mocker.patch.object(module, "MANIFEST_SHARD_ITEMS", 2)
+    return module
+
+
+def read_manifest(s3, keys):
+    return [json.loads(line) for key in keys for line in s3.objects[key].decode().splitlines()]
+
+
+def test_pages_stream_into_sharded_jsonl_manifest(app, s3):
+    result = app.lambda_handler({
+        "s3Key": f"{PREFIX}b__2.csv", "s3Prefix": PREFIX, "requestDetails": {"orgId": "org"},
+    }, None)
+
+    assert result["manifestBucket"] == "qpms-backup"
+    assert result["manifestPrefix"] == f"{PREFIX}manifest/"
+    assert result["manifestKeys"] == [f"{PREFIX}manifest/part-00000.jsonl", f"{PREFIX}manifest/part-00001.jsonl"]
+    assert (result["itemCount"], result["shardCount"]) == (3, 2)
+    assert result["requestDetails"] == {"orgId": "org"}
+    items = read_manifest(s3, result["manifestKeys"])
+    assert [item["contentVersionId"] for item in items] == ["068A/a.pdf", "068B/b, final.docx", "068C/c.png"]
+    assert items[0] == {"contentVersionId": "068A/a.pdf", "Id": "068A", "PathOnClient": "a.pdf", "Checksum": "c1"}
+
+
+def test_manifest_pages_are_not_reread_as_csv(app, s3):
+    event = {"s3Key": f"{PREFIX}b__2.csv", "s3Prefix": PREFIX}
+    app.lambda_handler(event, None)
+
+    result = app.lambda_handler(event, None)
+
+    assert result["itemCount"] == 3
@@ -0,0 +1,125 @@
+import pytest
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        pass
+
+
+GLOBAL = {"sobjects": [
+    {"name": "Invoice__c", "queryable": True},
+    {"name": "Empty__c", "queryable": True},
+    {"name": "Account", "queryable": True},
+    {"name": "Contact", "queryable": True},
+    {"name": "Report", "queryable": False},
+]}
+
+
+@pytest.fixture
+def app(load_app, mocker):
+    module = load_app("GetSalesforceObjectList")
+    mocker.patch.object(module, "getOrganizationDetails", return_value=("https://org", "token", "v65.0"))
+    return module
+
+
+def fake_salesforce(mocker, app, record_counts, batch_results):
+    calls = []
+
+    def fake_request(org_id, method, url, **kwargs):
+        calls.append((method, url, kwargs.get("json")))
+        if url.endswith("/sobjects/"):
+            return FakeResponse(GLOBAL)
+        if "/limits/recordCount" in url:
+            return FakeResponse({"sObjects": [{"name": n, "count": c} for n, c in record_counts.items()]})
+        requests = kwargs["json"]["batchRequests"]
+        return FakeResponse({"results": [batch_results(r["url"]) for r in requests]})
+
+    mocker.patch.object(app, "sf_request", side_effect=fake_request)
+    return calls
+
+
+def test_full_backup_uses_record_counts_and_confirms_zeros(app, mocker):
+    calls = fake_salesforce(
+        mocker, app, {"Invoice__c": 1200, "Empty__c": 0, "Account": 50},
+        lambda url: {"statusCode": 200, "result": {"totalSize": 0}},
+    )
+
+    result = app.lambda_handler({"requestDetails": {"orgId": "org", "BackUpType": "Full"}}, None)
+
+    assert result["objects"] == [
+        {"objectName": "Invoice__c", "estimatedRecords": 1200, "idRange": None},
+        {"objectName": "Account", "estimatedRecords": 50, "idRange": None},
+        {"objectName": "Contact", "estimatedRecords": None, "idRange": None},
+    ]
+    batch = [c for c in calls if c[1].endswith("/composite/batch")]
+    assert len(calls) == 3 and len(batch) == 1
+    assert [r["url"] for r in batch[0][2]["batchRequests"]] == ["v65.0/query?q=SELECT%20COUNT%28%29%20FROM%20Empty__c"]
+
+
+def test_daily_backup_counts_changes_in_composite_batches(app, mocker):
+    mocker.patch.object(app, "COMPOSITE_BATCH_SIZE", 2)
+    changed = {"Invoice__c": 3, "Account": 0, "Contact": 7}
+
+    def batch_result(url):
+        name = next(n for n in [*changed, "Empty__c"] if f"FROM%20{n}%20" in url)
+        if name == "Empty__c":
+            return {"statusCode": 400, "result": [{"errorCode": "INVALID_FIELD"}]}
+        return {"statusCode": 200, "result": {"totalSize": changed[name]}}
+
+    calls = fake_salesforce(mocker, app, {}, batch_result)
+
+    result = app.lambda_handler({"requestDetails": {"orgId": "org", "BackUpType": "Daily"}}, None)
+
+    assert result["objects"] == [
+        {"objectName": "Invoice__c", "estimatedRecords": 3, "idRange": None},
+        {"objectName": "Empty__c", "estimatedRecords": None, "idRange": None},
+        {"objectName": "Contact", "estimatedRecords": 7, "idRange": None},
+    ]
+    assert sum(c[1].endswith("/composite/batch") for c in calls) == 2
+    assert all("recordCount" not in c[1] for c in calls)
+
+
+def test_large_full_backup_objects_are_split_by_id_range(app, mocker):
+    mocker.patch.object(app, "CHUNK_THRESHOLD_RECORDS", 1000)
+    mocker.patch.object(app, "CHUNK_TARGET_RECORDS", 500)
+
+    def batch_result(url):
+        assert "FROM%20Invoice__c%20ORDER%20BY%20Id" in url
+        first = "ASC" in url
+        return {"statusCode": 200, "result": {"records": [{"Id": "a01000000000000AAA" if first else "a010000000zzzzzAAA"}]}}
+
+    fake_salesforce(mocker, app, {"Invoice__c": 1200, "Account": 50, "Contact": 10, "Empty__c": 5}, batch_result)
+
+    result = app.lambda_handler({"requestDetails": {"orgId": "org", "BackUpType": "Full"}}, None)
+
+    chunks = [o for o in result["objects"] if o["objectName"] == "Invoice__c"]
+    assert len(chunks) == 3
+    assert [o["estimatedRecords"] for o in chunks] == [400, 400, 400]
+    ranges = [o["idRange"] for o in chunks]
+    assert ranges[0]["from"] is None and ranges[-1]["to"] is None
+    assert ranges[0]["to"] == ranges[1]["from"] and ranges[1]["to"] == ranges[2]["from"]
+    assert "a01000000000000" < ranges[1]["from"] < ranges[1]["to"] < "a010000000zzzzz"
+
+
+def test_split_id_range_is_even_in_base62(app):
+    assert app.split_id_range("a0100", "a0104", 4) == ["a0100", "a0101", "a0102", "a0103", "a0104"]
+    assert app.split_id_range("a0109", "a010A", 4) == ["a0109", "a010A"]
+
+
+def test_big_object_reported_empty_is_kept_without_a_count(app, mocker):
+    calls = fake_salesforce(
+        mocker, app, {"Log__b": 0, "Empty__c": 0},
+        lambda url: {"statusCode": 200, "result": {"totalSize": 0}},
+    )
+
+    counts = app.estimate_record_counts("org", "https://org", "v65.0", ["Log__b", "Empty__c"], "Full")
+
+    assert counts == {"Log__b": None, "Empty__c": 0}
+    batch = [c for c in calls if c[1].endswith("/composite/batch")]
+    assert [r["url"] for r in batch[0][2]["batchRequests"]] == ["v65.0/query?q=SELECT%20COUNT%28%29%20FROM%20Empty__c"]
@@ -0,0 +1,241 @@
+import threading
+import time
+
+import pytest
+
+import governor
+import sf_utils
+from local.fake_salesforce import FakeSalesforce, SyntheticObject
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, headers=None, text=""):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = text
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Wall clock the bucket refills from; sleeping moves it forward."""
+    now = {"t": 1000.0}
+    monkeypatch.setattr(governor.time, "time", lambda: now["t"])
+    monkeypatch.setattr(governor.time, "sleep", lambda seconds: now.update(t=now["t"] + seconds))
+    return now
+
+
+def slots(store, org="org"):
+    return [sk for sk, _ in store.query(f"governor#{org}") if sk.startswith("slot#")]
+
+
+def test_rate_tapers_before_the_reserve():
+    limit = 100000
+    assert governor.target_rate(0, limit) == governor.MAX_RATE
+    # halfway through the taper band, which ends where the reserve starts
+    assert governor.target_rate(70000, limit) == pytest.approx(governor.MAX_RATE / 2)
+    assert governor.target_rate(80000, limit) == governor.MIN_RATE
+    assert governor.target_rate(99999, limit) == governor.MIN_RATE
+
+
+def test_bucket_paces_calls_once_the_burst_is_spent(monkeypatch, clock, local_store):
+    monkeypatch.setattr(governor, "BURST", 2)
+    monkeypatch.setattr(governor, "LEASE_TOKENS", 1)
+    org = governor.get_governor("org")
+    org.rate = 4
+
+    for _ in range(3):
+        org.release(org.acquire())
+
+    # two calls from the burst, the third after a quarter second of refill
+    assert clock["t"] == pytest.approx(1000.25, abs=0.06)
+    assert slots(local_store) == []
+
+
+def test_containers_share_one_bucket(monkeypatch, clock, local_store):
+    monkeypatch.setattr(governor, "BURST", 10)
+    monkeypatch.setattr(governor, "LEASE_TOKENS", 5)
+
+    governor.get_governor("org").acquire()
+    governor.clear()  # a second container
+    governor.get_governor("org").acquire()
+
+    assert local_store.get("governor#org", "bucket")["tokens"] == 0
+
+
+def test_slots_cap_concurrent_calls(monkeypatch, clock, local_store):
+    monkeypatch.setattr(governor, "MAX_CONCURRENT", 1)
+    monkeypatch.setattr(governor, "MAX_WAIT_SECONDS", 0.05)
+    org = governor.get_governor("org")
+
+    slot = org.acquire()
+    with pytest.raises(governor.GovernorTimeout):
+        org.acquire()
+    org.release(slot)
+    assert org.acquire()[0] == slot[0]
+
+
+def test_throttling_halves_the_rate_and_limit_info_restores_it(local_store):
+    org = governor.get_governor("org")
+
+    org.observe(FakeResponse(503))
+    org.observe(FakeResponse(403, text='[{"errorCode": "REQUEST_LIMIT_EXCEEDED"}]'))
+    assert org.rate == governor.MAX_RATE / 4
+
+    org.observe(FakeResponse(200, {"Sforce-Limit-Info": "api-usage=10/100000"}))
+    assert org.rate == governor.MAX_RATE / 4 + governor.MAX_RATE / 10
+
+
+def test_learnt_rate_reaches_other_containers(local_store):
+    org = governor.get_governor("org")
+    org.observe(FakeResponse(429))
+    org.acquire()  # leases tokens and writes the rate
+
+    governor.clear()
+    other = governor.get_governor("org")
+    other.acquire()
+
+    assert other.rate == governor.MAX_RATE / 2
+
+
+def test_streamed_response_keeps_its_slot_until_closed(mocker, local_store):
+    mocker.patch.object(sf_utils, "get_access_token", return_value="token")
+    mocker.patch.object(sf_utils.http_session, "request", side_effect=lambda *a, **k: FakeResponse())
+
+    sf_utils.sf_request("org", "GET", "https://example/services/data")
+    assert slots(local_store) == []
+
+    response = sf_utils.sf_request("org", "GET", "https://example/services/data", stream=True)
+    assert len(slots(local_store)) == 1
+    with response:
+        pass
+    assert response.closed and slots(local_store) == []
+
+
+def test_concurrency_held_to_the_cap_against_salesforce(monkeypatch):
+    monkeypatch.setattr(governor, "MAX_CONCURRENT", 2)
+    monkeypatch.setattr(sf_utils, "_token_cache", {})
+    with FakeSalesforce([SyntheticObject("Account", 10)], latency_ms=30) as salesforce:
+        monkeypatch.setenv("SF_INSTANCE_URL", salesforce.url)
+        monkeypatch.setenv("SF_CLIENT_ID", "local")
+        monkeypatch.setenv("SF_CLIENT_SECRET", "local")
+        sf_utils.get_access_token("org")
+        salesforce.peak_concurrent = 0
+
+        def describe():
+            sf_utils.sf_request("org", "GET", f"{salesforce.url}/services/data/v65.0/sobjects/Account/describe").close()
+
+        threads = [threading.Thread(target=describe) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert salesforce.calls["describe"] == 8
+    assert salesforce.peak_concurrent <= 2
+    assert salesforce.api_used == 8
+
+
+def test_slot_goes_back_as_soon_as_its_call_is_done(mocker, local_store):
+    puts = mocker.spy(local_store, "put_if_absent")
+    queries = mocker.spy(local_store, "query")
+    org = governor.get_governor("org")
+
+    slot = org.acquire()
+    held = local_store.get("governor#org", slot[0])
+    org.release(slot)
+
+    # a random free slot is taken without a Query, and freed right away
+    assert puts.call_count == 1 and queries.call_count == 0
+    assert held == {"holder": org.holder, "expiresAt": held["expiresAt"]}
+    assert slots(local_store) == []
+
+
+def test_more_containers_than_slots_per_container_call_at_once(monkeypatch, local_store):
+    monkeypatch.setattr(governor, "MAX_WAIT_SECONDS", 5)
+    containers = [governor.Governor("org") for _ in range(12)]
+    held = {}
+    everyone_holds = threading.Barrier(len(containers))
+
+    def call(container):
+        slot = container.acquire()
+        held[container.holder] = slot[0]
+        everyone_holds.wait(timeout=5)
+        container.release(slot)
+
+    threads = [threading.Thread(target=call, args=(c,)) for c in containers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(held) == 12 and len(set(held.values())) == 12
+    assert slots(local_store) == []
+
+
+def test_release_leaves_a_slot_another_container_took_over(local_store):
+    org = governor.get_governor("org")
+    slot = org.acquire()
+    # our lease lapsed and another container leased the same slot
+    local_store.put("governor#org", slot[0], {"holder": "other"})
+
+    org.release(slot)
+
+    assert local_store.get("governor#org", slot[0]) == {"holder": "other"}
+
+
+def test_freed_slot_is_handed_to_a_waiting_thread(monkeypatch, mocker, local_store):
+    monkeypatch.setattr(governor, "MAX_CONCURRENT", 1)
+    monkeypatch.setattr(governor, "MAX_WAIT_SECONDS", 5)
+    org = governor.get_governor("org")
+    slot = org.acquire()
+    deletes = mocker.spy(local_store, "delete_if")
+    handed = []
+    waiter = threading.Thread(target=lambda: handed.append(org.acquire()))
+    waiter.start()
+    while not org._waiting:
+        time.sleep(0.01)
+
+    org.release(slot)
+    waiter.join()
+
+    assert handed[0][0] == slot[0] and deletes.call_count == 0
+    org.release(handed[0])
+    assert slots(local_store) == []
+
+
+def test_slots_left_for_waiters_that_gave_up_go_back_when_the_handler_returns(local_store):
+    from exception_handler import instrumented
+
+    org = governor.get_governor("org")
+
+    @instrumented
+    def handler(event, context):
+        slot = org.acquire()
+        org._waiting = 1  # a waiter that times out before picking the slot up
+        org.release(slot)
+        org._waiting = 0
+        assert len(slots(local_store)) == 1
+        return {"statusCode": 200}
+
+    handler({}, None)
+
+    assert slots(local_store) == []
+
+
+def test_get_and_post_go_through_the_governor(mocker, local_store):
+    send = mocker.patch.object(sf_utils, "sf_request", return_value=mocker.Mock(json=lambda: {"ok": True}))
+
+    assert sf_utils.get("https://example/services/data", OrgId="org") == {"ok": True}
+    assert sf_utils.post("https://example/services/data", payload={"a": 1}, OrgId="org") == {"ok": True}
+
+    assert [c.args[:2] for c in send.call_args_list] == [("org", "GET"), ("org", "POST")]
@@ -0,0 +1,75 @@
+import pytest
+import requests
+
+import http_session
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def no_sleep(mocker):
+    return mocker.patch.object(http_session.time, "sleep")
+
+
+def test_session_is_shared_per_instance():
+    first = http_session.get_session("https://org.my.salesforce.com/services/data/v65.0/sobjects")
+    second = http_session.get_session("https://org.my.salesforce.com/services/data/v65.0/jobs/query")
+    other = http_session.get_session("https://other.my.salesforce.com/services")
+
+    assert first is second
+    assert first is not other
+
+
+def test_retries_throttling_then_succeeds(mocker, no_sleep):
+    responses = [FakeResponse(503), FakeResponse(429, {"Retry-After": "2"}), FakeResponse(200)]
+    session = mocker.Mock()
+    session.request.side_effect = responses
+    mocker.patch.object(http_session, "get_session", return_value=session)
+
+    response = http_session.request("GET", "https://org/services")
+
+    assert response.status_code == 200
+    assert responses[0].closed and responses[1].closed
+    assert no_sleep.call_args_list[1] == mocker.call(2.0)
+
+
+def test_gives_back_last_response_when_retries_exhausted(mocker, no_sleep):
+    session = mocker.Mock()
+    session.request.side_effect = [FakeResponse(503), FakeResponse(503)]
+    mocker.patch.object(http_session, "get_session", return_value=session)
+
+    response = http_session.request("GET", "https://org/services", retries=1)
+
+    assert response.status_code == 503
+    assert no_sleep.call_count == 1
+
+
+def test_connection_reset_retried_for_get(mocker, no_sleep):
+    session = mocker.Mock()
+    session.request.side_effect = [requests.ConnectionError("Connection reset by peer"), FakeResponse(200)]
+    mocker.patch.object(http_session, "get_session", return_value=session)
+
+    assert http_session.request("GET", "https://org/services").status_code == 200
+
+
+def test_post_not_replayed_after_reset(mocker, no_sleep):
+    session = mocker.Mock()
+    session.request.side_effect = [requests.ConnectionError("Connection reset by peer"), FakeResponse(200)]
+    mocker.patch.object(http_session, "get_session", return_value=session)
+
+    with pytest.raises(requests.ConnectionError):
+        http_session.request("POST", "https://org/services/data/v65.0/jobs/query")
+    assert session.request.call_count == 1
+
+
+def test_backoff_is_bounded():
+    for attempt in range(10):
+        assert 0 <= http_session.backoff_delay(attempt) <= http_session.BACKOFF_MAX_SECONDS
@@ -0,0 +1,64 @@
+import pytest
+
+FIELDS = {"fields": [{"name": "Id", "type": "id"}, {"name": "Name", "type": "string", "length": 80}]}
+
+
+@pytest.fixture
+def app(load_app):
+    return load_app("InitBulkBackup")
+
+
+def test_full_query_has_no_filter(app):
+    assert app.get_object_query("Account", FIELDS, "Full") == "SELECT Id, Name FROM Account"
+
+
+def test_id_range_chunk_is_added_to_the_filter(app):
+    query = app.get_object_query("Account", FIELDS, "Daily", {"from": "001000000000AAA", "to": "001000000000zzz"})
+
+    assert query == (
+        "SELECT Id, Name FROM Account WHERE SystemModstamp = YESTERDAY"
+        " AND Id >= '001000000000AAA' AND Id < '001000000000zzz'"
+    )
+
+
+def test_open_ended_chunk_has_one_bound(app):
+    query = app.get_object_query("Account", FIELDS, "Full", {"from": None, "to": "001000000000zzz"})
+
+    assert query == "SELECT Id, Name FROM Account WHERE Id < '001000000000zzz'"
+
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+def resume_event(**extra):
+    return {"objectName": "Account", "estimatedRecords": 10, "requestDetails": {"orgId": "org", "BackUpType": "Full"}, **extra}
+
+
+def test_rerun_resumes_the_checkpointed_job(app, mocker, local_store):
+    import checkpoints
+    mocker.patch.object(app, "getOrganizationDetails", return_value=("https://org", "token", "v65.0"))
+    checkpoints.start("org", "Account", "750old", "Full", "20260101", bytes_per_record=40)
+    checkpoints.commit_page("org", "Account", "750old", "LOC1", "key1", 5)
+    sf_request = mocker.patch.object(app, "sf_request", return_value=FakeResponse(200, {"state": "JobComplete"}))
+
+    result = app.lambda_handler(resume_event(), None)
+
+    assert (result["jobId"], result["resumed"], result["waitSeconds"]) == ("750old", True, 0)
+    assert result["checkpoint"] == "Account"
+    sf_request.assert_called_once_with("org", "GET", "https://org/services/data/v65.0/jobs/query/750old")
+
+
+def test_expired_job_falls_back_to_a_new_one(app, mocker, local_store):
+    import checkpoints
+    mocker.patch.object(app, "getOrganizationDetails", return_value=("https://org", "token", "v65.0"))
+    checkpoints.start("org", "Account", "750old", "Full", "20260101")
+    mocker.patch.object(app, "sf_request", return_value=FakeResponse(404, [{"errorCode": "NOT_FOUND"}]))
+
+    assert app.resume_job("org", "https://org", "v65.0", "Account", "Account", "Full") is None
+    assert local_store.get("checkpoint#org", "Account") is None
@@ -0,0 +1,118 @@
+import time
+
+import pytest
+
+import job_status
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture
+def salesforce(mocker):
+    states = {}
+
+    def fake_request(org_id, method, url, json=None, **kwargs):
+        results = []
+        for request in json["batchRequests"]:
+            job_id = request["url"].rsplit("/", 1)[1]
+            if job_id in states:
+                results.append({"statusCode": 200, "result": {"id": job_id, "object": "Account", "state": states[job_id]}})
+            else:
+                results.append({"statusCode": 404, "result": [{"errorCode": "NOT_FOUND"}]})
+        return FakeResponse({"results": results})
+
+    mock = mocker.patch.object(job_status, "sf_request", side_effect=fake_request)
+    mock.states = states
+    return mock
+
+
+def age(store, org, job_id, seconds):
+    item = store.get(f"jobs#{org}", job_id)
+    store.put(f"jobs#{org}", job_id, {**item, "checkedAt": time.time() - seconds})
+
+
+def test_one_sweep_serves_every_in_flight_job(salesforce, local_store, mocker):
+    mocker.patch.object(job_status, "COMPOSITE_BATCH_SIZE", 2)
+    for job_id in ("750A", "750B", "750C"):
+        job_status.register_job("org", job_id, "Account", "UploadComplete")
+        age(local_store, "org", job_id, 1000)
+        salesforce.states[job_id] = "InProgress"
+    salesforce.states["750B"] = "JobComplete"
+
+    assert job_status.get_job("org", "https://org", "v65.0", "750A")["state"] == "InProgress"
+    assert job_status.get_job("org", "https://org", "v65.0", "750B")["state"] == "JobComplete"
+    assert job_status.get_job("org", "https://org", "v65.0", "750C")["state"] == "InProgress"
+
+    # three jobs in batches of two: one sweep, two composite calls
+    assert salesforce.call_count == 2
+
+
+def test_branch_without_lease_uses_last_known_state(salesforce, local_store):
+    job_status.register_job("org", "750A", "Account", "InProgress")
+    age(local_store, "org", "750A", 1000)
+    local_store.put_if_absent("lease#org", "job-poller", {"holder": "750Z"}, ttl=60)
+
+    assert job_status.get_job("org", "https://org", "v65.0", "750A")["state"] == "InProgress"
+    assert salesforce.call_count == 0
+
+
+def test_unregistered_job_is_polled_directly(salesforce, local_store):
+    salesforce.states["750X"] = "JobComplete"
+
+    assert job_status.get_job("org", "https://org", "v65.0", "750X")["state"] == "JobComplete"
+    assert local_store.get("jobs#org", "750X")["state"] == "JobComplete"
+
+
+def test_terminal_states_are_never_polled_again(salesforce, local_store):
+    job_status.register_job("org", "750A", "Account", "JobComplete")
+    age(local_store, "org", "750A", 10 ** 6)
+
+    assert job_status.get_job("org", "https://org", "v65.0", "750A")["state"] == "JobComplete"
+    assert salesforce.call_count == 0
+
+
+def test_wait_follows_measured_progress():
+    job = {"createdAt": 1000, "numberRecordsProcessed": 100000}
+
+    # 100k rows in 100 s, 200k left: about 200 s to go
+    assert job_status.recommend_wait(job, 300000, now=1100) == 200
+
+
+def test_small_objects_poll_at_the_minimum():
+    assert job_status.recommend_wait({}, 200) == job_status.POLL_MIN_WAIT_SECONDS
+
+
+def test_unknown_size_backs_off_and_is_capped():
+    job = {"createdAt": 0, "numberRecordsProcessed": 0}
+
+    assert job_status.recommend_wait(job, None, now=120) == 60
+    assert job_status.recommend_wait(job, None, now=10 ** 6) == job_status.POLL_MAX_WAIT_SECONDS
+
+
+def test_refresh_records_progress(salesforce, local_store):
+    salesforce.states["750A"] = "InProgress"
+
+    job = job_status.get_job("org", "https://org", "v65.0", "750A")
+
+    assert job["state"] == "InProgress"
+    assert "numberRecordsProcessed" in job and "createdAt" in job
+
+
+def test_refresh_marks_the_item_fresh_until_the_next_poll(salesforce, local_store, mocker):
+    mocker.patch.object(job_status, "recommend_wait", return_value=120)
+    salesforce.states["750A"] = "InProgress"
+
+    job = job_status.get_job("org", "https://org", "v65.0", "750A")
+
+    fresh_until = job_status.datetime.strptime(job["freshUntil"], "%Y-%m-%dT%H:%M:%SZ")
+    fresh_until = fresh_until.replace(tzinfo=job_status.timezone.utc).timestamp()
+    assert time.time() + 118 <= fresh_until <= time.time() + 120
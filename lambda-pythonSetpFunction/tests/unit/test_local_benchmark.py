@@ -0,0 +1,39 @@
+import pytest
+
+from local.benchmark import build_objects, regressions, run_benchmark
+
+
+@pytest.fixture(autouse=True)
+def in_process_store(monkeypatch):
+    monkeypatch.delenv("STATE_TABLE", raising=False)
+
+
+def test_full_backup_runs_end_to_end_against_fakes():
+    results = run_benchmark(build_objects(objects=1, rows=500, files=3, file_bytes=1024))
+
+    assert results["status"] == "SUCCEEDED", results["error"]
+    assert results["records"] == 503
+    assert (results["objectsCompleted"], results["objectsFailed"]) == (2, 0)
+    assert results["apiCalls"]["fileDownload"] == 3
+    assert results["apiCallsByHandler"]["InitBulkBackup"] == 4  # describe + job create, per object
+    assert results["phasesByHandler"]["DownloadData"]["S3Bytes"] > 0
+    assert results["progress"]["state"] == "Finished"
+    assert (results["progress"]["recordsExported"], results["progress"]["filesDownloaded"]) == (503, 3)
+
+
+def test_chunked_objects_export_every_row_once(monkeypatch):
+    monkeypatch.setenv("CHUNK_THRESHOLD_RECORDS", "1000")
+    monkeypatch.setenv("CHUNK_TARGET_RECORDS", "400")
+
+    results = run_benchmark(build_objects(objects=1, rows=2000))
+
+    assert results["status"] == "SUCCEEDED", results["error"]
+    assert results["records"] == 2000
+    assert results["apiCalls"]["jobCreate"] == 5
+
+
+def test_regressions_flag_slower_runs():
+    baseline = {"recordsPerSecond": 1000, "s3MBPerSecond": 10, "peakRssMB": 100, "apiCalls": {"results": 10}}
+    run = {"recordsPerSecond": 700, "s3MBPerSecond": 9.5, "peakRssMB": 100, "apiCalls": {"results": 10}}
+
+    assert regressions(run, baseline, 0.2) == ["recordsPerSecond 700 < baseline 1000"]
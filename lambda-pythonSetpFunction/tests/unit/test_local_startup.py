@@ -0,0 +1,10 @@
+from local.startup import measure
+
+
+def test_handlers_import_without_boto3():
+    status = measure("CheckBackupStatus", repeat=1)
+    download = measure("downloadFile", repeat=1)
+
+    assert status["importMs"] > 0 and not status["boto3AtImport"]
+    # the S3 client is only built when it is first used
+    assert not download["boto3AtImport"] and download["lazyClients"] == 1
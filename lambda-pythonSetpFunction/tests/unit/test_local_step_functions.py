@@ -0,0 +1,202 @@
+import io
+import json
+import time
+
+from local.step_functions import LocalStateMachine, DEFAULT_DEFINITION, load_handlers
+
+POLLING = {
+    "StartAt": "Fan",
+    "States": {
+        "Fan": {
+            "Type": "Map",
+            "ItemsPath": "$.objects",
+            "MaxConcurrency": 2,
+            "Parameters": {"name.$": "$$.Map.Item.Value", "org.$": "$.org"},
+            "Iterator": {
+                "StartAt": "Start",
+                "States": {
+                    "Start": {"Type": "Task", "Resource": "${StartArn}", "Next": "Wait"},
+                    "Wait": {"Type": "Wait", "SecondsPath": "$.waitSeconds", "Next": "Check"},
+                    "Check": {"Type": "Task", "Resource": "${CheckArn}", "ResultPath": "$.check", "Next": "Done?"},
+                    "Done?": {
+                        "Type": "Choice",
+                        "Choices": [{"Variable": "$.check.state", "StringEquals": "Complete", "Next": "Finish"}],
+                        "Default": "Wait",
+                    },
+                    "Finish": {"Type": "Pass", "Parameters": {"name.$": "$.name", "polls.$": "$.check.polls"}, "End": True},
+                },
+            },
+            "ResultPath": "$.results",
+            "End": True,
+        }
+    },
+}
+
+
+def polling_handlers():
+    def start(event, context):
+        # the job finishes 100 virtual seconds after it starts
+        return {**event, "startedAt": time.time(), "waitSeconds": 30, "polls": 0}
+
+    def check(event, context):
+        done = time.time() - event["startedAt"] >= 100
+        return {"state": "Complete" if done else "Running", "polls": event.get("check", {}).get("polls", 0) + 1}
+
+    return {"${StartArn}": start, "${CheckArn}": check}
+
+
+def test_waits_are_virtual_and_map_respects_concurrency():
+    machine = LocalStateMachine(POLLING, handlers=polling_handlers())
+
+    result = machine.execute({"objects": ["A", "B", "C"], "org": "org"})
+
+    assert result["status"] == "SUCCEEDED"
+    assert result["output"]["results"] == [{"name": n, "polls": 4} for n in ("A", "B", "C")]
+    # each branch waits 4 x 30 s; three branches on two slots take two rounds
+    assert 240 <= result["virtualSeconds"] < 241
+    assert result["wallSeconds"] < 5
+    assert result["states"]["Wait"]["count"] == 12
+    assert result["states"]["Check"]["count"] == 12
+
+
+def test_failed_task_fails_the_execution():
+    def boom(event, context):
+        raise RuntimeError("no")
+
+    machine = LocalStateMachine(
+        {"StartAt": "T", "States": {"T": {"Type": "Task", "Resource": "${TArn}", "End": True}}},
+        handlers={"${TArn}": boom},
+    )
+
+    result = machine.execute({})
+
+    assert result["status"] == "FAILED"
+    assert result["error"]["error"] == "States.TaskFailed"
+
+
+class FakeS3:
+    def __init__(self, objects):
+        self.objects = objects
+
+    def get_paginator(self, name):
+        s3 = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                yield {"Contents": [{"Key": k} for k in sorted(s3.objects) if k.startswith(Prefix)]}
+
+        return Paginator()
+
+    def get_object(self, Bucket, Key):
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+
+def test_item_reader_and_batcher_feed_distributed_map():
+    lines = "\n".join(json.dumps({"id": i}) for i in range(5)).encode()
+    definition = json.load(open(DEFAULT_DEFINITION))
+    content_map = dict(definition["States"]["BackupMap"]["Iterator"]["States"]["ContentVersionMap"])
+    content_map.pop("Next")
+    batches = []
+
+    def download(event, context):
+        batches.append(event)
+        return {"retry": False}
+
+    machine = LocalStateMachine(
+        {"StartAt": "ContentVersionMap", "States": {"ContentVersionMap": {**content_map, "End": True, "ItemBatcher": {
+            **content_map["ItemBatcher"], "MaxItemsPerBatch": 2}}}},
+        handlers={"${downloadFileArn}": download},
+        s3=FakeS3({"p/manifest/part-00000.jsonl": lines}),
+    )
+
+    result = machine.execute({
+        "manifestBucket": "b", "manifestPrefix": "p/manifest/", "s3_key": "p/k.csv", "S3BUCKET": "b",
+        "requestDetails": {"orgId": "org"},
+    })
+
+    assert result["status"] == "SUCCEEDED"
+    assert [len(b["Items"]) for b in sorted(batches, key=lambda b: b["Items"][0]["id"])] == [2, 2, 1]
+    assert batches[0]["BatchInput"] == {"s3Key": "p/k.csv", "S3BUCKET": "b", "requestDetails": {"orgId": "org"}}
+
+
+def test_file_batch_choice_tolerates_output_without_retry():
+    from local.step_functions import matches
+
+    with open(DEFAULT_DEFINITION) as f:
+        definition = json.load(f)
+    processor = definition["States"]["BackupMap"]["Iterator"]["States"]["ContentVersionMap"]["ItemProcessor"]
+    (rule,) = processor["States"]["AnyFilesFailed"]["Choices"]
+
+    assert not matches(rule, {"statusCode": 500}, {})
+    assert matches(rule, {"retry": True}, {})
+
+
+def test_branches_wait_on_the_job_item_instead_of_polling(local_store):
+    import job_status
+
+    with open(DEFAULT_DEFINITION) as f:
+        definition = json.load(f)
+    branch = definition["States"]["BackupMap"]["Iterator"]["States"]
+    states = {name: dict(branch[name]) for name in ("ReadJobState", "IsJobStateFresh", "WaitForJobState")}
+    states["CheckBackupStatus"] = {"Type": "Task", "Resource": "${CheckBackupStatusArn}", "End": True}
+    job_status.register_job("org", "750A", "Account", "InProgress")
+    item = local_store.get("jobs#org", "750A")
+    local_store.put("jobs#org", "750A", {**item, "freshUntil": job_status._timestamp(time.time() + 300)})
+    checks = []
+
+    def check(event, context):
+        checks.append(time.time())
+        return {"state": "JobComplete"}
+
+    machine = LocalStateMachine(
+        {"StartAt": "ReadJobState", "States": states},
+        handlers={"${DDBGetItem}": load_handlers()["${DDBGetItem}"], "${CheckBackupStatusArn}": check},
+    )
+
+    result = machine.execute({"jobId": "750A", "requestDetails": {"orgId": "org"}})
+
+    assert result["status"] == "SUCCEEDED"
+    # one wait until freshUntil, then one Lambda poll once the item went stale
+    assert len(checks) == 1
+    assert result["states"]["WaitForJobState"]["count"] == 1
+    assert result["states"]["ReadJobState"]["count"] == 2
+    assert 298 <= result["virtualSeconds"] <= 301
+
+
+def test_missing_job_item_falls_through_to_a_poll(local_store):
+    from local.step_functions import dynamodb_get_item
+
+    params = {"TableName": "t", "Key": {"pk": {"S": "jobs#org"}, "sk": {"S": "750X"}}}
+
+    assert dynamodb_get_item(params, None) == {}
+
+
+def test_failed_download_marks_only_its_object_failed(load_app, mocker):
+    with open(DEFAULT_DEFINITION) as f:
+        definition = json.load(f)
+    branch = definition["States"]["BackupMap"]["Iterator"]["States"]
+    download = {**branch["DownloadData"], "End": True}
+    download.pop("Next")
+    failed = []
+
+    def boom(event, context):
+        raise RuntimeError("Salesforce went away")
+
+    def mark_failed(event, context):
+        failed.append(event)
+        return {"status": "marked"}
+
+    machine = LocalStateMachine(
+        {"StartAt": "DownloadData", "States": {"DownloadData": download, "MarkFailed": branch["MarkFailed"]}},
+        handlers={"${DownloadDataToS3Arn}": boom, "${UpdateDBStatusFailedArn}": mark_failed},
+    )
+
+    result = machine.execute({"jobId": "750A", "objectName": "Account", "state": "JobComplete"})
+
+    assert result["status"] == "SUCCEEDED"
+    assert failed[0]["error"]["Error"] == "States.TaskFailed"
+
+    app = load_app("UpdateDBStatusFailed")
+    write = mocker.patch.object(app, "write_statuses")
+    app.lambda_handler(failed[0], None)
+    assert write.call_args.args[0][0]["status"] == "States.TaskFailed"
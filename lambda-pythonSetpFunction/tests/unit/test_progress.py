@@ -0,0 +1,59 @@
+import json
+
+import progress
+
+RUN = {"orgId": "org1", "BackUpType": "Full", "run": {"id": "exec-1", "startedAt": "2026-01-01T00:00:00Z"}}
+STARTED = 1767225600.0  # 2026-01-01T00:00:00Z
+
+
+def test_record_adds_to_counters_and_keeps_run_details(local_store):
+    progress.record(RUN, objectsPlanned=4, recordsPlanned=1000)
+    progress.record(RUN, objectsSubmitted=1, recordsExported=250, bytesExported=0)
+    progress.record(RUN, recordsExported=250)
+
+    item = local_store.get("run#exec-1", "progress")
+    assert item["objectsPlanned"] == 4
+    assert item["recordsExported"] == 500
+    assert "bytesExported" not in item  # zero counts are not written
+    assert (item["orgId"], item["backupType"], item["startedAt"]) == ("org1", "Full", STARTED)
+
+
+def test_record_without_a_run_is_a_no_op(local_store):
+    progress.record({"orgId": "org1"}, objectsCompleted=1)
+    progress.record(None, objectsCompleted=1)
+
+    assert local_store.query("run#None") == []
+
+
+def test_summary_estimates_throughput_and_eta():
+    item = {"objectsPlanned": 4, "objectsCompleted": 1, "recordsPlanned": 1000, "recordsExported": 250,
+            "startedAt": STARTED, "updatedAt": STARTED + 50}
+
+    summary = progress.summarize(item, now=STARTED + 100)
+
+    assert summary["state"] == "Running"
+    assert summary["percentComplete"] == 25.0
+    assert summary["recordsPerSecond"] == 2.5
+    assert summary["etaSeconds"] == 300.0
+
+
+def test_summary_of_a_finished_run_stops_the_clock():
+    item = {"objectsPlanned": 2, "objectsCompleted": 1, "objectsFailed": 1, "startedAt": STARTED, "updatedAt": STARTED + 40}
+
+    summary = progress.summarize(item, now=STARTED + 1000)
+
+    assert (summary["state"], summary["percentComplete"], summary["etaSeconds"]) == ("Finished", 100.0, 0)
+    assert summary["elapsedSeconds"] == 40
+
+
+def test_get_backup_progress_handler(load_app):
+    module = load_app("GetBackupProgress")
+    progress.record(RUN, objectsPlanned=2, objectsCompleted=1)
+
+    direct = module.lambda_handler({"runId": "exec-1"}, None)
+    api = module.lambda_handler({"httpMethod": "GET", "pathParameters": {"runId": "exec-1"}}, None)
+    missing = module.lambda_handler({"runId": "other"}, None)
+
+    assert direct["statusCode"] == 200 and direct["objectsCompleted"] == 1
+    assert json.loads(api["body"])["objectsPlanned"] == 2
+    assert missing["statusCode"] == 404
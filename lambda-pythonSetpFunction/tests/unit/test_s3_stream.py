@@ -0,0 +1,96 @@
+import threading
+
+import pytest
+
+import s3_stream
+from s3_stream import MB, MultipartUpload, stream_to_s3
+
+
+class FakeS3:
+    def __init__(self, fail_part=None):
+        self.objects = {}
+        self.parts = {}
+        self.aborted = []
+        self.fail_part = fail_part
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._release = threading.Event()
+        self._release.set()
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[(Bucket, Key)] = bytes(Body)
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self.parts[Key] = {}
+        return {"UploadId": "upload-1"}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        self._release.wait(5)
+        with self._lock:
+            self.in_flight -= 1
+        if PartNumber == self.fail_part:
+            raise RuntimeError("part upload failed")
+        self.parts[Key][PartNumber] = bytes(Body)
+        return {"ETag": f"etag-{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        numbers = [p["PartNumber"] for p in MultipartUpload["Parts"]]
+        assert numbers == sorted(numbers)
+        self.objects[(Bucket, Key)] = b"".join(self.parts[Key][n] for n in numbers)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.aborted.append(Key)
+
+
+def chunks(total, size=MB):
+    for offset in range(0, total, size):
+        yield bytes([offset // size % 256]) * min(size, total - offset)
+
+
+def test_small_object_uses_single_put():
+    s3 = FakeS3()
+    written = stream_to_s3(s3, [b"Id,Name\n", b"1,a\n"], "bucket", "small.csv")
+
+    assert written == 12
+    assert s3.objects[("bucket", "small.csv")] == b"Id,Name\n1,a\n"
+    assert s3.parts == {}
+
+
+def test_large_object_is_uploaded_in_ordered_parts():
+    s3 = FakeS3()
+    total = 23 * MB
+    stream_to_s3(s3, chunks(total), "bucket", "big.csv", part_size=5 * MB, max_in_flight=2)
+
+    assert s3.objects[("bucket", "big.csv")] == b"".join(chunks(total))
+    assert len(s3.parts["big.csv"]) == 5
+    assert s3.max_in_flight <= 2
+
+
+def test_part_size_never_below_s3_minimum():
+    upload = MultipartUpload(FakeS3(), "bucket", "key", part_size=1)
+    assert upload.part_size == s3_stream.MIN_PART_SIZE
+
+
+def test_failed_part_aborts_upload():
+    s3 = FakeS3(fail_part=2)
+    with pytest.raises(RuntimeError):
+        stream_to_s3(s3, chunks(12 * MB), "bucket", "broken.csv", part_size=5 * MB)
+
+    assert s3.aborted == ["broken.csv"]
+    assert ("bucket", "broken.csv") not in s3.objects
+
+
+def test_error_in_producer_aborts_upload():
+    s3 = FakeS3()
+
+    def failing_chunks():
+        yield from chunks(11 * MB)
+        raise ConnectionError("salesforce stream reset")
+
+    with pytest.raises(ConnectionError):
+        stream_to_s3(s3, failing_chunks(), "bucket", "partial.csv", part_size=5 * MB)
+    assert s3.aborted == ["partial.csv"]
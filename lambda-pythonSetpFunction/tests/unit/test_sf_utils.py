@@ -0,0 +1,113 @@
+import time
+
+import pytest
+
+import sf_utils
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self._payload = payload or {}
+
+    def json(self):
+        return self._payload
+
+    def close(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def empty_token_cache():
+    sf_utils._token_cache.clear()
+    yield
+    sf_utils._token_cache.clear()
+
+
+@pytest.fixture
+def token_server(mocker):
+    tokens = iter(f"token-{i}" for i in range(1, 100))
+    return mocker.patch.object(
+        sf_utils, "generate_access_token", side_effect=lambda org=None: {"access_token": next(tokens)}
+    )
+
+
+def test_token_is_reused_across_invocations(token_server):
+    assert sf_utils.get_access_token("org") == "token-1"
+    assert sf_utils.get_access_token("org") == "token-1"
+    assert token_server.call_count == 1
+
+
+def test_cold_container_reads_shared_store(token_server):
+    assert sf_utils.get_access_token("org") == "token-1"
+    sf_utils._token_cache.clear()  # simulate a new container
+
+    assert sf_utils.get_access_token("org") == "token-1"
+    assert token_server.call_count == 1
+
+
+def test_token_refreshed_before_expiry(token_server):
+    sf_utils.get_access_token("org")
+    entry = sf_utils._token_cache[sf_utils.get_url("org")]
+    entry["expires_at"] = time.time() + sf_utils.TOKEN_REFRESH_MARGIN_SECONDS - 1
+    sf_utils.get_store().put("token", sf_utils.get_url("org"), entry)
+
+    assert sf_utils.get_access_token("org") == "token-2"
+
+
+def test_expiry_uses_issued_at():
+    issued = time.time() - 100
+    expiry = sf_utils._token_expiry({"access_token": "x", "issued_at": str(int(issued * 1000))})
+    assert expiry == pytest.approx(issued + sf_utils.TOKEN_TTL_SECONDS, abs=1)
+
+
+def test_request_refreshes_token_on_401(token_server, mocker):
+    calls = []
+
+    def fake_request(method, url, headers=None, **kwargs):
+        calls.append(headers["Authorization"])
+        return FakeResponse(401 if len(calls) == 1 else 200)
+
+    mocker.patch.object(sf_utils.http_session, "request", side_effect=fake_request)
+
+    response = sf_utils.sf_request("org", "GET", "https://example/services")
+
+    assert response.status_code == 200
+    assert calls == ["Bearer token-1", "Bearer token-2"]
+
+
+def test_stale_invalidate_keeps_fresh_token(token_server):
+    sf_utils.get_access_token("org")
+    sf_utils.invalidate_access_token("org", "token-1")
+    assert sf_utils.get_access_token("org") == "token-2"
+
+    sf_utils.invalidate_access_token("org", "token-1")
+    assert sf_utils.get_access_token("org") == "token-2"
+
+
+class FakeKms:
+    """Reversible stand-in for KMS that checks the encryption context."""
+
+    def encrypt(self, KeyId, Plaintext, EncryptionContext):
+        return {"CiphertextBlob": f"{KeyId}|{EncryptionContext['instanceUrl']}|".encode() + Plaintext[::-1]}
+
+    def decrypt(self, CiphertextBlob, EncryptionContext):
+        key_id, url, sealed = CiphertextBlob.split(b"|", 2)
+        assert url.decode() == EncryptionContext["instanceUrl"]
+        return {"Plaintext": sealed[::-1]}
+
+
+def test_shared_store_holds_only_encrypted_tokens(token_server, monkeypatch, local_store):
+    monkeypatch.setattr(sf_utils, "TOKEN_KMS_KEY_ID", "alias/token")
+    monkeypatch.setattr(sf_utils, "kms", FakeKms())
+
+    assert sf_utils.get_access_token("org") == "token-1"
+    item = local_store.get("token", sf_utils.get_url("org"))
+    assert "access_token" not in item and "token-1" not in item["encryptedToken"]
+
+    sf_utils._token_cache.clear()  # a new container decrypts the shared copy
+    assert sf_utils.get_access_token("org") == "token-1"
+    assert token_server.call_count == 1
+
+    sf_utils.invalidate_access_token("org", "token-1")
+    assert local_store.get("token", sf_utils.get_url("org")) is None
@@ -0,0 +1,60 @@
+import pytest
+
+import status_writer
+from status_writer import StatusWriteError, StatusWriter, write_statuses
+
+
+class FakeDynamoDB:
+    """batch_write_item that leaves the first `unprocessed` items of each early call unprocessed."""
+
+    def __init__(self, unprocessed=(0,)):
+        self.unprocessed = list(unprocessed)
+        self.calls = []
+
+    def batch_write_item(self, RequestItems):
+        (table, requests), = RequestItems.items()
+        self.calls.append([r["PutRequest"]["Item"]["Id"] for r in requests])
+        left = self.unprocessed.pop(0) if self.unprocessed else 0
+        return {"UnprocessedItems": {table: requests[:left]} if left else {}}
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(status_writer.time, "sleep", lambda seconds: None)
+
+
+def test_flushes_in_batches_of_25_with_duplicates_collapsed():
+    dynamodb = FakeDynamoDB()
+    with StatusWriter("status", dynamodb) as writer:
+        for i in range(30):
+            writer.add({"Id": f"job-{i}", "status": "InProgress"})
+        writer.add({"Id": "job-29", "status": "Completed"})
+
+    assert [len(call) for call in dynamodb.calls] == [25, 5]
+    assert writer.written == 30
+
+
+def test_unprocessed_items_are_resubmitted():
+    dynamodb = FakeDynamoDB(unprocessed=[2, 1])
+
+    writer = StatusWriter("status", dynamodb)
+    for item_id in "abc":
+        writer.add({"Id": item_id})
+    writer.flush()
+
+    assert dynamodb.calls == [["a", "b", "c"], ["a", "b"], ["a"]]
+
+
+def test_gives_up_after_max_attempts(monkeypatch):
+    monkeypatch.setattr(status_writer, "MAX_ATTEMPTS", 3)
+    writer = StatusWriter("status", FakeDynamoDB(unprocessed=[1, 1, 1]))
+    writer.add({"Id": "a"})
+
+    with pytest.raises(StatusWriteError) as error:
+        writer.flush()
+    assert error.value.unprocessed == [{"Id": "a"}]
+
+
+def test_without_a_table_records_go_to_the_state_store(local_store):
+    assert write_statuses([{"Id": "750x", "status": "Completed"}]) == 1
+    assert local_store.get("status", "750x") == {"Id": "750x", "status": "Completed"}
@@ -0,0 +1,28 @@
+from datetime import datetime, timezone
+
+import watermarks
+
+
+def test_first_run_starts_from_yesterday():
+    assert watermarks.delta_condition("org", "Account", "2025-01-02T00:00:00Z") == (
+        "SystemModstamp >= YESTERDAY AND SystemModstamp <= 2025-01-02T00:00:00Z"
+    )
+
+
+def test_later_runs_start_after_the_watermark():
+    watermarks.advance_watermark("org", "Log__b", "2025-01-02T00:00:00Z")
+
+    assert watermarks.delta_condition("org", "Log__b") == "CreatedDate > 2025-01-02T00:00:00Z"
+
+
+def test_watermark_only_moves_forward():
+    assert watermarks.advance_watermark("org", "Account", "2025-01-02T00:00:00Z")
+    assert not watermarks.advance_watermark("org", "Account", "2025-01-01T00:00:00Z")
+
+    assert watermarks.get_watermark("org", "Account") == "2025-01-02T00:00:00Z"
+
+
+def test_window_end_trails_the_clock():
+    now = datetime(2025, 1, 2, 0, 0, 30, tzinfo=timezone.utc)
+
+    assert watermarks.window_end(now) == "2025-01-01T23:59:30Z"
@@ -220,8 +220,11 @@ def check_backup_status_handler(event, context):
     else:
         status = {"state": "InProgress"}
 
-    # Update DDB heartbeat
-    ddb_put_status(object_name, job_id, status["state"], {"lastSalesforceStatus": job})
+    # Persist state changes only; $.status holds the previous poll's result, so an
+    # unchanged InProgress poll costs no write
+    previous = (event.get("status") or {}).get("state")
+    if status["state"] != previous:
+        ddb_put_status(object_name, job_id, status["state"], {"lastSalesforceStatus": job})
     logger.info("CheckBackupStatus returning: %s", status)
     return status
 